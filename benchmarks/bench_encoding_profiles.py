@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Latency and match-distance drift of the face encoding profiles
+
+For every image, the 'accurate' profile's encoding is taken as the
+enrollment reference. Each profile then re-detects and re-encodes the same
+image; the report shows its latency, how often it still finds the face, and
+how far its encoding lands from the reference (the distance a periodic
+check would add on top of genuine appearance changes).
+
+Usage:
+    python benchmarks/bench_encoding_profiles.py --images images/
+    python benchmarks/bench_encoding_profiles.py --video SORA_DeepFake_Vid/Sora1.mp4 --frames 40
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from bench_utils import print_table, summarize
+from face_profiles import ENCODING_PROFILES, encode_faces
+
+
+def load_images(images_dir, video, frames):
+    """RGB test images from a folder of photos and/or evenly spaced video frames"""
+    images = []
+    if images_dir:
+        for path in sorted(glob.glob(os.path.join(images_dir, '*'))):
+            image = cv2.imread(path)
+            if image is not None:
+                images.append((os.path.basename(path), cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+
+    if video:
+        capture = cv2.VideoCapture(video)
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or frames
+        for index in np.linspace(0, total - 1, frames).astype(int):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ok, frame = capture.read()
+            if ok:
+                images.append((f"{os.path.basename(video)}#{index}", cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        capture.release()
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=None, help='Folder of face photos')
+    parser.add_argument('--video', default=None, help='Video to sample frames from')
+    parser.add_argument('--frames', type=int, default=30, help='Frames sampled from --video')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per image and profile')
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.video, args.frames)
+    if not images:
+        parser.error("no images found, pass --images and/or --video")
+
+    references = {}
+    for name, image in images:
+        _, encodings = encode_faces(image, 'accurate')
+        if encodings:
+            references[name] = encodings[0]
+    print(f"{len(images)} images, {len(references)} with a face under the 'accurate' profile")
+
+    rows = []
+    for profile in ENCODING_PROFILES:
+        timings = []
+        drifts = []
+        found = 0
+        for name, image in images:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                _, encodings = encode_faces(image, profile)
+                timings.append((time.perf_counter() - start) * 1000.0)
+            if encodings:
+                found += 1
+                if name in references:
+                    drifts.append(float(np.linalg.norm(encodings[0] - references[name])))
+
+        timing = summarize(timings)
+        rows.append({
+            'profile': profile,
+            'mean_ms': timing['mean_ms'],
+            'p50_ms': timing['p50_ms'],
+            'p90_ms': timing['p90_ms'],
+            'face_found': found / len(images),
+            'drift_mean': float(np.mean(drifts)) if drifts else float('nan'),
+            'drift_p90': float(np.percentile(drifts, 90)) if drifts else float('nan'),
+            'drift_max': float(np.max(drifts)) if drifts else float('nan')
+        })
+
+    print_table(rows, [
+        ('profile', 'profile'),
+        ('mean ms', 'mean_ms'),
+        ('p50 ms', 'p50_ms'),
+        ('p90 ms', 'p90_ms'),
+        ('face found', 'face_found'),
+        ('drift mean', 'drift_mean'),
+        ('drift p90', 'drift_p90'),
+        ('drift max', 'drift_max'),
+    ])
+    print("Drift is the encoding distance to the 'accurate' reference of the same image; "
+          "compare it with the 0.40/0.45 match thresholds.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Per-frame cost of gaze_tracking.Eye._isolate: crop-then-mask vs full-frame mask
+
+Both eyes of a synthetic face are isolated on grayscale frames of each size,
+once with the ROI-local path used by Eye and once with the old full-frame
+mask. Before timing, the outputs of the two paths are compared pixel for
+pixel on randomly placed eyes, including eyes touching the frame border.
+
+Usage:
+    python benchmarks/bench_eye_isolation.py
+    python benchmarks/bench_eye_isolation.py --video SORA_DeepFake_Vid/Sora1.mp4 --repeat 500
+"""
+
+import argparse
+
+import cv2
+import numpy as np
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from bench_utils import print_table, time_calls
+from gaze_tracking.eye import Eye
+
+SIZES = [(640, 480), (1280, 720)]
+
+# 68-point landmark outline of a left and right eye, relative to the eye's left corner
+EYE_SHAPE = np.array([(0, 0), (8, -5), (18, -5), (27, 0), (18, 4), (8, 4)], dtype=np.float64)
+
+
+class _Point(object):
+    def __init__(self, x, y):
+        self.x = int(x)
+        self.y = int(y)
+
+
+class _Landmarks(object):
+    """Stand-in for dlib.full_object_detection holding only the eye points"""
+
+    def __init__(self, left_corner, right_corner, scale):
+        self.points = {}
+        for points, corner in ((Eye.LEFT_EYE_POINTS, left_corner), (Eye.RIGHT_EYE_POINTS, right_corner)):
+            for index, (dx, dy) in zip(points, EYE_SHAPE * scale):
+                self.points[index] = _Point(corner[0] + dx, corner[1] + dy)
+
+    def part(self, index):
+        return self.points[index]
+
+
+def isolate_roi(frame, landmarks, points):
+    eye = Eye.__new__(Eye)
+    eye._isolate(frame, landmarks, points)
+    return eye
+
+
+def isolate_full_frame(frame, landmarks, points):
+    """The previous implementation: mask the whole frame, then crop"""
+    region = np.array([(landmarks.part(point).x, landmarks.part(point).y) for point in points], np.int32)
+    margin = 5
+    min_x = np.min(region[:, 0]) - margin
+    max_x = np.max(region[:, 0]) + margin
+    min_y = np.min(region[:, 1]) - margin
+    max_y = np.max(region[:, 1]) + margin
+    eye_frame = Eye._isolate_full_frame(frame, region)[min_y:max_y, min_x:max_x]
+    height, width = eye_frame.shape[:2]
+    return eye_frame, (min_x, min_y), (width / 2, height / 2)
+
+
+def load_frame(video, width, height, rng):
+    if video:
+        capture = cv2.VideoCapture(video)
+        ok, frame = capture.read()
+        capture.release()
+        if ok:
+            return cv2.cvtColor(cv2.resize(frame, (width, height)), cv2.COLOR_BGR2GRAY)
+    return rng.integers(0, 256, (height, width), dtype=np.uint8)
+
+
+def check_identical(frame, rng, trials):
+    """Compares both paths on random eye placements, returns the number of mismatches"""
+    height, width = frame.shape[:2]
+    mismatches = 0
+    for _ in range(trials):
+        scale = rng.uniform(0.5, 3.0)
+        left = (rng.integers(-10, width), rng.integers(-10, height))
+        right = (rng.integers(-10, width), rng.integers(-10, height))
+        landmarks = _Landmarks(left, right, scale)
+        for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS):
+            eye = isolate_roi(frame, landmarks, points)
+            expected_frame, expected_origin, expected_center = isolate_full_frame(frame, landmarks, points)
+            if (eye.frame.shape != expected_frame.shape or not np.array_equal(eye.frame, expected_frame)
+                    or eye.origin != expected_origin or eye.center != expected_center):
+                mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', default=None, help='Take the frame content from the first frame of a video')
+    parser.add_argument('--repeat', type=int, default=300, help='Timed frames per size and path')
+    parser.add_argument('--check', type=int, default=2000, help='Random eye placements compared per size')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for width, height in SIZES:
+        frame = load_frame(args.video, width, height, rng)
+        mismatches = check_identical(frame, rng, args.check)
+
+        # A face in the middle of the frame, eyes sized for the resolution
+        scale = width / 640.0
+        landmarks = _Landmarks((width * 0.42, height * 0.45), (width * 0.53, height * 0.45), scale)
+
+        def both_eyes(isolate):
+            return lambda: [isolate(frame, landmarks, points)
+                            for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS)]
+
+        for name, isolate in (('full frame', isolate_full_frame), ('roi', isolate_roi)):
+            timing = time_calls(both_eyes(isolate), repeat=args.repeat)
+            rows.append({
+                'size': f"{width}x{height}",
+                'path': name,
+                'mean_ms': timing['mean_ms'],
+                'p50_ms': timing['p50_ms'],
+                'p99_ms': timing['p99_ms'],
+                'mismatches': mismatches
+            })
+        rows[-1]['speedup'] = rows[-2]['mean_ms'] / rows[-1]['mean_ms']
+
+    print_table(rows, [
+        ('size', 'size'),
+        ('path', 'path'),
+        ('mean ms', 'mean_ms'),
+        ('p50 ms', 'p50_ms'),
+        ('p99 ms', 'p99_ms'),
+        ('speedup', 'speedup'),
+        ('mismatches', 'mismatches'),
+    ])
+    print("Times are for isolating both eyes of one frame; mismatches count eye crops that differ "
+          "from the full-frame path.")
+
+
+if __name__ == '__main__':
+    main()
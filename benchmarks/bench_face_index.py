@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Recall-versus-latency benchmark for the identity search indexes
+
+Builds a synthetic campus of enrolled 128-d encodings (clustered like real
+face encodings, genuine probes at ~0.35 distance from their reference) and
+reports, for each IVF nprobe setting, recall@1 / recall@k against exact
+search and the per-query latency.
+
+Usage:
+    python benchmarks/bench_face_index.py --students 30000 --queries 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from bench_utils import print_table, summarize
+from face_index import ExactIndex, IVFIndex
+
+
+def synthetic_encodings(num_students, num_queries, seed=0):
+    """Enrolled encodings plus noisy probes of randomly chosen students"""
+    rng = np.random.default_rng(seed)
+
+    # Students share a few dozen "appearance" clusters, which is what makes
+    # partitioning useful (and realistic) rather than uniform noise
+    cluster_centers = rng.normal(0.0, 0.12, size=(48, 128))
+    clusters = rng.integers(len(cluster_centers), size=num_students)
+    enrolled = cluster_centers[clusters] + rng.normal(0.0, 0.04, size=(num_students, 128))
+
+    # Per-dimension noise of 0.031 gives probe distances around 0.35
+    targets = rng.integers(num_students, size=num_queries)
+    probes = enrolled[targets] + rng.normal(0.0, 0.031, size=(num_queries, 128))
+    return enrolled, probes, targets
+
+
+def run_queries(index, probes, k, **search_options):
+    results = []
+    timings = []
+    for probe in probes:
+        start = time.perf_counter()
+        results.append(index.search(probe, k=k, **search_options))
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return results, summarize(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=30000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nlist', type=int, default=64)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    enrolled, probes, targets = synthetic_encodings(args.students, args.queries, args.seed)
+
+    exact = ExactIndex()
+    ivf = IVFIndex(nlist=args.nlist)
+    start = time.perf_counter()
+    for student_id, encoding in enumerate(enrolled):
+        exact.add(student_id, encoding)
+    exact_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for student_id, encoding in enumerate(enrolled):
+        ivf.add(student_id, encoding)
+    if not ivf.is_trained:
+        ivf.train()
+    ivf_build = time.perf_counter() - start
+
+    print(f"{args.students} students, {args.queries} queries, k={args.k}")
+    print(f"Build: exact {exact_build:.2f}s, ivf {ivf_build:.2f}s ({ivf.stats()})")
+
+    truth, exact_timing = run_queries(exact, probes, args.k)
+    truth_top1 = [result[0][0] for result in truth]
+    truth_topk = [set(student_id for student_id, _ in result) for result in truth]
+
+    rows = [{
+        'search': 'exact',
+        'recall@1': 1.0,
+        f'recall@{args.k}': 1.0,
+        'identity_hit': float(np.mean(np.array(truth_top1) == targets)),
+        **exact_timing
+    }]
+
+    for nprobe in args.nprobe:
+        results, timing = run_queries(ivf, probes, args.k, nprobe=nprobe)
+        top1 = [result[0][0] if result else None for result in results]
+        recall_1 = np.mean([a == b for a, b in zip(top1, truth_top1)])
+        recall_k = np.mean([
+            len(truth_set & set(student_id for student_id, _ in result)) / len(truth_set)
+            for truth_set, result in zip(truth_topk, results)
+        ])
+        rows.append({
+            'search': f'ivf nprobe={nprobe}',
+            'recall@1': float(recall_1),
+            f'recall@{args.k}': float(recall_k),
+            'identity_hit': float(np.mean(np.array(top1) == targets)),
+            **timing
+        })
+
+    print_table(rows, [
+        ('search', 'search'),
+        ('recall@1', 'recall@1'),
+        (f'recall@{args.k}', f'recall@{args.k}'),
+        ('identity hit', 'identity_hit'),
+        ('mean ms', 'mean_ms'),
+        ('p50 ms', 'p50_ms'),
+        ('p99 ms', 'p99_ms'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
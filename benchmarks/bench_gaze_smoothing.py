@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Alert quality of raw vs smoothed gaze at different analysis rates
+
+A simulated student looks at the screen with look-away episodes of random
+length. Every analyzed frame yields a noisy horizontal ratio, with
+occasional outlier frames, frames without a face and blinks. The raw stream
+is alerted on the way server.js does it (5 consecutive away results), the
+smoothed stream (gaze_smoothing.GazeFilter) on away time
+(direction_seconds). The paced stream is smoothed too, but asks for its
+next frame when gaze_pacing.GazePacer says so, as server.js does with
+next_analysis_in_ms. The report gives, per rate:
+    flips/min   direction changes per minute (truth has far fewer)
+    accuracy    share of time the latest analyzed direction matches the truth
+    recall      look-away episodes of at least --alert-seconds that alerted
+    false       alerts raised outside such episodes (at the screen or a short glance)
+    latency     seconds from episode start to its alert (mean)
+
+Usage:
+    python benchmarks/bench_gaze_smoothing.py
+    python benchmarks/bench_gaze_smoothing.py --minutes 30 --rates 15,5,3,2 --noise 0.08
+"""
+
+import argparse
+
+import numpy as np
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from bench_utils import print_table
+from gaze_pacing import GazePacer
+from gaze_smoothing import GazeFilter
+
+CENTER_RATIO = 0.5
+AWAY_RATIOS = {'left': 0.78, 'right': 0.22}
+
+
+def simulate_truth(minutes, rng):
+    """List of (start, end, direction) segments covering the session"""
+    segments = []
+    t = 0.0
+    total = minutes * 60.0
+    while t < total:
+        focus = rng.uniform(3.0, 20.0)
+        segments.append((t, t + focus, 'center'))
+        t += focus
+        away = rng.choice([rng.uniform(0.3, 1.5), rng.uniform(1.5, 8.0)])
+        segments.append((t, t + away, rng.choice(['left', 'right'])))
+        t += away
+    return segments
+
+
+def direction_at(segments, t):
+    for start, end, direction in segments:
+        if start <= t < end:
+            return direction
+    return segments[-1][2]
+
+
+def raw_direction(ratio):
+    if ratio <= 0.35:
+        return 'right'
+    if ratio >= 0.65:
+        return 'left'
+    return 'center'
+
+
+def measure_frame(segments, t, noise, outliers, no_face, blinks, rng):
+    """(time, truth, gaze_result dict) of a frame analyzed at time t"""
+    truth = direction_at(segments, t)
+    roll = rng.random()
+    if roll < no_face:
+        result = {'success': True, 'gaze_direction': 'unknown', 'confidence': 0.0,
+                  'ratios': {'horizontal': None, 'vertical': None}, 'pupils': {'left': None, 'right': None}}
+    elif roll < no_face + blinks:
+        result = {'success': True, 'gaze_direction': 'blinking', 'confidence': 1.0,
+                  'ratios': {'horizontal': float(rng.random()), 'vertical': 0.5},
+                  'pupils': {'left': [100.0, 100.0], 'right': [160.0, 100.0]}}
+    else:
+        ratio = AWAY_RATIOS.get(truth, CENTER_RATIO) + rng.normal(0.0, noise)
+        if rng.random() < outliers:
+            ratio = rng.random()
+        ratio = float(np.clip(ratio, 0.0, 1.0))
+        result = {'success': True, 'gaze_direction': raw_direction(ratio), 'confidence': 1.0,
+                  'ratios': {'horizontal': ratio, 'vertical': 0.5},
+                  'pupils': {'left': [100.0 + 40 * ratio, 100.0], 'right': [160.0 + 40 * ratio, 100.0]}}
+    return t, truth, result
+
+
+def measure(segments, rate, noise, outliers, no_face, blinks, rng):
+    """Frames analyzed at a fixed rate"""
+    frames = []
+    t = 0.0
+    while t < segments[-1][1]:
+        frames.append(measure_frame(segments, t, noise, outliers, no_face, blinks, rng))
+        # Requests do not arrive on a perfect clock
+        t += rng.uniform(0.8, 1.2) / rate
+    return frames
+
+
+def evaluate(segments, frames, directions, alerts, minutes, alert_seconds):
+    flips = sum(1 for a, b in zip(directions, directions[1:]) if a != b)
+    # Sampled every 100 ms with the latest analyzed direction, so sparse and dense streams compare fairly
+    times = np.array([t for t, _, _ in frames])
+    grid = np.arange(times[0], segments[-1][1], 0.1)
+    latest = np.searchsorted(times, grid, side='right') - 1
+    accuracy = np.mean([directions[i] == direction_at(segments, t) for i, t in zip(latest, grid)])
+
+    episodes = [(start, end) for start, end, direction in segments
+                if direction != 'center' and end - start >= alert_seconds]
+    latencies = []
+    for start, end in episodes:
+        hits = [t for t in alerts if start <= t <= end + 1.0]
+        if hits:
+            latencies.append(hits[0] - start)
+    false_alerts = sum(1 for t in alerts
+                       if not any(start <= t <= end + 1.0 for start, end in episodes))
+    return {
+        'flips_per_min': flips / minutes,
+        'accuracy': float(accuracy),
+        'recall': len(latencies) / len(episodes) if episodes else 1.0,
+        'false_alerts': false_alerts,
+        'latency_s': float(np.mean(latencies)) if latencies else float('nan')
+    }
+
+
+# Both streams report alert events: the first frame of a run of alerting frames
+def run_raw(frames):
+    """server.js: alert when the last 5 results are all away"""
+    directions, alerts, history = [], [], []
+    alerting = False
+    for t, _, result in frames:
+        direction = result['gaze_direction']
+        directions.append(direction)
+        history = (history + [direction])[-5:]
+        away = len(history) == 5 and all(d in ('left', 'right') for d in history)
+        if away and not alerting:
+            alerts.append(t)
+        alerting = away
+    return directions, alerts
+
+
+def run_smoothed(frames, alert_seconds):
+    gaze_filter = GazeFilter()
+    directions, alerts = [], []
+    alerting = False
+    for t, _, result in frames:
+        smoothed = gaze_filter.update(result, t)
+        directions.append(smoothed['gaze_direction'])
+        away = smoothed['gaze_direction'] in ('left', 'right') and smoothed['direction_seconds'] >= alert_seconds
+        if away and not alerting:
+            alerts.append(t)
+        alerting = away
+    return directions, alerts
+
+
+def run_paced(segments, args, rng, camera_fps=15.0):
+    """Smoothed stream analyzing the first camera frame after each next_analysis_in_ms hint"""
+    gaze_filter, pacer = GazeFilter(), GazePacer()
+    frames, directions, alerts = [], [], []
+    alerting = False
+    t = 0.0
+    while t < segments[-1][1]:
+        frame = measure_frame(segments, t, args.noise, args.outliers, args.no_face, args.blinks, rng)
+        smoothed = gaze_filter.update(frame[2], t)
+        hint, _ = pacer.update(frame[2], smoothed)
+        frames.append(frame)
+        directions.append(smoothed['gaze_direction'])
+        away = smoothed['gaze_direction'] in ('left', 'right') and smoothed['direction_seconds'] >= args.alert_seconds
+        if away and not alerting:
+            alerts.append(t)
+        alerting = away
+        t += max(hint / 1000.0, 1.0 / camera_fps) + rng.uniform(0.0, 1.0 / camera_fps)
+    return frames, directions, alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=20.0, help='Simulated session length')
+    parser.add_argument('--rates', default='15,10,5,3,2', help='Analysis rates (frames per second) to compare')
+    parser.add_argument('--noise', type=float, default=0.07, help='Standard deviation of the measured ratio')
+    parser.add_argument('--outliers', type=float, default=0.05, help='Share of frames with a random ratio')
+    parser.add_argument('--no-face', type=float, default=0.03, help='Share of frames without a face')
+    parser.add_argument('--blinks', type=float, default=0.03, help='Share of blinking frames')
+    parser.add_argument('--alert-seconds', type=float, default=2.0, help='Away time the smoothed alert waits for')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    segments = simulate_truth(args.minutes, rng)
+    minutes = segments[-1][1] / 60.0
+    truth_flips = (len(segments) - 1) / minutes
+
+    rows = []
+    for rate in [float(r) for r in args.rates.split(',')]:
+        frames = measure(segments, rate, args.noise, args.outliers, args.no_face, args.blinks,
+                         np.random.default_rng(args.seed + int(rate * 100)))
+        for name, (directions, alerts) in (('raw', run_raw(frames)),
+                                           ('smoothed', run_smoothed(frames, args.alert_seconds))):
+            row = evaluate(segments, frames, directions, alerts, minutes, args.alert_seconds)
+            row.update({'rate': f"{rate:g} fps", 'stream': name, 'frames': len(frames)})
+            rows.append(row)
+
+    frames, directions, alerts = run_paced(segments, args, np.random.default_rng(args.seed + 1))
+    row = evaluate(segments, frames, directions, alerts, minutes, args.alert_seconds)
+    row.update({'rate': f"{len(frames) / (minutes * 60.0):.2g} fps", 'stream': 'paced', 'frames': len(frames)})
+    rows.append(row)
+
+    print(f"{minutes:.1f} simulated minutes, {truth_flips:.1f} true direction changes per minute")
+    print_table(rows, [
+        ('rate', 'rate'),
+        ('stream', 'stream'),
+        ('frames', 'frames'),
+        ('flips/min', 'flips_per_min'),
+        ('accuracy', 'accuracy'),
+        ('recall', 'recall'),
+        ('false', 'false_alerts'),
+        ('latency s', 'latency_s'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
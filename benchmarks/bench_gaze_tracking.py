@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the gaze_tracking kernels, compared against a saved baseline
+
+Kernels, each timed per call on deterministic inputs:
+    eye_isolate        Eye._isolate, both eyes of a frame
+    pupil_processing   Pupil.image_processing of an eye crop at its calibrated threshold
+    pupil              Pupil() of an eye crop (processing and localization)
+    calibration        Calibration.find_best_threshold of an eye crop
+    refresh            GazeTracking.refresh of a video frame followed by the gaze
+                       ratios and blink check, frames in order (needs the landmark model)
+
+Inputs:
+    frames      --frames evenly spaced frames of each video in SORA_DeepFake_Vid
+    landmarks   found by GazeTracking on those frames when the landmark model is
+                there, otherwise eyes at fixed positions of the frame
+    eye crops   the isolated eyes of those frames plus --synthetic synthetic eyes
+                (seeded, see bench_pupil_localizer.py)
+
+Allocations are measured in a second pass under tracemalloc, which includes
+NumPy and OpenCV arrays: the peak KB a call allocates above what was live
+before it, and the bytes still held after all calls (should stay near 0).
+
+--save-baseline writes the results to a JSON file; --baseline compares with
+one and exits with 1 when a kernel's median time or peak allocation grew by
+more than --tolerance. Baselines only compare runs on the same machine.
+
+Usage:
+    python benchmarks/bench_gaze_tracking.py --save-baseline gaze_baseline.json
+    python benchmarks/bench_gaze_tracking.py --baseline gaze_baseline.json
+    python benchmarks/bench_gaze_tracking.py --kernels calibration,pupil --calls 2000
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import zlib
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import bench_utils
+from bench_eye_isolation import _Landmarks
+from bench_pupil_localizer import sample_frames, synthetic_crops
+from bench_utils import print_table, summarize
+from gaze_tracking import GazeTracking
+from gaze_tracking import models
+from gaze_tracking.calibration import Calibration
+from gaze_tracking.eye import Eye
+from gaze_tracking.pupil import Pupil
+
+VIDEO_GLOB = os.path.join(bench_utils.REPO_ROOT, 'SORA_DeepFake_Vid', '*.mp4')
+
+
+def load_frames(per_video):
+    """(video name, BGR frames) of every repo video"""
+    videos = []
+    for path in sorted(glob.glob(VIDEO_GLOB)):
+        frames = list(sample_frames(path, per_video))
+        if frames:
+            videos.append((os.path.basename(path), frames))
+    return videos
+
+
+def model_available():
+    return os.path.exists(models.DEFAULT_PREDICTOR_PATH)
+
+
+def frame_landmarks(videos):
+    """Grayscale frames with landmarks, real ones when the model is available"""
+    samples = []
+    gaze = GazeTracking(detection_interval=0) if model_available() else None
+    for _, frames in videos:
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            landmarks = None
+            if gaze is not None:
+                gaze.refresh(frame)
+                landmarks = gaze.result.landmarks
+            if landmarks is None:
+                height, width = gray.shape
+                scale = width / 640.0
+                landmarks = _Landmarks((width * 0.40, height * 0.42), (width * 0.54, height * 0.42), scale)
+            samples.append((gray, landmarks))
+    return samples
+
+
+def eye_crops(samples, synthetic):
+    """(crop, calibrated threshold) of the frames' eyes and of synthetic eyes"""
+    crops = []
+    for gray, landmarks in samples:
+        for side in (0, 1):
+            crop = Eye(gray, landmarks, side, Calibration()).frame
+            if crop.shape[0] > 12 and crop.shape[1] > 12:
+                crops.append(crop)
+    crops += synthetic_crops(synthetic, np.random.default_rng(0))
+    return [(crop, Calibration.find_best_threshold(crop)) for crop in crops]
+
+
+def isolate_both(sample):
+    gray, landmarks = sample
+    for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS):
+        Eye.__new__(Eye)._isolate(gray, landmarks, points)
+
+
+def refresh_kernel():
+    gaze = GazeTracking()
+
+    def refresh(frame):
+        gaze.refresh(frame)
+        gaze.is_blinking()
+        gaze.horizontal_ratio()
+        gaze.vertical_ratio()
+    return refresh
+
+
+def build_kernels(videos, samples, crops):
+    """name -> (function of one input, inputs)"""
+    kernels = {
+        'eye_isolate': (isolate_both, samples),
+        'pupil_processing': (lambda crop: Pupil.image_processing(*crop), crops),
+    }
+    kernels['pupil'] = (lambda crop: Pupil(*crop), crops)
+    kernels['calibration'] = (lambda crop: Calibration.find_best_threshold(crop[0]), crops)
+    if model_available():
+        kernels['refresh'] = (refresh_kernel(), [frame for _, frames in videos for frame in frames])
+    return kernels
+
+
+def time_kernel(fn, inputs, calls, warmup=20):
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    samples = []
+    for i in range(calls):
+        value = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(value)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def measure_allocations(fn, inputs, calls):
+    """Mean peak KB allocated per call, and bytes retained after all calls"""
+    # Allocated up front so the bookkeeping itself does not show up as retained
+    peaks = np.zeros(calls)
+    tracemalloc.start()
+    fn(inputs[0])
+    start_current, _ = tracemalloc.get_traced_memory()
+    for i in range(calls):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn(inputs[i % len(inputs)])
+        peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.get_traced_memory()[0] - start_current
+    tracemalloc.stop()
+    return float(peaks.mean()) / 1024.0, retained
+
+
+def inputs_checksum(videos, crops):
+    """Changes when the inputs do, e.g. other videos or a different OpenCV decoder"""
+    checksum = 0
+    for _, frames in videos:
+        for frame in frames:
+            checksum = zlib.crc32(frame.tobytes(), checksum)
+    for crop, threshold in crops:
+        checksum = zlib.crc32(crop.tobytes() + bytes([threshold]), checksum)
+    return checksum
+
+
+def compare(rows, baseline, tolerance):
+    """Annotates rows with their change against the baseline, returns the regressed kernel names"""
+    regressed = []
+    for row in rows:
+        base = baseline['kernels'].get(row['kernel'])
+        if base is None:
+            row['status'] = 'new'
+            continue
+        row['base_p50_ms'] = base['p50_ms']
+        row['change'] = f"{(row['p50_ms'] / base['p50_ms'] - 1.0) * 100.0:+.1f}%"
+        slower = row['p50_ms'] > base['p50_ms'] * (1.0 + tolerance)
+        # Small absolute growth of tiny allocations is noise, not a regression
+        heavier = row['peak_kb'] > base['peak_kb'] * (1.0 + tolerance) and row['peak_kb'] - base['peak_kb'] > 1.0
+        if slower or heavier:
+            row['status'] = 'REGRESSED' + (' (time)' if slower else '') + (' (memory)' if heavier else '')
+            regressed.append(row['kernel'])
+        elif row['p50_ms'] < base['p50_ms'] * (1.0 - tolerance):
+            row['status'] = 'faster'
+        else:
+            row['status'] = 'ok'
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=20, help='Frames sampled from each video')
+    parser.add_argument('--synthetic', type=int, default=200, help='Synthetic eye crops added to the video ones')
+    parser.add_argument('--calls', type=int, default=1000, help='Timed calls per kernel (inputs are cycled)')
+    parser.add_argument('--alloc-calls', type=int, default=200, help='Calls per kernel in the allocation pass')
+    parser.add_argument('--kernels', default='', help='Comma-separated kernels to run (default: all)')
+    parser.add_argument('--baseline', help='Compare with a baseline JSON written by --save-baseline')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Write the results as a baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Relative growth of median time or peak allocation counted as a regression')
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    videos = load_frames(args.frames)
+    samples = frame_landmarks(videos)
+    crops = eye_crops(samples, args.synthetic)
+    if not samples:
+        # No readable video: synthetic frames so the frame kernels still run
+        rng = np.random.default_rng(0)
+        samples = frame_landmarks([('synthetic', [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+                                                  for _ in range(args.frames)])])
+    kernels = build_kernels(videos, samples, crops)
+    if args.kernels:
+        wanted = args.kernels.split(',')
+        unknown = [name for name in wanted if name not in kernels]
+        if unknown:
+            parser.error(f"Unknown or unavailable kernels: {', '.join(unknown)} (have {', '.join(kernels)})")
+        kernels = {name: kernels[name] for name in wanted}
+
+    print(f"{len(samples)} frames from {', '.join(name for name, _ in videos) or 'synthetic noise'}, "
+          f"{len(crops)} eye crops, landmarks {'from the model' if model_available() else 'placed at fixed positions'}")
+    if not model_available():
+        print(f"No landmark model at {models.DEFAULT_PREDICTOR_PATH} (see download_model.sh), skipping refresh")
+
+    rows = []
+    for name, (fn, inputs) in kernels.items():
+        timing = time_kernel(fn, inputs, args.calls)
+        peak_kb, retained = measure_allocations(fn, inputs, args.alloc_calls)
+        row = {'kernel': name, 'inputs': len(inputs), 'peak_kb': peak_kb, 'retained_b': retained}
+        row.update(timing)
+        rows.append(row)
+
+    meta = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'inputs_checksum': inputs_checksum(videos, crops),
+        'frames': len(samples),
+        'crops': len(crops),
+        'landmark_model': model_available()
+    }
+
+    regressed = []
+    columns = [('kernel', 'kernel'), ('inputs', 'inputs'), ('calls', 'calls'), ('mean ms', 'mean_ms'),
+               ('p50 ms', 'p50_ms'), ('p90 ms', 'p90_ms'), ('p99 ms', 'p99_ms'), ('peak KB', 'peak_kb'),
+               ('retained B', 'retained_b')]
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ('inputs_checksum', 'machine', 'opencv', 'numpy', 'python'):
+            if baseline['meta'].get(key) != meta[key]:
+                print(f"Warning: {key} differs from the baseline ({baseline['meta'].get(key)} vs {meta[key]}), "
+                      "the comparison may not be meaningful")
+        regressed = compare(rows, baseline, args.tolerance)
+        columns += [('base p50 ms', 'base_p50_ms'), ('change', 'change'), ('status', 'status')]
+
+    print_table(rows, columns)
+
+    if args.save_baseline:
+        kernels_out = {row['kernel']: {key: row[key] for key in
+                                       ('calls', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'peak_kb',
+                                        'retained_b')}
+                       for row in rows}
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'meta': meta, 'kernels': kernels_out}, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if regressed:
+        print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Startup time, memory and thread-safety of the shared gaze model registry
+
+1. Startup/RSS: a fresh interpreter builds N trackers, once the old way
+   (every tracker loads its own detector and 68-point predictor) and once
+   through gaze_tracking.models (one predictor per process).
+2. Stress: T threads detect faces and predict landmarks on the same frames
+   concurrently with the shared predictor and their per-thread detectors;
+   every result is compared with a single-threaded reference run.
+
+Usage:
+    python benchmarks/bench_model_registry.py --trackers 4 --threads 8
+    python benchmarks/bench_model_registry.py --video SORA_DeepFake_Vid/Sora1.mp4 --rounds 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from bench_utils import print_table
+
+
+def rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024.0 * 1024.0)
+    except ImportError:
+        return float('nan')
+
+
+def child(mode, trackers):
+    """Runs in a fresh interpreter; prints startup time and RSS as JSON"""
+    import dlib
+    baseline = rss_mb()
+    start = time.perf_counter()
+
+    if mode == 'legacy':
+        from gaze_tracking.models import DEFAULT_PREDICTOR_PATH
+        # What each GazeTracking() did before the registry
+        instances = [(dlib.get_frontal_face_detector(), dlib.shape_predictor(DEFAULT_PREDICTOR_PATH))
+                     for _ in range(trackers)]
+    else:
+        from gaze_tracking import GazeTracking
+        instances = [GazeTracking() for _ in range(trackers)]
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'mode': mode, 'trackers': len(instances), 'startup_s': elapsed,
+                      'rss_mb': rss_mb(), 'rss_delta_mb': rss_mb() - baseline}))
+
+
+def measure_startup(trackers):
+    rows = []
+    for mode in ('legacy', 'shared'):
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--child', mode, '--trackers', str(trackers)],
+            cwd=bench_utils.REPO_ROOT)
+        rows.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return rows
+
+
+def load_frames(video, count):
+    frames = []
+    if video:
+        capture = cv2.VideoCapture(video)
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+        for index in np.linspace(0, total - 1, count).astype(int):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ok, frame = capture.read()
+            if ok:
+                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        capture.release()
+    return frames
+
+
+def landmarks_of(gray, detector, predictor):
+    faces = detector(gray)
+    if len(faces) == 0:
+        return None
+    shape = predictor(gray, faces[0])
+    return tuple((shape.part(i).x, shape.part(i).y) for i in range(shape.num_parts))
+
+
+def stress(frames, threads, rounds):
+    from gaze_tracking import models
+
+    predictor = models.shape_predictor()
+    reference = [landmarks_of(frame, models.face_detector(), predictor) for frame in frames]
+
+    mismatches = []
+    errors = []
+    calls = [0]
+    calls_lock = threading.Lock()
+
+    def worker(offset):
+        detector = models.face_detector()
+        done = 0
+        try:
+            for round_index in range(rounds):
+                for i in range(len(frames)):
+                    # Threads walk the frames from different starting points
+                    index = (i + offset + round_index) % len(frames)
+                    if landmarks_of(frames[index], detector, models.shape_predictor()) != reference[index]:
+                        mismatches.append(index)
+                    done += 1
+        except Exception as e:
+            errors.append(repr(e))
+        with calls_lock:
+            calls[0] += done
+
+    workers = [threading.Thread(target=worker, args=(t * 7,)) for t in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'frames': len(frames),
+        'faces': sum(1 for r in reference if r is not None),
+        'threads': threads,
+        'calls': calls[0],
+        'mismatches': len(mismatches),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'calls_per_s': calls[0] / elapsed if elapsed else 0.0,
+        'predictors_loaded': len(models.loaded_predictors())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trackers', type=int, default=4, help='Trackers built for the startup/RSS comparison')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent threads in the stress test')
+    parser.add_argument('--rounds', type=int, default=10, help='Passes over the frames per thread')
+    parser.add_argument('--video', default=os.path.join(bench_utils.REPO_ROOT, 'SORA_DeepFake_Vid', 'Sora1.mp4'),
+                        help='Video the stress-test frames are taken from')
+    parser.add_argument('--frames', type=int, default=20, help='Frames sampled from --video')
+    parser.add_argument('--child', choices=['legacy', 'shared'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.trackers)
+        return 0
+
+    print(f"Startup and memory for {args.trackers} trackers (fresh interpreter each)")
+    print_table(measure_startup(args.trackers), [
+        ('mode', 'mode'),
+        ('trackers', 'trackers'),
+        ('startup s', 'startup_s'),
+        ('RSS MB', 'rss_mb'),
+        ('RSS added MB', 'rss_delta_mb'),
+    ])
+
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        print(f"No frames could be read from {args.video}, skipping the stress test")
+        return 1
+
+    result = stress(frames, args.threads, args.rounds)
+    print(f"\nStress test: {result['threads']} threads x {args.rounds} rounds over {result['frames']} frames "
+          f"({result['faces']} with a face)")
+    print(f"  {result['calls']} detections+predictions, {result['calls_per_s']:.1f}/s, "
+          f"{result['mismatches']} mismatches against the single-threaded reference, "
+          f"{result['errors']} errors, {result['predictors_loaded']} predictor loaded")
+    if result['first_error']:
+        print(f"  first error: {result['first_error']}")
+    return 0 if result['mismatches'] == 0 and result['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+False rejects and cost of the no-face prefilter (gaze_tracking.prefilter)
+
+Recorded face footage is replayed as is and dimmed the way a webcam sees a
+darkening room (gain plus sensor noise). Each frame is checked by the
+prefilter and, unless --no-detector, by dlib's HOG detector on the full
+frame, the detector GazeTracking falls back to. A false reject is a frame
+the prefilter dropped although the detector finds a face in it; with
+--no-detector every footage frame counts as showing a face, which gives an
+upper bound. Faceless conditions derived from the same footage (lights off,
+hand over the lens, taped lens, black frame) show how much it catches.
+
+Usage:
+    python benchmarks/bench_no_face_prefilter.py
+    python benchmarks/bench_no_face_prefilter.py --video recording.mp4 --frames 300
+    python benchmarks/bench_no_face_prefilter.py --no-detector --dark-level 30 --flat-contrast 4
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+import bench_utils
+from bench_utils import print_table, summarize
+from gaze_tracking.prefilter import FacelessFilter
+
+# name -> (gain, sensor noise sigma) of footage that still shows the face
+FACE_CONDITIONS = [
+    ('original', 1.0, 0.0),
+    ('dim 50%', 0.5, 2.0),
+    ('dim 25%', 0.25, 2.0),
+    ('dim 15%', 0.15, 2.5),
+    ('dim 10%', 0.10, 2.5),
+]
+
+
+def read_frames(video, count):
+    """About count evenly spaced grayscale frames, read sequentially (seeking is slow)"""
+    capture = cv2.VideoCapture(video)
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    step = max(1, total // count)
+    frames = []
+    index = 0
+    while len(frames) < count:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        if index % step == 0:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        index += 1
+    capture.release()
+    return frames
+
+
+def dimmed(gray, gain, noise, rng):
+    frame = gray.astype(np.float32) * gain
+    if noise:
+        frame += rng.standard_normal(gray.shape, dtype=np.float32) * noise
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def faceless(gray, condition, rng):
+    """A frame without a visible face, derived from a footage frame"""
+    if condition == 'lights off':
+        return dimmed(gray, 0.03, 2.5, rng)
+    if condition == 'hand over lens':
+        # Out of focus skin lit through the fingers: only the coarsest shading survives
+        small = cv2.resize(gray, (16, 9), interpolation=cv2.INTER_AREA)
+        blurred = cv2.resize(cv2.GaussianBlur(small, (0, 0), sigmaX=2.0), gray.shape[::-1],
+                             interpolation=cv2.INTER_LINEAR)
+        return dimmed(blurred, 0.3, 2.0, rng)
+    if condition == 'taped lens':
+        return dimmed(np.full_like(gray, int(rng.integers(60, 200))), 1.0, 1.5, rng)
+    return dimmed(np.zeros_like(gray), 1.0, 1.0, rng)
+
+
+FACELESS_CONDITIONS = ['lights off', 'hand over lens', 'taped lens', 'black frame']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', action='append',
+                        help='Recorded footage of a face (repeatable; default: the SORA_DeepFake_Vid videos)')
+    parser.add_argument('--frames', type=int, default=60, help='Frames sampled from each video')
+    parser.add_argument('--no-detector', action='store_true',
+                        help='Assume every footage frame shows a face instead of asking the dlib detector')
+    parser.add_argument('--dark-level', type=int, default=FacelessFilter().dark_level)
+    parser.add_argument('--flat-contrast', type=float, default=FacelessFilter().flat_contrast)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    videos = args.video or sorted(glob.glob(os.path.join(bench_utils.REPO_ROOT, 'SORA_DeepFake_Vid', '*.mp4')))
+    grays = [gray for video in videos for gray in read_frames(video, args.frames)]
+    if not grays:
+        parser.error('No frames could be read')
+
+    prefilter = FacelessFilter(dark_level=args.dark_level, flat_contrast=args.flat_contrast)
+    detector = None
+    if not args.no_detector:
+        from gaze_tracking import models
+        detector = models.face_detector()
+
+    def has_face(gray):
+        return None if detector is None else len(detector(gray)) > 0
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    check_times = []
+    detector_times = []
+    for name, gain, noise in FACE_CONDITIONS:
+        row = {'condition': name, 'frames': 0, 'faces': 0, 'rejected': 0, 'false_rejects': 0}
+        for gray in grays:
+            frame = dimmed(gray, gain, noise, rng) if gain != 1.0 else gray
+            start = time.perf_counter()
+            reason = prefilter.check(frame)
+            check_times.append((time.perf_counter() - start) * 1000.0)
+            face = has_face(frame)
+            face = True if face is None else face
+            row['frames'] += 1
+            row['faces'] += face
+            row['rejected'] += reason is not None
+            row['false_rejects'] += face and reason is not None
+        row['false_reject_rate'] = row['false_rejects'] / float(row['faces']) if row['faces'] else 0.0
+        rows.append(row)
+
+    for name in FACELESS_CONDITIONS:
+        row = {'condition': name, 'frames': 0, 'faces': 0, 'rejected': 0, 'false_rejects': 0}
+        for gray in grays:
+            frame = faceless(gray, name, rng)
+            start = time.perf_counter()
+            reason = prefilter.check(frame)
+            check_times.append((time.perf_counter() - start) * 1000.0)
+            if detector is not None:
+                start = time.perf_counter()
+                face = len(detector(frame)) > 0
+                detector_times.append((time.perf_counter() - start) * 1000.0)
+            else:
+                face = False
+            row['frames'] += 1
+            row['faces'] += face
+            row['rejected'] += reason is not None
+            row['false_rejects'] += face and reason is not None
+        row['false_reject_rate'] = row['false_rejects'] / float(row['faces']) if row['faces'] else 0.0
+        rows.append(row)
+
+    sizes = sorted({f"{gray.shape[1]}x{gray.shape[0]}" for gray in grays})
+    print(f"{len(grays)} footage frames ({', '.join(sizes)}) from {len(videos)} video(s); faces "
+          f"{'according to the dlib HOG detector' if detector is not None else 'assumed on every footage frame'}")
+    print(f"dark_level={prefilter.dark_level}, flat_contrast={prefilter.flat_contrast}")
+    print_table(rows, [
+        ('condition', 'condition'),
+        ('frames', 'frames'),
+        ('with face', 'faces'),
+        ('rejected', 'rejected'),
+        ('false rejects', 'false_rejects'),
+        ('false-reject rate', 'false_reject_rate'),
+    ])
+
+    face_rows = rows[:len(FACE_CONDITIONS)]
+    faces = sum(row['faces'] for row in face_rows)
+    false_rejects = sum(row['false_rejects'] for row in face_rows)
+    print(f"False rejects over all face conditions: {false_rejects}/{faces} "
+          f"({false_rejects / float(faces) if faces else 0.0:.2%})")
+    timing = summarize(check_times)
+    print(f"Prefilter check: mean {timing['mean_ms'] * 1000.0:.1f} us, p99 {timing['p99_ms'] * 1000.0:.1f} us")
+    if detector_times:
+        timing = summarize(detector_times)
+        print(f"Full-frame detector on faceless frames, saved per rejected frame: "
+              f"mean {timing['mean_ms']:.1f} ms, p99 {timing['p99_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    main()
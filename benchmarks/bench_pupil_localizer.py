@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Agreement and speed of candidate pupil localizers against gaze_tracking.pupil
+
+Pupil.detect_iris ranks the full contour tree of the binarized eye and takes
+the polygon centroid of the second largest contour (the iris' hole border).
+Two shortcuts are replayed against it on the same binarized crops:
+
+    moments   when the frame holds exactly one 4-connected dark region away
+              from the border, the pixel moments of that region's bounding box
+    border    the same check, then only the hole border is traced, on the
+              bounding box plus a one pixel margin (findContours' offset keeps
+              the coordinates of the full frame)
+
+Frames failing the check fall back to the contour tree in both. 'moments'
+differs from the reference by the pixel-vs-polygon centroid; 'border' traces
+the very contour the reference picks and should agree exactly. Neither is
+wired into Pupil: at eye-crop sizes 'border' costs about as much as the tree
+it replaces, and 'moments' is not exact, for a few percent of a Pupil() call.
+
+The report gives, per candidate, the share of crops agreeing with the
+reference exactly and within 1 and 2 pixels, found/not found disagreements,
+and the time of the localization step alone and of a whole Pupil() call
+(smoothing and thresholding, which every localizer shares, included).
+
+Eye crops come from, in order of preference:
+    --crops FILE    a .npz written by --record (crops seen by GazeTracking)
+    --video FILE    eyes found with OpenCV's Haar eye cascade, masked like Eye does
+    synthetic eyes  when neither is given or the video has no usable eyes
+
+Usage:
+    python benchmarks/bench_pupil_localizer.py --record crops.npz --video SORA_DeepFake_Vid/Sora1.mp4
+    python benchmarks/bench_pupil_localizer.py --crops crops.npz
+    python benchmarks/bench_pupil_localizer.py --video SORA_DeepFake_Vid/Sora1.mp4 --frames 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from bench_utils import print_table, summarize
+from gaze_tracking.calibration import Calibration
+from gaze_tracking.pupil import Pupil
+
+
+def sample_frames(video, count):
+    """count evenly spaced BGR frames of a video"""
+    capture = cv2.VideoCapture(video)
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    for index in np.linspace(0, total - 1, min(count, total)).astype(int):
+        capture.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ok, frame = capture.read()
+        if ok:
+            yield frame
+    capture.release()
+
+
+def record_crops(video, frames, path):
+    """Saves the eye crops GazeTracking isolates on a video (needs dlib and the model)"""
+    from gaze_tracking import GazeTracking
+
+    gaze = GazeTracking()
+    crops = []
+    for frame in sample_frames(video, frames):
+        gaze.refresh(frame)
+        for eye in (gaze.eye_left, gaze.eye_right):
+            if eye is not None and eye.frame.size:
+                crops.append(eye.frame)
+    np.savez_compressed(path, *crops)
+    print(f"Recorded {len(crops)} eye crops to {path}")
+
+
+def load_crops(path):
+    with np.load(path) as data:
+        return [data[key] for key in sorted(data.files, key=lambda k: int(k.split('_')[1]))]
+
+
+def haar_crops(video, frames):
+    """Eye boxes from OpenCV's cascade, with the outside of an inscribed ellipse set to white"""
+    if not hasattr(cv2, 'CascadeClassifier'):
+        print("This OpenCV build has no cascade classifier, skipping the video")
+        return []
+    cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_eye.xml'))
+    crops = []
+    for frame in sample_frames(video, frames):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        for x, y, w, h in cascade.detectMultiScale(gray, 1.1, 5, minSize=(20, 20)):
+            # Keep the eye slit, roughly what the 6 landmarks enclose
+            box = gray[y + h // 4:y + 3 * h // 4, x:x + w]
+            mask = np.zeros(box.shape, np.uint8)
+            cv2.ellipse(mask, (w // 2, box.shape[0] // 2), (w // 2 - 5, box.shape[0] // 2 - 5), 0, 0, 360, 255, -1)
+            crop = box.copy()
+            crop[mask == 0] = 255
+            crops.append(crop)
+    return crops
+
+
+def synthetic_crops(count, rng):
+    """Almond-shaped eyes with a dark iris, a glint and sensor noise"""
+    crops = []
+    for _ in range(count):
+        width = int(rng.integers(25, 90))
+        height = max(12, int(width * rng.uniform(0.3, 0.5)))
+        crop = np.full((height, width), 255, np.uint8)
+        sclera = np.zeros((height, width), np.uint8)
+        cv2.ellipse(sclera, (width // 2, height // 2), (width // 2 - 5, height // 2 - 5), 0, 0, 360, 255, -1)
+        eye = rng.normal(rng.uniform(120, 200), 12, (height, width))
+        center = (int(rng.integers(width // 4, 3 * width // 4 + 1)), int(rng.integers(height // 3, 2 * height // 3 + 1)))
+        radius = max(3, int(height * rng.uniform(0.2, 0.4)))
+        cv2.circle(eye, center, radius, float(rng.uniform(20, 70)), -1)
+        cv2.circle(eye, (center[0] + radius // 3, center[1] - radius // 3), max(1, radius // 4), 230.0, -1)
+        crop[sclera > 0] = np.clip(eye, 0, 255).astype(np.uint8)[sclera > 0]
+        crops.append(crop)
+    return crops
+
+
+def locate_contours(iris_frame):
+    """The reference: Pupil.detect_iris on an already binarized frame, as (x, y) or None"""
+    pupil = Pupil.__new__(Pupil)
+    pupil.threshold = None
+    pupil.x = pupil.y = None
+    pupil.image_processing = lambda eye_frame, threshold: iris_frame
+    pupil.detect_iris(None)
+    return None if pupil.x is None else (pupil.x, pupil.y)
+
+
+def single_dark_region(iris_frame):
+    """Bounding box of the only dark region of the frame, or None when it is ambiguous"""
+    height, width = iris_frame.shape[:2]
+    x, y, w, h = cv2.boundingRect(cv2.bitwise_not(iris_frame))
+    if w == 0 or x == 0 or y == 0 or x + w == width or y + h == height:
+        return None
+    count, _ = cv2.connectedComponents(cv2.bitwise_not(iris_frame[y:y + h, x:x + w]), connectivity=4)
+    if count != 2:
+        return None
+    return x, y, w, h
+
+
+def locate_moments(iris_frame):
+    box = single_dark_region(iris_frame)
+    if box is None:
+        return locate_contours(iris_frame)
+    x, y, w, h = box
+    moments = cv2.moments(cv2.bitwise_not(iris_frame[y:y + h, x:x + w]), True)
+    return x + int(moments['m10'] / moments['m00']), y + int(moments['m01'] / moments['m00'])
+
+
+def locate_border(iris_frame):
+    box = single_dark_region(iris_frame)
+    if box is None:
+        return locate_contours(iris_frame)
+    x, y, w, h = box
+    # The margin holds the white around the region, so the tree is the outer
+    # border of the crop and the region's hole border, as in the full frame
+    margin = iris_frame[y - 1:y + h + 1, x - 1:x + w + 1]
+    contours, _ = cv2.findContours(margin, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE, offset=(x - 1, y - 1))[-2:]
+    contours = sorted(contours, key=cv2.contourArea)
+    try:
+        moments = cv2.moments(contours[-2])
+        return int(moments['m10'] / moments['m00']), int(moments['m01'] / moments['m00'])
+    except (IndexError, ZeroDivisionError):
+        return None
+
+
+LOCALIZERS = {
+    'contours': locate_contours,
+    'moments': locate_moments,
+    'border': locate_border,
+}
+
+
+def time_method(fn, inputs, repeat):
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def compare(binarized, localizer):
+    counts = {'exact': 0, 'within_1px': 0, 'within_2px': 0, 'found_mismatch': 0, 'not_found': 0}
+    worst = 0
+    for iris_frame in binarized:
+        reference = locate_contours(iris_frame)
+        candidate = localizer(iris_frame)
+        if (reference is None) != (candidate is None):
+            counts['found_mismatch'] += 1
+            continue
+        if reference is None:
+            counts['not_found'] += 1
+            distance = 0
+        else:
+            distance = max(abs(reference[0] - candidate[0]), abs(reference[1] - candidate[1]))
+        worst = max(worst, distance)
+        counts['exact'] += distance == 0
+        counts['within_1px'] += distance <= 1
+        counts['within_2px'] += distance <= 2
+    counts['worst_px'] = worst
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--crops', help='Replay eye crops saved with --record')
+    parser.add_argument('--record', metavar='FILE', help='Record the eye crops GazeTracking sees on --video to FILE')
+    parser.add_argument('--video', help='Video to take eyes from')
+    parser.add_argument('--frames', type=int, default=100, help='Frames sampled from --video')
+    parser.add_argument('--synthetic', type=int, default=1000, help='Synthetic crops when there are no real ones')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over all crops')
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.video:
+            parser.error('--record needs --video')
+        record_crops(args.video, args.frames, args.record)
+        return 0
+
+    if args.crops:
+        crops, source = load_crops(args.crops), args.crops
+    elif args.video:
+        crops, source = haar_crops(args.video, args.frames), f"Haar eyes of {args.video}"
+    else:
+        crops = []
+    if not crops:
+        crops, source = synthetic_crops(args.synthetic, np.random.default_rng(0)), 'synthetic eyes'
+
+    # The threshold a calibrated tracker would use for each crop
+    crops = [(crop, Calibration.find_best_threshold(crop)) for crop in crops]
+    binarized = [Pupil.image_processing(crop, threshold) for crop, threshold in crops]
+    print(f"{len(crops)} eye crops from {source}")
+
+    processing = time_method(lambda crop: Pupil.image_processing(*crop), crops, args.repeat)
+    rows = []
+    for name, localizer in LOCALIZERS.items():
+        agreement = compare(binarized, localizer)
+        step = time_method(localizer, binarized, args.repeat)
+        total = float(len(binarized))
+        rows.append({
+            'localizer': name,
+            'exact': agreement['exact'] / total,
+            'within_1px': agreement['within_1px'] / total,
+            'within_2px': agreement['within_2px'] / total,
+            'worst_px': agreement['worst_px'],
+            'found_mismatch': agreement['found_mismatch'],
+            'localize_us': step['mean_ms'] * 1000.0,
+            'localize_p99_us': step['p99_ms'] * 1000.0,
+            'pupil_us': (processing['mean_ms'] + step['mean_ms']) * 1000.0,
+        })
+    for row in rows:
+        row['localize_speedup'] = rows[0]['localize_us'] / row['localize_us']
+        row['speedup'] = rows[0]['pupil_us'] / row['pupil_us']
+
+    print_table(rows, [
+        ('localizer', 'localizer'),
+        ('exact', 'exact'),
+        ('<=1px', 'within_1px'),
+        ('<=2px', 'within_2px'),
+        ('worst px', 'worst_px'),
+        ('found mismatch', 'found_mismatch'),
+        ('localize us', 'localize_us'),
+        ('p99 us', 'localize_p99_us'),
+        ('localize speedup', 'localize_speedup'),
+        ('Pupil() us', 'pupil_us'),
+        ('speedup', 'speedup'),
+    ])
+    border = next(row for row in rows if row['localizer'] == 'border')
+    return 0 if border['exact'] == 1.0 and not any(row['found_mismatch'] for row in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Shared helpers for the benchmark scripts in this folder
+"""
+
+import os
+import sys
+import time
+
+# Make the repository modules importable when a script is run directly
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def time_calls(fn, repeat=100, warmup=5):
+    """Calls fn() repeatedly and returns per-call timing statistics in milliseconds"""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def summarize(samples):
+    """Mean and percentiles (ms) of a list of timings"""
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def percentile(p):
+        return ordered[min(n - 1, int(round(p / 100.0 * (n - 1))))]
+
+    return {
+        'calls': n,
+        'mean_ms': sum(ordered) / n,
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': ordered[-1]
+    }
+
+
+def print_table(rows, columns):
+    """Prints a list of dicts as an aligned text table"""
+    header = [title for title, _ in columns]
+    lines = []
+    for row in rows:
+        cells = []
+        for _, key in columns:
+            value = row.get(key, '')
+            cells.append(f"{value:.3f}" if isinstance(value, float) else str(value))
+        lines.append(cells)
+
+    widths = [max(len(header[i]), *(len(line[i]) for line in lines)) if lines else len(header[i])
+              for i in range(len(header))]
+    print("  ".join(title.rjust(width) for title, width in zip(header, widths)))
+    for cells in lines:
+        print("  ".join(cell.rjust(width) for cell, width in zip(cells, widths)))
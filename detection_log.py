@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Append-only detection log
+Detections are written as JSON Lines by a background thread in batches, one
+file per day (detections_YYYYMMDD.jsonl) that rolls over to numbered parts
+once it reaches a size limit. The reader streams entries file by file, so a
+day's log is never loaded into memory at once.
+
+Usage:
+    python detection_log.py tail --date 20250101
+    python detection_log.py summary --since 2025-01-01T08:00 --until 2025-01-01T12:00
+"""
+
+import argparse
+import glob
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+LOG_PREFIX = "detections_"
+_LOG_FILE_PATTERN = re.compile(r"^detections_(\d{8})(?:\.(\d+))?\.jsonl?$")
+
+
+class DetectionLogWriter:
+    def __init__(self, directory=".", batch_size=50, flush_interval=1.0,
+                 max_bytes=16 * 1024 * 1024, max_pending=10000):
+        """
+        directory: folder holding the daily log files
+        batch_size: entries written with a single flush
+        flush_interval: seconds an entry may wait before its batch is flushed
+        max_bytes: size after which the day's log continues in a new part
+        max_pending: entries that may wait for the writer before new ones are dropped
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._file = None
+        self._day = None
+        self._part = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="DetectionLogWriter", daemon=True)
+        self._thread.start()
+
+    def log(self, entry):
+        """Queue one entry (a JSON-serializable dict); never blocks the caller"""
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=5.0):
+        """Flush everything queued so far and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            stop = entry is None
+            batch = [] if stop else [entry]
+
+            # Collect more entries until the batch is full or the oldest one waited long enough
+            deadline = time.time() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                else:
+                    batch.append(entry)
+
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print(f"⚠️ Could not write detection log: {e}")
+
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write_batch(self, batch):
+        for entry in batch:
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+            self._open_for(datetime.now().strftime("%Y%m%d"), len(line.encode("utf-8")))
+            self._file.write(line)
+        self._file.flush()
+        self.written += len(batch)
+        self.batches += 1
+
+    def _path(self, day, part):
+        suffix = f".{part}" if part else ""
+        return os.path.join(self.directory, f"{LOG_PREFIX}{day}{suffix}.jsonl")
+
+    def _open_for(self, day, next_size):
+        """Make sure the open file is the current day's part with room for next_size bytes"""
+        if self._file is not None and day == self._day:
+            size = self._file.tell()
+            if size == 0 or size + next_size <= self.max_bytes:
+                return
+            self._file.close()
+            self._part += 1
+        else:
+            if self._file is not None:
+                self._file.close()
+            self._day = day
+            self._part = self._last_part(day)
+
+        # After a restart the last existing part may already be full
+        path = self._path(day, self._part)
+        while os.path.exists(path) and 0 < os.path.getsize(path) and \
+                os.path.getsize(path) + next_size > self.max_bytes:
+            self._part += 1
+            path = self._path(day, self._part)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _last_part(self, day):
+        parts = [int(m.group(2) or 0) for m in map(_LOG_FILE_PATTERN.match, os.listdir(self.directory))
+                 if m and m.group(1) == day and m.group(0).endswith(".jsonl")]
+        return max(parts, default=0)
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'pending': self._queue.qsize(),
+            'batches': self.batches
+        }
+
+
+def log_files(directory=".", date_from=None, date_to=None):
+    """Log files in chronological order, optionally limited to YYYYMMDD days (inclusive)"""
+    files = []
+    for path in glob.glob(os.path.join(directory, f"{LOG_PREFIX}*.json*")):
+        match = _LOG_FILE_PATTERN.match(os.path.basename(path))
+        if not match:
+            continue
+        day, part = match.group(1), int(match.group(2) or 0)
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        # Old single-document .json logs sort before the JSON Lines parts of the same day
+        files.append((day, path.endswith(".jsonl"), part, path))
+    return [path for _, _, _, path in sorted(files)]
+
+
+def iter_detections(directory=".", since=None, until=None):
+    """Stream detection entries, optionally between two datetimes"""
+    date_from = since.strftime("%Y%m%d") if since else None
+    date_to = until.strftime("%Y%m%d") if until else None
+
+    for path in log_files(directory, date_from, date_to):
+        for entry in _read_file(path):
+            if since or until:
+                try:
+                    timestamp = datetime.fromisoformat(entry["timestamp"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if (since and timestamp < since) or (until and timestamp > until):
+                    continue
+            yield entry
+
+
+def _read_file(path):
+    if path.endswith(".json"):
+        # Logs written before the JSON Lines format: one JSON array per day
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                yield from json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping unreadable log {path}: {e}")
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A torn last line after a crash should not hide the rest of the log
+                print(f"⚠️ Skipping malformed line {line_number} in {path}")
+
+
+def aggregate_detections(entries):
+    """Counts per name, per day and per hour over a stream of entries"""
+    names = Counter()
+    days = Counter()
+    hours = Counter()
+    total = 0
+    first = last = None
+
+    for entry in entries:
+        total += 1
+        names.update(entry.get("names", []))
+        timestamp = entry.get("timestamp", "")
+        days[timestamp[:10]] += 1
+        hours[timestamp[11:13]] += 1
+        first = first or timestamp
+        last = timestamp
+
+    return {
+        'detections': total,
+        'first': first,
+        'last': last,
+        'names': dict(names.most_common()),
+        'per_day': dict(sorted(days.items())),
+        'per_hour': dict(sorted(hours.items()))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["tail", "summary"],
+                        help="tail: print the matching entries, summary: aggregate them")
+    parser.add_argument("--dir", default=".", help="Folder holding the detection logs")
+    parser.add_argument("--date", default=None, help="Single day, YYYYMMDD")
+    parser.add_argument("--since", default=None, help="ISO datetime lower bound")
+    parser.add_argument("--until", default=None, help="ISO datetime upper bound")
+    args = parser.parse_args()
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+    if args.date:
+        day = datetime.strptime(args.date, "%Y%m%d")
+        since = since or day
+        until = until or day.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+    entries = iter_detections(args.dir, since, until)
+    if args.command == "tail":
+        for entry in entries:
+            print(json.dumps(entry, ensure_ascii=False))
+    else:
+        print(json.dumps(aggregate_detections(entries), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Bulk registration import for the Face Recognition Service
+Encodes a directory or zip archive of studentId-named photos across a
+process pool and reports every image that could not be used
+
+Usage:
+    python face_bulk_import.py roster/ --url http://localhost:5002
+    python face_bulk_import.py roster.zip --dry-run
+"""
+
+import argparse
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif'}
+
+# Limits on uploaded archives, checked against the sizes the zip declares
+# before anything is decompressed (zipfile never reads past a declared size)
+MAX_ARCHIVE_MEMBERS = 20000
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_ARCHIVE_BYTES = 1024 * 1024 * 1024
+
+
+def student_id_from_filename(filename):
+    """'1234.jpg' -> 1234, 's-1234.png' -> 's-1234' (Node uses numeric ids)"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return int(stem) if stem.isdigit() else stem
+
+
+def collect_images(source):
+    """Returns [(filename, image_bytes)] for every image in a directory or zip archive"""
+    images = []
+    if isinstance(source, (bytes, bytearray)) or zipfile.is_zipfile(source):
+        archive_file = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        with zipfile.ZipFile(archive_file) as archive:
+            members = archive.infolist()
+            if len(members) > MAX_ARCHIVE_MEMBERS:
+                raise ValueError(f"Archive has {len(members)} entries, at most {MAX_ARCHIVE_MEMBERS} are accepted")
+            total_bytes = 0
+            for info in members:
+                name = info.filename
+                if info.is_dir() or os.path.basename(name).startswith('.'):
+                    continue
+                if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                if info.file_size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"{name} is {info.file_size} bytes uncompressed, "
+                                     f"at most {MAX_IMAGE_BYTES} are accepted per image")
+                total_bytes += info.file_size
+                if total_bytes > MAX_ARCHIVE_BYTES:
+                    raise ValueError(f"Archive images exceed {MAX_ARCHIVE_BYTES} bytes uncompressed")
+                images.append((name, archive.read(info)))
+    elif os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path) and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                with open(path, 'rb') as f:
+                    images.append((name, f.read()))
+    else:
+        raise ValueError(f"{source} is neither a directory nor a zip archive")
+    return images
+
+
+def encode_image(item):
+    """Process-pool task: returns (filename, encoding or None, error or None)"""
+    # Imported here so the parent process does not need dlib to build the task list
+    from PIL import Image
+    from face_profiles import locate_faces, encode_faces
+
+    filename, image_bytes, profile = item
+    try:
+        rgb_image = np.array(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+        face_locations = locate_faces(rgb_image, profile)
+        if not face_locations:
+            return filename, None, 'no face'
+        if len(face_locations) > 1:
+            return filename, None, f'multiple faces ({len(face_locations)})'
+        _, face_encodings = encode_faces(rgb_image, profile, known_locations=face_locations)
+        return filename, face_encodings[0], None
+    except Exception as e:
+        return filename, None, f'unreadable image: {str(e)}'
+
+
+def encode_roster(source, processes=None, profile='accurate'):
+    """
+    Encodes every photo of a roster in parallel
+
+    Returns:
+        (entries, failures) where entries is [(studentId, studentName, encoding)]
+        and failures is [{'file', 'studentId', 'error'}]
+    """
+    images = [(filename, image_bytes, profile) for filename, image_bytes in collect_images(source)]
+    entries = []
+    failures = []
+    seen = {}
+
+    if not images:
+        return entries, failures
+
+    processes = processes or os.cpu_count() or 1
+    # Spawned workers stay safe when the caller is a threaded Flask server
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(processes, len(images)), mp_context=ctx) as pool:
+        chunksize = max(1, len(images) // (processes * 4))
+        for filename, encoding, error in pool.map(encode_image, images, chunksize=chunksize):
+            student_id = student_id_from_filename(filename)
+            if error is None and student_id in seen:
+                error = f'duplicate studentId (also in {seen[student_id]})'
+            if error is not None:
+                failures.append({'file': filename, 'studentId': student_id, 'error': error})
+                continue
+            seen[student_id] = filename
+            entries.append((student_id, f'Student {student_id}', encoding))
+
+    return entries, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='Directory or zip archive of <studentId>.<ext> photos')
+    parser.add_argument('--url', default='http://localhost:5002',
+                        help='Face Recognition Service to commit the encodings to')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Encoding processes (default: one per CPU core)')
+    parser.add_argument('--profile', default='accurate',
+                        help='Encoding profile (fast, balanced, accurate)')
+    parser.add_argument('--replace', action='store_true',
+                        help='Replace the whole registry instead of adding to it')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only encode and report, do not contact the service')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    entries, failures = encode_roster(args.source, processes=args.processes, profile=args.profile)
+    for failure in failures:
+        print(f"FAILED {failure['file']}: {failure['error']}")
+    print(f"Encoded {len(entries)} students, {len(failures)} failures")
+
+    if args.dry_run or not entries:
+        return 0 if entries else 1
+
+    import requests
+
+    payload = {
+        'replace': args.replace,
+        'encodings': [
+            {'studentId': student_id, 'studentName': student_name, 'encoding': encoding.tolist()}
+            for student_id, student_name, encoding in entries
+        ]
+    }
+    response = requests.post(f"{args.url.rstrip('/')}/register/bulk", json=payload, timeout=120)
+    response.raise_for_status()
+    result = response.json()
+    print(f"Committed {result.get('registered', 0)} students to {args.url} "
+          f"({result.get('students_registered')} registered in total)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
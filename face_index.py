@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Nearest-neighbour indexes over 128-d face encodings
+ExactIndex scans every enrolled encoding; IVFIndex partitions them with
+k-means and only scans the partitions closest to the query
+"""
+
+import threading
+
+import numpy as np
+
+ENCODING_SIZE = 128
+
+
+def _squared_distances(vectors, query):
+    """Squared Euclidean distance from every row of vectors to query"""
+    diff = vectors - query
+    return np.einsum('ij,ij->i', diff, diff)
+
+
+def _top_k(ids, squared, k):
+    """Returns the k closest (id, distance) pairs, closest first"""
+    if len(squared) == 0:
+        return []
+    k = min(k, len(squared))
+    nearest = np.argpartition(squared, k - 1)[:k]
+    nearest = nearest[np.argsort(squared[nearest])]
+    # Same metric as face_recognition.face_distance
+    return [(ids[i], float(np.sqrt(squared[i]))) for i in nearest]
+
+
+class _VectorList:
+    """Growable array of encodings with their ids and O(1) swap-removal"""
+
+    def __init__(self, capacity=16):
+        self.vectors = np.empty((capacity, ENCODING_SIZE), dtype=np.float64)
+        self.ids = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, student_id, encoding):
+        if len(self.ids) == len(self.vectors):
+            grown = np.empty((len(self.vectors) * 2, ENCODING_SIZE), dtype=np.float64)
+            grown[:len(self.ids)] = self.vectors[:len(self.ids)]
+            self.vectors = grown
+        self.vectors[len(self.ids)] = encoding
+        self.ids.append(student_id)
+        return len(self.ids) - 1
+
+    def remove(self, position):
+        """Removes the row at position, returns the id moved into its place (or None)"""
+        last = len(self.ids) - 1
+        moved = None
+        if position != last:
+            self.vectors[position] = self.vectors[last]
+            self.ids[position] = self.ids[last]
+            moved = self.ids[position]
+        self.ids.pop()
+        return moved
+
+    def view(self):
+        return self.vectors[:len(self.ids)]
+
+
+class ExactIndex:
+    """Brute-force index, equivalent to face_recognition.face_distance over all students"""
+
+    kind = 'exact'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._list = _VectorList()
+        self._position = {}  # {studentId: row}
+
+    def __len__(self):
+        return len(self._list)
+
+    def __contains__(self, student_id):
+        return student_id in self._position
+
+    def add(self, student_id, encoding):
+        """Inserts a student, replacing any previous encoding"""
+        encoding = np.asarray(encoding, dtype=np.float64)
+        with self._lock:
+            row = self._position.get(student_id)
+            if row is not None:
+                self._list.vectors[row] = encoding
+            else:
+                self._position[student_id] = self._list.append(student_id, encoding)
+
+    def remove(self, student_id):
+        with self._lock:
+            row = self._position.pop(student_id, None)
+            if row is None:
+                return False
+            moved = self._list.remove(row)
+            if moved is not None:
+                self._position[moved] = row
+            return True
+
+    def search(self, query, k=1, **kwargs):
+        """Returns up to k (studentId, distance) pairs, closest first"""
+        query = np.asarray(query, dtype=np.float64)
+        with self._lock:
+            return _top_k(self._list.ids, _squared_distances(self._list.view(), query), k)
+
+    def stats(self):
+        return {'kind': self.kind, 'size': len(self)}
+
+
+class IVFIndex:
+    """
+    Inverted-file index: encodings are assigned to the nearest of nlist
+    k-means centroids and a search only scans the nprobe closest lists.
+    Raising nprobe trades latency for recall; nprobe >= nlist (or
+    exact=True) scans everything. Until enough encodings exist to train the
+    centroids, every search is exact.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, nlist=64, nprobe=8, min_train_per_list=39, kmeans_iterations=20, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_per_list = min_train_per_list
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+
+        self._lock = threading.RLock()
+        self.centroids = None
+        self._lists = [_VectorList()]  # single untrained list until train()
+        self._position = {}            # {studentId: (list_no, row)}
+        self._inserts_since_train = 0
+
+    def __len__(self):
+        return len(self._position)
+
+    def __contains__(self, student_id):
+        return student_id in self._position
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _kmeans(self, vectors, k):
+        """Plain Lloyd's k-means with k-means++ seeding"""
+        n = len(vectors)
+        centroids = np.empty((k, vectors.shape[1]), dtype=np.float64)
+        centroids[0] = vectors[self._rng.integers(n)]
+        closest = _squared_distances(vectors, centroids[0])
+        for c in range(1, k):
+            total = closest.sum()
+            if total <= 0:
+                centroids[c:] = vectors[self._rng.integers(n, size=k - c)]
+                break
+            centroids[c] = vectors[self._rng.choice(n, p=closest / total)]
+            closest = np.minimum(closest, _squared_distances(vectors, centroids[c]))
+
+        for _ in range(self.kmeans_iterations):
+            assignment = self._assign(vectors, centroids)
+            counts = np.bincount(assignment, minlength=k)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            filled = counts > 0
+            updated = centroids.copy()
+            updated[filled] = sums[filled] / counts[filled, None]
+            if np.allclose(updated, centroids):
+                break
+            centroids = updated
+        return centroids
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        """Index of the nearest centroid for every row of vectors"""
+        # |v - c|^2 = |v|^2 - 2 v.c + |c|^2, the |v|^2 term does not change the argmin
+        scores = (centroids ** 2).sum(axis=1)[None, :] - 2.0 * vectors @ centroids.T
+        return np.argmin(scores, axis=1)
+
+    def train(self, nlist=None):
+        """(Re)builds the centroids from the current contents and reassigns everything"""
+        with self._lock:
+            ids = [student_id for lst in self._lists for student_id in lst.ids]
+            if not ids:
+                return False
+            vectors = np.concatenate([lst.view() for lst in self._lists])
+            k = min(nlist or self.nlist, len(ids))
+            self.centroids = self._kmeans(vectors, k)
+
+            assignment = self._assign(vectors, self.centroids)
+            self._lists = [_VectorList() for _ in range(k)]
+            self._position = {}
+            for student_id, encoding, list_no in zip(ids, vectors, assignment):
+                row = self._lists[list_no].append(student_id, encoding)
+                self._position[student_id] = (int(list_no), row)
+            self._inserts_since_train = 0
+            return True
+
+    def _maybe_train(self):
+        # Train once there is enough data, and retrain when the index has
+        # doubled since the last training so the partitions stay balanced
+        if not self.is_trained:
+            if len(self) >= self.nlist * self.min_train_per_list:
+                self.train()
+        elif self._inserts_since_train > max(len(self) // 2, self.nlist * self.min_train_per_list):
+            self.train()
+
+    def add(self, student_id, encoding):
+        encoding = np.asarray(encoding, dtype=np.float64)
+        with self._lock:
+            self._remove_locked(student_id)
+            list_no = 0
+            if self.is_trained:
+                list_no = int(self._assign(encoding[None, :], self.centroids)[0])
+            row = self._lists[list_no].append(student_id, encoding)
+            self._position[student_id] = (list_no, row)
+            self._inserts_since_train += 1
+            self._maybe_train()
+
+    def _remove_locked(self, student_id):
+        location = self._position.pop(student_id, None)
+        if location is None:
+            return False
+        list_no, row = location
+        moved = self._lists[list_no].remove(row)
+        if moved is not None:
+            self._position[moved] = (list_no, row)
+        return True
+
+    def remove(self, student_id):
+        with self._lock:
+            return self._remove_locked(student_id)
+
+    def search(self, query, k=1, nprobe=None, exact=False):
+        """Returns up to k (studentId, distance) pairs, closest first
+
+        Arguments:
+            query: 128-d face encoding
+            k: number of neighbours to return
+            nprobe: number of partitions to scan (defaults to self.nprobe)
+            exact: scan every partition
+        """
+        query = np.asarray(query, dtype=np.float64)
+        with self._lock:
+            if not self.is_trained or exact:
+                probed = range(len(self._lists))
+            else:
+                nprobe = min(nprobe or self.nprobe, len(self._lists))
+                centroid_distances = _squared_distances(self.centroids, query)
+                probed = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+
+            ids = []
+            blocks = []
+            for list_no in probed:
+                lst = self._lists[list_no]
+                if len(lst):
+                    ids.extend(lst.ids)
+                    blocks.append(lst.view())
+            if not blocks:
+                return []
+            return _top_k(ids, _squared_distances(np.concatenate(blocks), query), k)
+
+    def stats(self):
+        with self._lock:
+            sizes = [len(lst) for lst in self._lists]
+            return {
+                'kind': self.kind,
+                'size': len(self),
+                'trained': self.is_trained,
+                'nlist': len(self._lists) if self.is_trained else self.nlist,
+                'nprobe': self.nprobe,
+                'largest_list': max(sizes) if sizes else 0
+            }
+
+
+def build_index(kind='exact', **options):
+    """Creates an index by name ('exact' or 'ivf')"""
+    if kind == 'exact':
+        return ExactIndex()
+    if kind == 'ivf':
+        return IVFIndex(**options)
+    raise ValueError(f"Unknown index type: {kind}")
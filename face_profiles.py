@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Speed/accuracy profiles for face detection and encoding
+Shared by the Face Recognition Service and quick.py so enrollment can spend
+CPU on accuracy while periodic checks stay cheap
+"""
+
+import cv2
+import face_recognition
+
+# Landmark model aligning every face before encoding. It is the same for all
+# profiles: references and probes aligned by different models drift apart, and
+# the match thresholds and the sequential test are tuned for this one
+LANDMARK_MODEL = 'small'
+
+# detection_scale: image scale used for HOG detection (encodings always use the full image)
+# upsample: face_locations number_of_times_to_upsample
+# num_jitters: times the face is re-sampled and averaged when encoding
+ENCODING_PROFILES = {
+    'fast': {
+        'detection_scale': 0.5,
+        'upsample': 1,
+        'num_jitters': 1
+    },
+    # Same settings face_recognition uses by default
+    'balanced': {
+        'detection_scale': 1.0,
+        'upsample': 1,
+        'num_jitters': 1
+    },
+    # Meant for enrollment, where a reference is encoded once and reused all
+    # exam. Jitters only repeat the encoding step, not detection, and 3 keep a
+    # registration surge cheap while still averaging out a bad crop
+    'accurate': {
+        'detection_scale': 1.0,
+        'upsample': 1,
+        'num_jitters': 3
+    }
+}
+
+DEFAULT_ENROLL_PROFILE = 'accurate'
+DEFAULT_VERIFY_PROFILE = 'balanced'
+
+
+def get_profile(name, **overrides):
+    """Returns the settings of a named profile, optionally with some values overridden"""
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}' "
+                         f"(choose from {', '.join(ENCODING_PROFILES)})")
+    profile = dict(ENCODING_PROFILES[name])
+    profile.update(overrides)
+    return profile
+
+
+def locate_faces(rgb_image, profile):
+    """Finds faces with the profile's detection settings
+
+    Arguments:
+        rgb_image (numpy.ndarray): RGB image
+        profile (dict or str): Profile settings or profile name
+
+    Returns:
+        Face locations (top, right, bottom, left) in rgb_image coordinates
+    """
+    if isinstance(profile, str):
+        profile = get_profile(profile)
+
+    scale = profile['detection_scale']
+    if scale == 1.0:
+        return face_recognition.face_locations(
+            rgb_image, number_of_times_to_upsample=profile['upsample'], model="hog")
+
+    small_image = cv2.resize(rgb_image, (0, 0), fx=scale, fy=scale)
+    small_locations = face_recognition.face_locations(
+        small_image, number_of_times_to_upsample=profile['upsample'], model="hog")
+
+    height, width = rgb_image.shape[:2]
+    return [
+        (max(0, int(top / scale)), min(width, int(right / scale)),
+         min(height, int(bottom / scale)), max(0, int(left / scale)))
+        for top, right, bottom, left in small_locations
+    ]
+
+
+def encode_faces(rgb_image, profile, known_locations=None):
+    """Detects (unless locations are given) and encodes faces with a profile
+
+    Returns:
+        (face_locations, face_encodings)
+    """
+    if isinstance(profile, str):
+        profile = get_profile(profile)
+
+    face_locations = known_locations
+    if face_locations is None:
+        face_locations = locate_faces(rgb_image, profile)
+    if not face_locations:
+        return [], []
+
+    face_encodings = face_recognition.face_encodings(
+        rgb_image, face_locations,
+        num_jitters=profile['num_jitters'],
+        model=LANDMARK_MODEL)
+    return face_locations, face_encodings
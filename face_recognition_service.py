@@ -12,18 +12,37 @@ import json
 import os
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from PIL import Image
 import logging
 from datetime import datetime
 import io
 import threading
+import argparse
+import multiprocessing
+import secrets
+import socket
+
+from face_registry import FaceRegistry, SharedFaceRegistry, default_registry_path
+from face_index import build_index
+from face_bulk_import import encode_roster
+from face_registration_queue import RegistrationQueue, QueueFullError
+from face_sequential import SequentialVerifier
+from face_profiles import ENCODING_PROFILES, DEFAULT_ENROLL_PROFILE, DEFAULT_VERIFY_PROFILE, encode_faces
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_UPLOAD_BYTES = 256 * 1024 * 1024
+
 class FaceRecognitionService:
-    def __init__(self):
+    def __init__(self, registry=None, worker_id=None, index_type='exact', index_options=None,
+                 registration_workers=2, registration_queue_depth=100, job_store=None,
+                 enroll_profile=DEFAULT_ENROLL_PROFILE, verify_profile=DEFAULT_VERIFY_PROFILE,
+                 max_upload_bytes=DEFAULT_MAX_UPLOAD_BYTES, callback_hosts=(), sequential_secret=None):
+        self.worker_id = worker_id
+
         # Statistics tracking
         self.stats_lock = threading.Lock()
         self.stats = {
@@ -37,17 +56,41 @@ class FaceRecognitionService:
             'last_analysis': None
         }
         
-        # Student reference data storage (in-memory during session)
-        self.students_lock = threading.Lock()
-        self.student_references = {}  # {studentId: encoding}
-        self.student_names = {}       # {studentId: name}
+        # Student reference data storage (in-memory during session, or shared
+        # between worker processes in multi-process mode)
+        self.registry = registry if registry is not None else FaceRegistry()
+        
+        # Identity search index over every registered student, kept in sync
+        # with the registry lazily (see _sync_identity_index)
+        self.identity_index = build_index(index_type, **(index_options or {}))
+        self.index_lock = threading.Lock()
+        self.index_generation = None
+        self.indexed_places = {}  # {registry place: studentId} currently in the index
+        
+        # Registrations are processed as jobs so request threads never wait on HOG + encoding
+        self.registration_queue = RegistrationQueue(
+            self.process_registration,
+            workers=registration_workers,
+            max_depth=registration_queue_depth,
+            job_store=job_store,
+            callback_hosts=callback_hosts
+        )
         
         # Recognition settings
         self.recognition_threshold = 0.45  # Maximum distance for match
         self.high_confidence_threshold = 0.4  # High confidence match
         
+        # Per-student sequential test over the stream of face distances
+        self.sequential = SequentialVerifier(secret=sequential_secret)
+        
+        # Encoding profiles per operation (see face_profiles.py), overridable per request
+        self.enroll_profile = enroll_profile
+        self.verify_profile = verify_profile
+        
         # Flask app setup
         self.app = Flask(__name__)
+        # Bounds every request body, roster archives and bulk encodings included (larger ones get 413)
+        self.app.config['MAX_CONTENT_LENGTH'] = max_upload_bytes
         CORS(self.app)
         self.setup_routes()
         
@@ -75,13 +118,13 @@ class FaceRecognitionService:
         @self.app.route('/health', methods=['GET'])
         def health_check():
             """Health check endpoint"""
-            with self.stats_lock:
-                students_count = len(self.student_references)
+            students_count = len(self.registry)
             
             return jsonify({
                 'status': 'healthy',
                 'service': 'face-recognition',
                 'students_registered': students_count,
+                'worker_id': self.worker_id,
                 'timestamp': datetime.now().isoformat()
             })
         
@@ -92,10 +135,13 @@ class FaceRecognitionService:
                 uptime = datetime.now() - self.stats['start_time']
                 stats_copy = self.stats.copy()
             
-            with self.students_lock:
-                stats_copy['students_registered'] = len(self.student_references)
-            
+            stats_copy['students_registered'] = len(self.registry)
             stats_copy['uptime_seconds'] = int(uptime.total_seconds())
+            stats_copy['worker_id'] = self.worker_id
+            stats_copy['identity_index'] = self.identity_index.stats()
+            stats_copy['registration_queue'] = self.registration_queue.stats()
+            stats_copy['sequential_verification'] = self.sequential.stats()
+            stats_copy['pid'] = os.getpid()
             stats_copy['status'] = 'running'
             
             return jsonify(stats_copy)
@@ -115,21 +161,50 @@ class FaceRecognitionService:
                 if not student_id or not reference_image:
                     return jsonify({'error': 'Missing studentId or referenceImage'}), 400
                 
-                # Process the reference image
-                result = self.register_student_reference(student_id, student_name, reference_image)
+                profile = data.get('profile', self.enroll_profile)
+                if profile not in ENCODING_PROFILES:
+                    return jsonify({'error': f'Unknown encoding profile: {profile}'}), 400
                 
-                if result['success']:
-                    self.update_stats(students_registered=1)
-                else:
-                    self.update_stats(errors=1)
+                payload = {
+                    'studentId': student_id,
+                    'studentName': student_name,
+                    'referenceImage': reference_image,
+                    'profile': profile
+                }
                 
-                return jsonify(result)
+                # Synchronous registration for callers that opt out of the queue
+                if data.get('wait'):
+                    return jsonify(self.process_registration(payload))
+                
+                try:
+                    job = self.registration_queue.submit(payload, callback_url=data.get('callbackUrl'))
+                except QueueFullError as e:
+                    response = jsonify({
+                        'success': False,
+                        'error': str(e),
+                        'queue_depth': e.depth,
+                        'retry_after_seconds': e.retry_after
+                    })
+                    response.headers['Retry-After'] = str(e.retry_after)
+                    return response, 503
+                
+                job['success'] = True
+                job['status_url'] = f"/register/jobs/{job['jobId']}"
+                return jsonify(job), 202
                 
             except Exception as e:
                 logger.error(f"Error in register_student: {str(e)}")
                 self.update_stats(errors=1)
                 return jsonify({'error': f'Registration failed: {str(e)}'}), 500
         
+        @self.app.route('/register/jobs/<job_id>', methods=['GET'])
+        def registration_status(job_id):
+            """Status and result of a queued registration"""
+            job = self.registration_queue.status(job_id)
+            if job is None:
+                return jsonify({'error': f'Unknown or expired registration job {job_id}'}), 404
+            return jsonify(job)
+        
         @self.app.route('/analyze', methods=['POST'])
         def analyze_frame():
             """Main endpoint to analyze face verification in a frame"""
@@ -140,25 +215,28 @@ class FaceRecognitionService:
                 
                 student_id = data.get('studentId')
                 frame_data = data.get('frameData')
+                profile = data.get('profile', self.verify_profile)
                 
                 if not student_id or not frame_data:
                     return jsonify({'error': 'Missing studentId or frameData'}), 400
+                if profile not in ENCODING_PROFILES:
+                    return jsonify({'error': f'Unknown encoding profile: {profile}'}), 400
                 
                 # Check if student is registered
-                with self.students_lock:
-                    if student_id not in self.student_references:
-                        return jsonify({
-                            'success': True,
-                            'face_verification': 'not_registered',
-                            'verification_text': 'Student not registered',
-                            'confidence': 0.0,
-                            'face_detected': False,
-                            'studentId': student_id,
-                            'timestamp': datetime.now().isoformat()
-                        })
+                if student_id not in self.registry:
+                    return jsonify({
+                        'success': True,
+                        'face_verification': 'not_registered',
+                        'verification_text': 'Student not registered',
+                        'confidence': 0.0,
+                        'face_detected': False,
+                        'studentId': student_id,
+                        'timestamp': datetime.now().isoformat()
+                    })
                 
                 # Analyze the frame
-                result = self.analyze_face_from_base64(student_id, frame_data)
+                result = self.analyze_face_from_base64(student_id, frame_data, profile=profile,
+                                                       sequential_state=data.get('sequentialState'))
                 
                 # Update stats
                 self.update_stats(frames_processed=1)
@@ -181,7 +259,117 @@ class FaceRecognitionService:
                 self.update_stats(errors=1)
                 return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
     
-    def register_student_reference(self, student_id, student_name, reference_image):
+        @self.app.route('/register/bulk', methods=['POST'])
+        def register_bulk():
+            """Register a whole roster from a zip upload or precomputed encodings"""
+            try:
+                if 'archive' in request.files:
+                    source = request.files['archive'].read()
+                    replace = request.form.get('replace', 'false').lower() == 'true'
+                    result = self.bulk_register(source=source, replace=replace)
+                else:
+                    data = request.get_json()
+                    if not data:
+                        return jsonify({'error': 'No JSON data or archive provided'}), 400
+                    
+                    replace = bool(data.get('replace', False))
+                    if data.get('encodings'):
+                        if not isinstance(data['encodings'], list):
+                            return jsonify({'error': 'encodings must be a list'}), 400
+                        entries = []
+                        for position, item in enumerate(data['encodings']):
+                            if not isinstance(item, dict) or not item.get('studentId') or 'encoding' not in item:
+                                return jsonify({'error': f'Encoding {position} needs a studentId and an encoding'}), 400
+                            try:
+                                encoding = np.asarray(item['encoding'], dtype=np.float64)
+                            except (TypeError, ValueError):
+                                encoding = None
+                            if encoding is None or encoding.shape != (128,) or not np.all(np.isfinite(encoding)):
+                                return jsonify({'error': f'Encoding {position} must have 128 finite values'}), 400
+                            entries.append((item['studentId'],
+                                            str(item.get('studentName', f"Student {item['studentId']}")),
+                                            encoding))
+                        result = self.bulk_register(entries=entries, replace=replace)
+                    else:
+                        return jsonify({'error': 'Missing archive or encodings'}), 400
+                
+                return jsonify(result)
+                
+            except RequestEntityTooLarge:
+                return jsonify({'error': f"Upload larger than {self.app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error in register_bulk: {str(e)}")
+                self.update_stats(errors=1)
+                return jsonify({'error': f'Bulk registration failed: {str(e)}'}), 500
+        
+        @self.app.route('/identify', methods=['POST'])
+        def identify_frame():
+            """Search a frame's face against every registered student"""
+            try:
+                data = request.get_json()
+                if not data:
+                    return jsonify({'error': 'No JSON data provided'}), 400
+                
+                frame_data = data.get('frameData')
+                if not frame_data:
+                    return jsonify({'error': 'Missing frameData'}), 400
+                
+                nprobe = data.get('nprobe')
+                profile = data.get('profile', self.verify_profile)
+                if profile not in ENCODING_PROFILES:
+                    return jsonify({'error': f'Unknown encoding profile: {profile}'}), 400
+                
+                result = self.identify_face_from_base64(
+                    frame_data,
+                    profile=profile,
+                    k=int(data.get('k', 5)),
+                    nprobe=int(nprobe) if nprobe else None,
+                    exact=bool(data.get('exact', False))
+                )
+                self.update_stats(frames_processed=1)
+                return jsonify(result)
+                
+            except Exception as e:
+                logger.error(f"Error in identify_frame: {str(e)}")
+                self.update_stats(errors=1)
+                return jsonify({'error': f'Identification failed: {str(e)}'}), 500
+        
+        @self.app.route('/students', methods=['GET'])
+        def list_students():
+            """List registered students"""
+            return jsonify(self.get_student_list())
+        
+        @self.app.route('/students/<student_id>', methods=['DELETE'])
+        def delete_student(student_id):
+            """Remove a student's reference photo"""
+            # Node registers numeric ids, so accept them in their URL form too
+            if student_id not in self.registry and student_id.isdigit():
+                student_id = int(student_id)
+            if student_id not in self.registry:
+                return jsonify({'error': f'Student {student_id} not registered'}), 404
+            
+            self.clear_student_data(student_id)
+            return jsonify({
+                'success': True,
+                'studentId': student_id,
+                'timestamp': datetime.now().isoformat()
+            })
+    
+    def process_registration(self, payload):
+        """Run one registration job and record its outcome in the stats"""
+        result = self.register_student_reference(
+            payload['studentId'], payload['studentName'], payload['referenceImage'],
+            profile=payload.get('profile'))
+        
+        if result['success']:
+            self.update_stats(students_registered=1)
+        else:
+            self.update_stats(errors=1)
+        return result
+    
+    def register_student_reference(self, student_id, student_name, reference_image, profile=None):
         """Register a student's reference photo for verification"""
         face_encodings = None  # initialize early
         try:
@@ -202,8 +390,7 @@ class FaceRecognitionService:
             rgb_image = cv2.cvtColor(opencv_frame, cv2.COLOR_BGR2RGB)
 
             # Find face locations and encodings
-            face_locations = face_recognition.face_locations(rgb_image, model="hog")
-            face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+            face_locations, face_encodings = encode_faces(rgb_image, profile or self.enroll_profile)
 
             if not face_encodings:
                 return {
@@ -218,10 +405,9 @@ class FaceRecognitionService:
             # Use the first face encoding
             face_encoding = face_encodings[0]
 
-            # Store reference data
-            with self.students_lock:
-                self.student_references[student_id] = face_encoding
-                self.student_names[student_id] = student_name
+            # Store reference data; evidence gathered against an old reference no longer applies
+            self.registry.put(student_id, student_name, face_encoding)
+            self.sequential.reset(student_id)
 
             logger.info(f"Student {student_id} ({student_name}) registered successfully")
 
@@ -258,7 +444,44 @@ class FaceRecognitionService:
                 'face_detected': False
             }
     
-    def analyze_face_from_base64(self, student_id, frame_data):
+    def bulk_register(self, source=None, entries=None, replace=False, processes=None):
+        """Register many students at once.
+        
+        source is a directory, zip path or zip bytes of <studentId>-named photos
+        (only uploaded zip bytes reach it over HTTP),
+        encoded across a process pool; entries are already-encoded
+        (studentId, name, encoding) tuples. Everything is committed to the
+        registry in one atomic step, so no worker sees a half-imported roster.
+        """
+        failures = []
+        if entries is None:
+            entries, failures = encode_roster(source, processes=processes, profile=self.enroll_profile)
+        
+        if entries:
+            self.registry.put_many(entries, replace=replace)
+            # As for a single registration, evidence gathered against the old references no longer applies
+            if replace:
+                self.sequential.reset()
+            else:
+                for student_id, _, _ in entries:
+                    self.sequential.reset(student_id)
+            self.update_stats(students_registered=len(entries))
+        if failures:
+            self.update_stats(errors=len(failures))
+        
+        logger.info(f"Bulk registration: {len(entries)} registered, {len(failures)} failed")
+        
+        return {
+            'success': len(entries) > 0,
+            'registered': len(entries),
+            'failed': len(failures),
+            'failures': failures,
+            'replaced': bool(replace and entries),
+            'students_registered': len(self.registry),
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def analyze_face_from_base64(self, student_id, frame_data, profile=None, sequential_state=None):
         """Convert base64 image to OpenCV frame and analyze face verification"""
         try:
             # Handle data URL format (data:image/jpeg;base64,...)
@@ -275,7 +498,8 @@ class FaceRecognitionService:
             opencv_frame = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
             
             # Analyze face verification using the frame
-            verification_result = self.analyze_opencv_frame(opencv_frame, student_id)
+            verification_result = self.analyze_opencv_frame(opencv_frame, student_id, profile=profile,
+                                                            sequential_state=sequential_state)
             
             # Add metadata
             verification_result['studentId'] = student_id
@@ -296,32 +520,37 @@ class FaceRecognitionService:
             logger.error(f"Error processing frame for student {student_id}: {str(e)}")
             raise e
     
-    def analyze_opencv_frame(self, frame, student_id):
+    def analyze_opencv_frame(self, frame, student_id, profile=None, sequential_state=None):
         """Analyze face verification using face_recognition library"""
         try:
             # Convert to RGB for face_recognition library
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             
             # Find face locations and encodings
-            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+            profile = profile or self.verify_profile
+            face_locations, face_encodings = encode_faces(rgb_frame, profile)
             
             if len(face_encodings) == 0:
+                # No evidence either way; keep checking at the pending rate
+                reference = self.registry.get_versioned(student_id)
+                sequential = None
+                if reference is not None:
+                    sequential = self.sequential.current(student_id, reference[2], state=sequential_state)
                 return {
                     'success': True,
                     'face_verification': 'no_face',
                     'verification_text': 'No face detected in frame',
                     'confidence': 0.0,
                     'face_detected': False,
-                    'face_coordinates': None
+                    'face_coordinates': None,
+                    'sequential': sequential,
+                    'next_analysis_in_ms': self.sequential.intervals['pending']
                 }
             
             # Get student's reference encoding
-            with self.students_lock:
-                reference_encoding = self.student_references.get(student_id)
-                student_name = self.student_names.get(student_id, f'Student {student_id}')
+            reference = self.registry.get_versioned(student_id)
             
-            if reference_encoding is None:
+            if reference is None:
                 return {
                     'success': True,
                     'face_verification': 'not_registered',
@@ -331,6 +560,8 @@ class FaceRecognitionService:
                     'face_coordinates': None
                 }
             
+            reference_encoding, student_name, reference_generation = reference
+            
             # Take the first (largest) face for comparison
             current_encoding = face_encodings[0]
             (top, right, bottom, left) = face_locations[0]
@@ -350,7 +581,12 @@ class FaceRecognitionService:
                 verification = 'no_match'
                 verification_text = f'Identity not verified'
             
-            logger.info(f"Student {student_id}: {verification} (distance: {face_distance:.3f}, confidence: {confidence:.3f})")
+            # Accumulate the evidence and let the sequential test decide
+            sequential = self.sequential.update(student_id, float(face_distance), reference_generation,
+                                                state=sequential_state)
+            
+            logger.info(f"Student {student_id}: {verification} (distance: {face_distance:.3f}, confidence: {confidence:.3f}, "
+                        f"sequential: {sequential['decision']} llr={sequential['llr']:.2f})")
             
             # Memory cleanup
             import gc
@@ -370,7 +606,11 @@ class FaceRecognitionService:
                     'width': int(right - left),
                     'height': int(bottom - top)
                 },
-                'student_name': student_name
+                'student_name': student_name,
+                'profile': profile,
+                'identity_status': sequential['decision'],
+                'sequential': sequential,
+                'next_analysis_in_ms': sequential['next_analysis_in_ms']
             }
             
         except Exception as e:
@@ -384,49 +624,256 @@ class FaceRecognitionService:
                 'face_detected': False
             }
     
-    def get_student_list(self):
-        """Get list of registered students"""
-        with self.students_lock:
+    def _sync_identity_index(self):
+        """Bring the identity index up to date with the registry.
+        
+        Only runs when the registry generation has moved, which also picks up
+        registrations made by other worker processes, and only touches the
+        students changed since the last sync.
+        """
+        with self.index_lock:
+            if self.registry.generation == self.index_generation:
+                return
+            
+            generation, changes, reset = self.registry.changes_since(self.index_generation)
+            if reset:
+                for student_id in self.indexed_places.values():
+                    self.identity_index.remove(student_id)
+                self.indexed_places = {}
+            
+            # Every changed place is emptied before any is refilled, so a student that
+            # moved to another place is not dropped again
+            for place, _, _ in changes:
+                student_id = self.indexed_places.pop(place, None)
+                if student_id is not None:
+                    self.identity_index.remove(student_id)
+            for place, student_id, encoding in changes:
+                if student_id is not None:
+                    self.identity_index.add(student_id, encoding)
+                    self.indexed_places[place] = student_id
+            self.index_generation = generation
+    
+    def identify_face_from_base64(self, frame_data, k=5, nprobe=None, exact=False, profile=None):
+        """Find the registered students closest to the face in a frame"""
+        # Handle data URL format (data:image/jpeg;base64,...)
+        if 'base64,' in frame_data:
+            frame_data = frame_data.split('base64,')[1]
+        
+        image_bytes = base64.b64decode(frame_data)
+        pil_image = Image.open(io.BytesIO(image_bytes))
+        rgb_frame = np.array(pil_image.convert('RGB'))
+        
+        face_locations, face_encodings = encode_faces(rgb_frame, profile or self.verify_profile)
+        
+        if len(face_encodings) == 0:
             return {
-                'students': [
-                    {
-                        'studentId': student_id,
-                        'studentName': self.student_names.get(student_id, f'Student {student_id}')
-                    }
-                    for student_id in self.student_references.keys()
-                ],
-                'total_registered': len(self.student_references)
+                'success': True,
+                'identity': None,
+                'face_detected': False,
+                'candidates': [],
+                'timestamp': datetime.now().isoformat()
             }
+        
+        self._sync_identity_index()
+        
+        (top, right, bottom, left) = face_locations[0]
+        neighbours = self.identity_index.search(face_encodings[0], k=k, nprobe=nprobe, exact=exact)
+        names = dict(self.registry.students()) if neighbours else {}
+        candidates = [
+            {
+                'studentId': student_id,
+                'studentName': names.get(student_id, f'Student {student_id}'),
+                'face_distance': distance,
+                'confidence': 1 - distance
+            }
+            for student_id, distance in neighbours
+        ]
+        
+        identity = None
+        if candidates and candidates[0]['face_distance'] <= self.recognition_threshold:
+            identity = candidates[0]['studentId']
+        
+        return {
+            'success': True,
+            'identity': identity,
+            'face_detected': True,
+            'face_coordinates': {
+                'x': int(left),
+                'y': int(top),
+                'width': int(right - left),
+                'height': int(bottom - top)
+            },
+            'candidates': candidates,
+            'search': 'exact' if exact or self.identity_index.kind == 'exact' else 'approximate',
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def get_student_list(self):
+        """Get list of registered students"""
+        students = self.registry.students()
+        return {
+            'students': [
+                {
+                    'studentId': student_id,
+                    'studentName': student_name
+                }
+                for student_id, student_name in students
+            ],
+            'total_registered': len(students)
+        }
     
     def clear_student_data(self, student_id=None):
         """Clear student reference data (for cleanup)"""
-        with self.students_lock:
-            if student_id:
-                # Clear specific student
-                if student_id in self.student_references:
-                    del self.student_references[student_id]
-                    del self.student_names[student_id]
-                    logger.info(f"Cleared data for student {student_id}")
-            else:
-                # Clear all students
-                count = len(self.student_references)
-                self.student_references.clear()
-                self.student_names.clear()
-                logger.info(f"Cleared data for {count} students")
+        if student_id:
+            # Clear specific student
+            self.sequential.reset(student_id)
+            if self.registry.remove(student_id):
+                logger.info(f"Cleared data for student {student_id}")
+        else:
+            # Clear all students
+            self.sequential.reset()
+            count = self.registry.clear()
+            logger.info(f"Cleared data for {count} students")
     
     def run(self, host='localhost', port=5002, debug=False):
         """Start the Flask server"""
         logger.info(f"Starting Face Recognition Service on {host}:{port}")
         logger.info(f"Recognition threshold: {self.recognition_threshold}")
         logger.info(f"High confidence threshold: {self.high_confidence_threshold}")
+        logger.info(f"Encoding profiles: enroll={self.enroll_profile}, verify={self.verify_profile}")
         self.app.run(host=host, port=port, debug=debug)
 
+
+def _serve_worker(worker_id, listen_fd, host, port, registry_path, registry_lock, service_options):
+    """Entry point of one worker process in multi-process mode"""
+    from werkzeug.serving import make_server
+    
+    registry = SharedFaceRegistry(registry_path, registry_lock)
+    service = FaceRecognitionService(registry=registry, worker_id=worker_id, **service_options)
+    
+    # Every worker accepts connections from the socket bound by the parent
+    server = make_server(host, port, service.app, threaded=True, fd=listen_fd)
+    logger.info(f"Face recognition worker {worker_id} (pid {os.getpid()}) serving on {host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        registry.close()
+
+
+def run_workers(num_workers, host='localhost', port=5002, registry_path=None, registry_capacity=50000,
+                **service_options):
+    """
+    Start num_workers server processes sharing one listening socket and one
+    memory-mapped student registry, so HOG detection and encoding scale
+    across CPU cores
+    """
+    registry_path = registry_path or default_registry_path()
+    
+    # Workers are forked so they inherit the listening socket and the registry lock
+    ctx = multiprocessing.get_context('fork')
+    registry_lock = ctx.Lock()
+    SharedFaceRegistry.create(registry_path, registry_capacity, registry_lock)
+    
+    # Job statuses are shared so any worker can answer /register/jobs/<id>
+    job_manager = ctx.Manager()
+    service_options['job_store'] = job_manager.dict()
+    
+    # One signing key for every worker, so sequential evidence signed by one is accepted by the others
+    service_options['sequential_secret'] = secrets.token_bytes(32)
+    
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((host, port))
+    listen_socket.listen(128)
+    listen_socket.set_inheritable(True)
+    
+    logger.info(f"Starting Face Recognition Service on {host}:{port} with {num_workers} workers")
+    logger.info(f"Shared registry: {registry_path} (capacity {registry_capacity})")
+    
+    workers = []
+    for worker_id in range(num_workers):
+        worker = ctx.Process(
+            target=_serve_worker,
+            args=(worker_id, listen_socket.fileno(), host, port, registry_path, registry_lock,
+                  service_options),
+            name=f"FaceWorker-{worker_id}"
+        )
+        worker.start()
+        workers.append(worker)
+    
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        logger.info("Shutting down face recognition workers...")
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+    finally:
+        listen_socket.close()
+        job_manager.shutdown()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Face Recognition Service')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes (1 = single-process server)')
+    parser.add_argument('--registry-file', default=None,
+                        help='Shared registry file used when --workers > 1')
+    parser.add_argument('--registry-capacity', type=int, default=50000,
+                        help='Maximum number of students in the shared registry')
+    parser.add_argument('--registration-workers', type=int, default=2,
+                        help='Threads processing queued registrations (per worker process)')
+    parser.add_argument('--registration-queue-depth', type=int, default=100,
+                        help='Queued registrations allowed before /register answers 503')
+    parser.add_argument('--enroll-profile', choices=sorted(ENCODING_PROFILES), default=DEFAULT_ENROLL_PROFILE,
+                        help='Encoding profile for registrations')
+    parser.add_argument('--verify-profile', choices=sorted(ENCODING_PROFILES), default=DEFAULT_VERIFY_PROFILE,
+                        help='Encoding profile for /analyze and /identify')
+    parser.add_argument('--index', choices=['exact', 'ivf'], default='exact',
+                        help='Identity search index used by /identify')
+    parser.add_argument('--ivf-nlist', type=int, default=64,
+                        help='Number of k-means partitions of the IVF index')
+    parser.add_argument('--ivf-nprobe', type=int, default=8,
+                        help='Partitions scanned per IVF search (higher = better recall, slower)')
+    parser.add_argument('--callback-host', action='append', default=[],
+                        help='Host (or host:port) registration callbackUrls may point to, e.g. the Node '
+                             'server; repeatable. Other callbacks are dropped, jobs can still be polled')
+    parser.add_argument('--max-upload-mb', type=int, default=DEFAULT_MAX_UPLOAD_BYTES // (1024 * 1024),
+                        help='Largest request body accepted, e.g. a roster archive for /register/bulk')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
+    args = parse_args()
+    service_options = {
+        'index_type': args.index,
+        'registration_workers': args.registration_workers,
+        'registration_queue_depth': args.registration_queue_depth,
+        'enroll_profile': args.enroll_profile,
+        'verify_profile': args.verify_profile,
+        'max_upload_bytes': args.max_upload_mb * 1024 * 1024,
+        'callback_hosts': args.callback_host
+    }
+    if args.index == 'ivf':
+        service_options['index_options'] = {'nlist': args.ivf_nlist, 'nprobe': args.ivf_nprobe}
+    
     # Create and run the service
     try:
-        service = FaceRecognitionService()
-        # Run on all interfaces so Node.js can access it
-        service.run(host='0.0.0.0', port=5002, debug=False)
+        if args.workers > 1:
+            run_workers(args.workers, host=args.host, port=args.port,
+                        registry_path=args.registry_file,
+                        registry_capacity=args.registry_capacity,
+                        **service_options)
+        else:
+            service = FaceRecognitionService(**service_options)
+            # Run on all interfaces so Node.js can access it
+            service.run(host=args.host, port=args.port, debug=False)
     except Exception as e:
         logger.error(f"Failed to start Face Recognition Service: {str(e)}")
-        exit(1)
\ No newline at end of file
+        exit(1)
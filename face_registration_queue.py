@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Asynchronous registration queue for the Face Recognition Service
+Registrations are accepted as jobs, processed in arrival order by a bounded
+pool of worker threads, and reported through a status lookup or callback
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"Registration queue full ({depth} jobs waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class RegistrationQueue:
+    def __init__(self, handler, workers=2, max_depth=100, job_store=None, result_ttl=600, callback_hosts=()):
+        """
+        handler: callable(payload) -> result dict, run on a worker thread
+        workers: number of worker threads processing jobs
+        max_depth: jobs that may wait before new submissions are rejected
+        job_store: dict-like job status store (a multiprocessing.Manager dict
+                   lets every worker process answer status lookups)
+        result_ttl: seconds a finished job's result is kept
+        callback_hosts: hosts ('host' or 'host:port') job results may be POSTed to;
+                        callbacks to any other URL are dropped and the job is only
+                        reported through status lookups (default: no callbacks)
+        """
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+        self.callback_hosts = {host.lower() for host in callback_hosts}
+
+        self._queue = queue.Queue(maxsize=max_depth)  # FIFO, so jobs run in arrival order
+        self._jobs = job_store if job_store is not None else {}
+        self._finished = deque()  # (finish_time, jobId) of jobs this process completed
+
+        self._stats_lock = threading.Lock()
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._avg_job_seconds = 1.0
+
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"RegistrationWorker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _estimate_wait(self, depth):
+        """Seconds until a job submitted behind depth others would start"""
+        with self._stats_lock:
+            return depth * self._avg_job_seconds / max(1, self.workers)
+
+    def callback_allowed(self, callback_url):
+        """Whether job results may be POSTed to callback_url"""
+        try:
+            parts = urlsplit(callback_url)
+            port = parts.port
+        except ValueError:
+            return False
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return False
+        host = parts.hostname.lower()
+        return host in self.callback_hosts or (port is not None and f"{host}:{port}" in self.callback_hosts)
+
+    def submit(self, payload, callback_url=None):
+        """Queue a registration, returns the job record or raises QueueFullError"""
+        self._expire_finished()
+
+        callback_rejected = bool(callback_url) and not self.callback_allowed(callback_url)
+        if callback_rejected:
+            logger.warning(f"Dropping registration callback to {callback_url}: host not in the callback allowlist")
+            callback_url = None
+
+        job_id = uuid.uuid4().hex
+        job = {
+            'jobId': job_id,
+            'status': 'queued',
+            'studentId': payload.get('studentId'),
+            'submitted_at': datetime.now().isoformat(),
+            'result': None
+        }
+        self._jobs[job_id] = job
+
+        try:
+            self._queue.put_nowait((job_id, payload, callback_url))
+        except queue.Full:
+            del self._jobs[job_id]
+            with self._stats_lock:
+                self._rejected += 1
+            depth = self._queue.qsize()
+            raise QueueFullError(depth, max(1, int(self._estimate_wait(depth) + 0.5)))
+
+        job = dict(job)
+        job['queue_position'] = self._queue.qsize()
+        job['estimated_wait_seconds'] = round(self._estimate_wait(job['queue_position']), 2)
+        if callback_rejected:
+            job['callback'] = 'rejected'
+        return job
+
+    def status(self, job_id):
+        """Returns the job record, or None for unknown or expired jobs"""
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def _update_job(self, job_id, **fields):
+        # Reassign the whole record so Manager-backed stores see the change
+        job = dict(self._jobs.get(job_id, {'jobId': job_id}))
+        job.update(fields)
+        self._jobs[job_id] = job
+        return job
+
+    def _worker(self):
+        while True:
+            job_id, payload, callback_url = self._queue.get()
+            with self._stats_lock:
+                self._running += 1
+            self._update_job(job_id, status='running', started_at=datetime.now().isoformat())
+
+            start = time.time()
+            try:
+                result = self.handler(payload)
+                status = 'done' if result.get('success') else 'failed'
+            except Exception as e:
+                logger.error(f"Registration job {job_id} failed: {str(e)}")
+                result = {'success': False, 'error': str(e), 'face_detected': False}
+                status = 'failed'
+            elapsed = time.time() - start
+
+            job = self._update_job(job_id, status=status, result=result,
+                                   finished_at=datetime.now().isoformat())
+            with self._stats_lock:
+                self._running -= 1
+                if status == 'done':
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+                self._finished.append((time.time(), job_id))
+            self._queue.task_done()
+
+            if callback_url:
+                self._send_callback(callback_url, job)
+
+    def _send_callback(self, callback_url, job):
+        try:
+            import requests
+            # Redirects could lead off the allowlist
+            requests.post(callback_url, json=job, timeout=5, allow_redirects=False)
+        except Exception as e:
+            logger.warning(f"Registration callback to {callback_url} failed: {str(e)}")
+
+    def _expire_finished(self):
+        cutoff = time.time() - self.result_ttl
+        with self._stats_lock:
+            expired = []
+            while self._finished and self._finished[0][0] < cutoff:
+                expired.append(self._finished.popleft()[1])
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_depth': self.max_depth,
+                'workers': self.workers,
+                'running': self._running,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'avg_job_seconds': round(self._avg_job_seconds, 3)
+            }
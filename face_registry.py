@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Student face registry for the Face Recognition Service
+Holds each student's reference encoding and name, either in-process (single
+server) or in a memory-mapped file shared by every worker process
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENCODING_SIZE = 128
+
+# Fixed-size slot layout of the shared registry file
+SLOT_DTYPE = np.dtype([
+    ('active', 'u1'),
+    ('stamp', '<u8'),  # generation the slot last changed at
+    ('key', 'S64'),
+    ('name', 'S128'),
+    ('encoding', '<f8', (ENCODING_SIZE,)),
+])
+
+REGISTRY_MAGIC = 0x3247455245434146  # b'FACEREG2' little-endian
+HEADER_WORDS = 8
+HEADER_SIZE = HEADER_WORDS * 8
+
+# Header word indexes
+_MAGIC = 0
+_GENERATION = 1
+_CAPACITY = 2
+
+# Writes take milliseconds; a generation left odd for this long means its writer died mid-write
+WRITE_STALL_SECONDS = 3.0
+
+# Changes the in-process registry remembers for changes_since() (at least this many)
+CHANGE_LOG_SIZE = 1024
+
+
+class FaceRegistry:
+    """In-process registry used by the default single-process server"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._references = {}  # {studentId: encoding}
+        self._names = {}        # {studentId: name}
+        self._stamps = {}       # {studentId: generation that stored the reference}
+        self._generation = 0
+        # Which students each generation touched, oldest first, for changes_since()
+        self._change_generations = []
+        self._change_ids = []
+        self._changes_floor = 0  # readers behind this generation get a full listing
+
+    @property
+    def generation(self):
+        """Counter bumped on every change, used by readers to detect updates"""
+        return self._generation
+
+    def __len__(self):
+        with self._lock:
+            return len(self._references)
+
+    def __contains__(self, student_id):
+        with self._lock:
+            return student_id in self._references
+
+    def get(self, student_id):
+        """Returns (encoding, name) for a student, or None if not registered"""
+        with self._lock:
+            encoding = self._references.get(student_id)
+            if encoding is None:
+                return None
+            return encoding, self._names.get(student_id, f'Student {student_id}')
+
+    def get_versioned(self, student_id):
+        """Returns (encoding, name, generation) for a student, or None if not registered
+
+        generation identifies the write that stored this reference: it changes
+        every time the student is registered again and is never reused.
+        """
+        with self._lock:
+            encoding = self._references.get(student_id)
+            if encoding is None:
+                return None
+            return encoding, self._names.get(student_id, f'Student {student_id}'), self._stamps[student_id]
+
+    def put(self, student_id, student_name, encoding):
+        """Registers or replaces a student's reference encoding"""
+        with self._lock:
+            self._references[student_id] = np.asarray(encoding, dtype=np.float64)
+            self._names[student_id] = student_name
+            self._generation += 1
+            self._stamps[student_id] = self._generation
+            self._log_changes([student_id])
+
+    def put_many(self, entries, replace=False):
+        """Commits [(studentId, name, encoding)] in one atomic step
+
+        With replace=True the registry afterwards holds exactly these students.
+        """
+        references = {}
+        names = {}
+        for student_id, student_name, encoding in entries:
+            references[student_id] = np.asarray(encoding, dtype=np.float64)
+            names[student_id] = student_name
+
+        with self._lock:
+            if replace:
+                changed = list(self._references) + list(references)
+                self._references = references
+                self._names = names
+                self._stamps = {}
+            else:
+                changed = list(references)
+                self._references.update(references)
+                self._names.update(names)
+            self._generation += 1
+            self._stamps.update(dict.fromkeys(references, self._generation))
+            self._log_changes(changed)
+
+    def remove(self, student_id):
+        """Removes a student, returns True if they were registered"""
+        with self._lock:
+            if student_id not in self._references:
+                return False
+            del self._references[student_id]
+            del self._names[student_id]
+            del self._stamps[student_id]
+            self._generation += 1
+            self._log_changes([student_id])
+            return True
+
+    def clear(self):
+        """Removes every student, returns how many were registered"""
+        with self._lock:
+            count = len(self._references)
+            changed = list(self._references)
+            self._references.clear()
+            self._names.clear()
+            self._stamps.clear()
+            self._generation += 1
+            self._log_changes(changed)
+            return count
+
+    def _log_changes(self, student_ids):
+        self._change_generations.extend([self._generation] * len(student_ids))
+        self._change_ids.extend(student_ids)
+        if len(self._change_ids) > max(CHANGE_LOG_SIZE, 2 * len(self._references)):
+            drop = len(self._change_ids) // 2
+            self._changes_floor = self._change_generations[drop - 1]
+            del self._change_generations[:drop]
+            del self._change_ids[:drop]
+
+    def students(self):
+        """Returns a list of (studentId, name) pairs"""
+        with self._lock:
+            return [(student_id, self._names[student_id]) for student_id in self._references]
+
+    def snapshot(self):
+        """Returns {studentId: (encoding, name)} for every registered student"""
+        with self._lock:
+            return {
+                student_id: (encoding, self._names[student_id])
+                for student_id, encoding in self._references.items()
+            }
+
+    def changes_since(self, generation):
+        """Returns (generation, changes, reset) describing what changed after generation
+
+        changes is a list of (place, studentId, encoding) where place says where a
+        student is stored (here the studentId itself); studentId and encoding are
+        None for a place that no longer holds anyone. With reset=True (generation
+        None or too old to replay) changes lists every student and the caller
+        should forget what it had.
+        """
+        with self._lock:
+            if generation is None or generation < self._changes_floor:
+                changes = [(student_id, student_id, encoding)
+                           for student_id, encoding in self._references.items()]
+                return self._generation, changes, True
+            start = bisect.bisect_right(self._change_generations, generation)
+            changes = []
+            for student_id in dict.fromkeys(self._change_ids[start:]):
+                encoding = self._references.get(student_id)
+                changes.append((student_id, None if encoding is None else student_id, encoding))
+            return self._generation, changes, False
+
+
+class SharedFaceRegistry:
+    """
+    Registry stored in a memory-mapped file so every worker process sees the
+    same students. Writers serialize on a lock shared by the workers (created
+    by the parent before forking); readers are lock-free and use the header
+    generation as a sequence lock: it is odd while a write is in progress and
+    changes after every write, so a register or delete made through one worker
+    is visible to the others on their very next lookup.
+    """
+
+    def __init__(self, path, lock):
+        self.path = path
+        self._write_lock = lock
+        self._header = np.memmap(path, dtype='<u8', mode='r+', shape=(HEADER_WORDS,))
+        if int(self._header[_MAGIC]) != REGISTRY_MAGIC:
+            raise ValueError(f"{path} is not a face registry file")
+        self.capacity = int(self._header[_CAPACITY])
+        self._slots = np.memmap(path, dtype=SLOT_DTYPE, mode='r+',
+                                offset=HEADER_SIZE, shape=(self.capacity,))
+
+        # Per-process view of which slot holds which student
+        self._index_lock = threading.Lock()
+        self._index_generation = None
+        self._slot_of = {}
+        self._id_of_slot = {}
+
+    @classmethod
+    def create(cls, path, capacity, lock):
+        """Creates (or truncates) a registry file with room for capacity students"""
+        size = HEADER_SIZE + capacity * SLOT_DTYPE.itemsize
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        header = np.memmap(path, dtype='<u8', mode='r+', shape=(HEADER_WORDS,))
+        header[_CAPACITY] = capacity
+        header[_GENERATION] = 0
+        header[_MAGIC] = REGISTRY_MAGIC
+        header.flush()
+        del header
+        return cls(path, lock)
+
+    @staticmethod
+    def _encode_key(student_id):
+        # JSON keeps integer and string ids distinct across processes
+        return json.dumps(student_id).encode('utf-8')
+
+    @staticmethod
+    def _decode_key(raw):
+        return json.loads(raw.decode('utf-8'))
+
+    @property
+    def generation(self):
+        return int(self._header[_GENERATION])
+
+    def _read(self, reader):
+        """Runs reader() until it observes a consistent (unchanged) generation"""
+        stalled, stalled_since = None, None
+        while True:
+            start = int(self._header[_GENERATION])
+            if start % 2:
+                if start != stalled:
+                    stalled, stalled_since = start, time.monotonic()
+                elif time.monotonic() - stalled_since > WRITE_STALL_SECONDS:
+                    self._recover_stalled_write(start)
+                    stalled = None
+                time.sleep(0.001)
+                continue
+            try:
+                self._refresh_index(start)
+                value = reader()
+            except ValueError:
+                # A key torn by a concurrent write does not decode (JSON and Unicode
+                # errors are ValueErrors); it is only an error when nothing was written
+                if int(self._header[_GENERATION]) == start:
+                    raise
+                continue
+            if int(self._header[_GENERATION]) == start:
+                return value
+
+    def _refresh_index(self, generation):
+        with self._index_lock:
+            if self._index_generation == generation:
+                return
+            since, self._index_generation = self._index_generation, None
+            if since is None:
+                self._slot_of, self._id_of_slot = {}, {}
+                slots = np.flatnonzero(self._slots['active'])
+            else:
+                slots = np.flatnonzero(self._slots['stamp'] > since)
+            # Every changed slot is emptied before any is refilled, so a student a
+            # replacing put_many moved to another slot is not dropped again
+            for slot in slots:
+                student_id = self._id_of_slot.pop(int(slot), None)
+                if student_id is not None:
+                    self._slot_of.pop(student_id, None)
+            active = slots[self._slots['active'][slots] != 0]
+            for key, slot in zip(self._slots['key'][active], active):
+                student_id = self._decode_key(key)
+                self._slot_of[student_id] = int(slot)
+                self._id_of_slot[int(slot)] = student_id
+            # Not cached when a write overlapped the scan (or a key failed to decode):
+            # the caller retries and the next refresh rebuilds from scratch
+            if int(self._header[_GENERATION]) == generation:
+                self._index_generation = generation
+
+    def _recover_stalled_write(self, generation):
+        """Ends a write whose writer went away, or raises when the registry stays locked"""
+        # Writers hold the lock for the whole write; if it can be taken nobody is writing any more
+        if not self._write_lock.acquire(timeout=WRITE_STALL_SECONDS):
+            raise RuntimeError(f"Shared face registry {self.path} has been mid-write for over "
+                               f"{2 * WRITE_STALL_SECONDS:.0f}s; a writer probably died holding its lock, "
+                               "restart the service")
+        try:
+            if int(self._header[_GENERATION]) == generation:
+                logger.error(f"Shared face registry {self.path}: a write never finished, "
+                             "the students it touched may be incomplete")
+                self._end_write()
+        finally:
+            self._write_lock.release()
+
+    def _begin_write(self):
+        """Marks a write in progress, returns the generation to stamp the written slots with"""
+        self._header[_GENERATION] += 1
+        return int(self._header[_GENERATION]) + 1
+
+    def _end_write(self):
+        self._header[_GENERATION] += 1
+
+    def __len__(self):
+        return self._read(lambda: len(self._slot_of))
+
+    def __contains__(self, student_id):
+        return self._read(lambda: student_id in self._slot_of)
+
+    def get(self, student_id):
+        def reader():
+            slot = self._slot_of.get(student_id)
+            if slot is None:
+                return None
+            record = self._slots[slot]
+            return (np.array(record['encoding']),
+                    record['name'].decode('utf-8', errors='ignore'))
+        return self._read(reader)
+
+    def get_versioned(self, student_id):
+        """Same as FaceRegistry.get_versioned; the generation is the slot's stamp"""
+        def reader():
+            slot = self._slot_of.get(student_id)
+            if slot is None:
+                return None
+            record = self._slots[slot]
+            return (np.array(record['encoding']),
+                    record['name'].decode('utf-8', errors='ignore'),
+                    int(record['stamp']))
+        return self._read(reader)
+
+    def put(self, student_id, student_name, encoding):
+        key = self._encode_key(student_id)
+        if len(key) > SLOT_DTYPE['key'].itemsize:
+            raise ValueError(f"Student id too long for shared registry: {student_id}")
+
+        with self._write_lock:
+            self._refresh_index(self.generation)
+            slot = self._slot_of.get(student_id)
+            if slot is None:
+                free = np.flatnonzero(self._slots['active'] == 0)
+                if len(free) == 0:
+                    raise RuntimeError(f"Shared face registry is full ({self.capacity} students)")
+                slot = int(free[0])
+
+            stamp = self._begin_write()
+            try:
+                self._slots['stamp'][slot] = stamp
+                self._slots['key'][slot] = key
+                self._slots['name'][slot] = student_name.encode('utf-8')[:SLOT_DTYPE['name'].itemsize]
+                self._slots['encoding'][slot] = np.asarray(encoding, dtype=np.float64)
+                self._slots['active'][slot] = 1
+            finally:
+                self._end_write()
+
+    def put_many(self, entries, replace=False):
+        keyed = {}
+        for student_id, student_name, encoding in entries:
+            key = self._encode_key(student_id)
+            if len(key) > SLOT_DTYPE['key'].itemsize:
+                raise ValueError(f"Student id too long for shared registry: {student_id}")
+            keyed[student_id] = (key, student_name.encode('utf-8')[:SLOT_DTYPE['name'].itemsize],
+                                 np.asarray(encoding, dtype=np.float64))
+
+        with self._write_lock:
+            self._refresh_index(self.generation)
+            if replace:
+                slots = list(range(len(keyed)))
+                needed = len(keyed)
+            else:
+                slots = []
+                free = iter(np.flatnonzero(self._slots['active'] == 0))
+                needed = 0
+                for student_id in keyed:
+                    slot = self._slot_of.get(student_id)
+                    if slot is None:
+                        slot = next(free, None)
+                        needed += 1
+                    slots.append(slot)
+            if needed and (len(slots) > self.capacity or None in slots):
+                raise RuntimeError(f"Shared face registry is full ({self.capacity} students)")
+
+            # Readers retry until the whole batch is in place
+            stamp = self._begin_write()
+            try:
+                if replace:
+                    cleared = np.flatnonzero(self._slots['active'])
+                    self._slots['stamp'][cleared] = stamp
+                    self._slots['active'][cleared] = 0
+                for slot, (key, name, encoding) in zip(slots, keyed.values()):
+                    self._slots['stamp'][slot] = stamp
+                    self._slots['key'][slot] = key
+                    self._slots['name'][slot] = name
+                    self._slots['encoding'][slot] = encoding
+                    self._slots['active'][slot] = 1
+            finally:
+                self._end_write()
+
+    def remove(self, student_id):
+        with self._write_lock:
+            self._refresh_index(self.generation)
+            slot = self._slot_of.get(student_id)
+            if slot is None:
+                return False
+            stamp = self._begin_write()
+            try:
+                self._slots['stamp'][slot] = stamp
+                self._slots['active'][slot] = 0
+            finally:
+                self._end_write()
+            return True
+
+    def clear(self):
+        with self._write_lock:
+            cleared = np.flatnonzero(self._slots['active'])
+            stamp = self._begin_write()
+            try:
+                self._slots['stamp'][cleared] = stamp
+                self._slots['active'][cleared] = 0
+            finally:
+                self._end_write()
+            return len(cleared)
+
+    def students(self):
+        def reader():
+            return [
+                (student_id, self._slots['name'][slot].decode('utf-8', errors='ignore'))
+                for student_id, slot in self._slot_of.items()
+            ]
+        return self._read(reader)
+
+    def snapshot(self):
+        def reader():
+            return {
+                student_id: (np.array(self._slots['encoding'][slot]),
+                             self._slots['name'][slot].decode('utf-8', errors='ignore'))
+                for student_id, slot in self._slot_of.items()
+            }
+        return self._read(reader)
+
+    def changes_since(self, generation):
+        """Same as FaceRegistry.changes_since, with slot numbers as places"""
+        def reader():
+            if generation is None:
+                slots = np.flatnonzero(self._slots['active'])
+            else:
+                slots = np.flatnonzero(self._slots['stamp'] > generation)
+            changes = []
+            for slot in slots:
+                record = self._slots[slot]
+                if record['active']:
+                    changes.append((int(slot), self._decode_key(record['key']),
+                                    np.array(record['encoding'])))
+                else:
+                    changes.append((int(slot), None, None))
+            return int(self._header[_GENERATION]), changes, generation is None
+        return self._read(reader)
+
+    def close(self):
+        """Flushes pending writes to the backing file"""
+        self._slots.flush()
+        self._header.flush()
+
+
+def default_registry_path():
+    """Shared registry file location used by the multi-process server"""
+    return os.path.join(os.getcwd(), 'face_registry.dat')
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Sequential identity verification for the Face Recognition Service
+Accumulates a per-student sequential probability ratio test (Wald SPRT) over
+the stream of face distances and declares 'verified' or 'mismatch' as soon as
+the evidence crosses the error bounds
+"""
+
+import hashlib
+import hmac
+import json
+import math
+import secrets
+import threading
+import time
+
+# Typical face_recognition distances for the same person and for different people
+GENUINE_MEAN = 0.38
+GENUINE_STD = 0.07
+IMPOSTOR_MEAN = 0.72
+IMPOSTOR_STD = 0.08
+
+# State fields covered by the signature handed to callers
+SIGNED_FIELDS = ('reference', 'llr', 'samples', 'decision', 'decided_at', 'decided_after', 'updated_at')
+
+
+def _log_normal_pdf(x, mean, std):
+    return -0.5 * ((x - mean) / std) ** 2 - math.log(std)
+
+
+def _finite(value):
+    """value as a float; anything but a finite JSON number is rejected"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"not a finite number: {value!r}")
+    return float(value)
+
+
+def _count(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"not a count: {value!r}")
+    return value
+
+
+class SequentialVerifier:
+    def __init__(self, false_verify_rate=0.001, false_mismatch_rate=0.01, max_step=3.0,
+                 verified_backoff_ms=60000, pending_interval_ms=5000, mismatch_interval_ms=2000,
+                 state_ttl=3 * 3600, secret=None):
+        """
+        false_verify_rate: accepted chance of declaring an impostor verified (alpha)
+        false_mismatch_rate: accepted chance of declaring the real student a mismatch (beta)
+        max_step: largest evidence a single frame may add, so one odd frame cannot decide alone
+        *_interval_ms: recommended time until the next check in each state
+        state_ttl: seconds after which an idle student's evidence is dropped
+        secret: key signing the states handed to callers; every worker process
+            a caller may reach must share it (a random key otherwise)
+        """
+        self.upper_bound = math.log((1 - false_mismatch_rate) / false_verify_rate)
+        self.lower_bound = math.log(false_mismatch_rate / (1 - false_verify_rate))
+        self.max_step = max_step
+        self.intervals = {
+            'verified': verified_backoff_ms,
+            'pending': pending_interval_ms,
+            'mismatch': mismatch_interval_ms
+        }
+        self.state_ttl = state_ttl
+        self._secret = secret or secrets.token_bytes(32)
+
+        self._lock = threading.Lock()
+        self._states = {}  # {studentId: state dict}
+
+    @staticmethod
+    def new_state(reference=None):
+        return {'llr': 0.0, 'samples': 0, 'decision': 'pending', 'decided_at': None, 'updated_at': None,
+                'reference': reference}
+
+    def evidence(self, face_distance):
+        """Log-likelihood ratio (genuine vs impostor) contributed by one distance"""
+        step = (_log_normal_pdf(face_distance, GENUINE_MEAN, GENUINE_STD)
+                - _log_normal_pdf(face_distance, IMPOSTOR_MEAN, IMPOSTOR_STD))
+        return max(-self.max_step, min(self.max_step, step))
+
+    def update(self, student_id, face_distance, reference, state=None):
+        """Adds one frame's distance to a student's test and returns the new state
+
+        Arguments:
+            student_id: Student being verified
+            face_distance (float): Distance to the student's reference encoding
+            reference: Registry generation of that reference encoding; evidence
+                gathered against any other reference is dropped
+            state (dict): Evidence state echoed back by the caller, so a client
+                talking to several worker processes still accumulates one test;
+                only used when this service signed it (see _verify)
+        """
+        now = time.time()
+        with self._lock:
+            state = self._latest(student_id, reference, state) or self.new_state(reference)
+
+            state['llr'] += self.evidence(face_distance)
+            state['samples'] += 1
+            state['updated_at'] = now
+
+            decision = None
+            if state['llr'] >= self.upper_bound:
+                decision = 'verified'
+            elif state['llr'] <= self.lower_bound:
+                decision = 'mismatch'
+
+            if decision is not None:
+                # Start a fresh test after a decision so a later impostor is still caught
+                state = {**self.new_state(reference), 'decision': decision, 'decided_at': now,
+                         'decided_after': state['samples'], 'updated_at': now}
+
+            self._states[student_id] = state
+            self._expire(now)
+            return self.describe(student_id, state)
+
+    def current(self, student_id, reference, state=None):
+        """The student's evidence without adding any, or None when there is none"""
+        with self._lock:
+            state = self._latest(student_id, reference, state)
+            return self.describe(student_id, state) if state is not None else None
+
+    def _latest(self, student_id, reference, echoed):
+        """Copy of the newest evidence for the student's current reference, or None
+
+        Both the locally kept state and the caller's echoed one are bound to the
+        reference they were gathered against, so registering a student again
+        through any worker process invalidates them everywhere.
+        """
+        candidates = [self._states.get(student_id)]
+        if echoed is not None:
+            candidates.append(self._verify(student_id, echoed))
+        candidates = [state for state in candidates if state is not None and state['reference'] == reference]
+        if not candidates:
+            return None
+        return dict(max(candidates, key=lambda state: state['updated_at'] or 0))
+
+    def _sign(self, student_id, state):
+        payload = json.dumps([student_id] + [state.get(key) for key in SIGNED_FIELDS], separators=(',', ':'))
+        return hmac.new(self._secret, payload.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _verify(self, student_id, state):
+        """The fields of a caller-supplied state the test uses, or None unless this service signed it"""
+        if not isinstance(state, dict) or not isinstance(state.get('signature'), str):
+            return None
+        try:
+            clean = {
+                'reference': _count(state['reference']),
+                'llr': _finite(state['llr']),
+                'samples': _count(state['samples']),
+                'decision': state['decision'],
+                'decided_at': None if state['decided_at'] is None else _finite(state['decided_at']),
+                'updated_at': _finite(state['updated_at']),
+            }
+            if state.get('decided_after') is not None:
+                clean['decided_after'] = _count(state['decided_after'])
+        except (KeyError, ValueError):
+            return None
+        if clean['decision'] not in self.intervals:
+            return None
+        if not hmac.compare_digest(state['signature'], self._sign(student_id, clean)):
+            return None
+        return clean
+
+    def reset(self, student_id=None):
+        """Drops the evidence of one student (e.g. after re-registration) or everyone"""
+        with self._lock:
+            if student_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(student_id, None)
+
+    def describe(self, student_id, state):
+        """Response form of a state, signed, including the recommended next check"""
+        described = dict(state)
+        described['signature'] = self._sign(student_id, state)
+        described['upper_bound'] = round(self.upper_bound, 3)
+        described['lower_bound'] = round(self.lower_bound, 3)
+        described['next_analysis_in_ms'] = self.intervals[state['decision']]
+        return described
+
+    def _expire(self, now):
+        if len(self._states) < 1024:
+            return
+        cutoff = now - self.state_ttl
+        for student_id in [s for s, state in self._states.items() if (state['updated_at'] or 0) < cutoff]:
+            del self._states[student_id]
+
+    def stats(self):
+        with self._lock:
+            decisions = [state['decision'] for state in self._states.values()]
+        return {
+            'students_tracked': len(decisions),
+            'verified': decisions.count('verified'),
+            'mismatch': decisions.count('mismatch'),
+            'pending': decisions.count('pending')
+        }
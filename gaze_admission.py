@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Deadline-aware admission control for the Gaze Tracking Service
+Every frame carries a deadline (epoch milliseconds) after which its gaze
+result is no longer useful. A frame is only queued when the current backlog,
+at the measured analysis time, lets it finish before that deadline; otherwise
+it is shed at once with a retry hint. Frames whose deadline passes while they
+wait are dropped before any decoding or analysis is spent on them.
+
+Deadlines are compared with this host's clock, so the caller should derive
+them from its own clock (server.js does), not from the browser's.
+"""
+
+import math
+import threading
+import time
+
+DEFAULT_DEADLINE_MS = 1000
+
+# Reasons a frame is shed, in the order they are checked
+SHED_REASONS = ('expired_on_arrival', 'queue_full', 'deadline_unmeetable', 'expired_in_queue', 'client_gone')
+
+
+def now_ms():
+    return time.time() * 1000.0
+
+
+class AdmissionController(object):
+    def __init__(self, workers, max_queue=None, default_deadline_ms=DEFAULT_DEADLINE_MS,
+                 initial_service_ms=80.0, min_retry_ms=250):
+        """
+        workers: frames analyzed at the same time
+        max_queue: frames allowed to wait for a worker (default 4 per worker)
+        default_deadline_ms: budget of a frame that comes without a deadline
+        initial_service_ms: analysis time assumed until frames have been measured
+        min_retry_ms: shortest retry hint given to shed frames
+        """
+        self.workers = max(1, workers)
+        self.max_queue = max_queue if max_queue is not None else 4 * self.workers
+        self.default_deadline_ms = default_deadline_ms
+        self.min_retry_ms = min_retry_ms
+
+        self._lock = threading.Lock()
+        self.service_ms = float(initial_service_ms)
+        self.queued = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.completed = 0
+        self.late = 0
+        self.max_queue_depth = 0
+        self.shed = dict.fromkeys(SHED_REASONS, 0)
+
+    def deadline(self, capture_timestamp=None, deadline=None, now=None):
+        """Absolute deadline (epoch ms) of a frame, from its fields or the default budget"""
+        if deadline is not None:
+            return float(deadline)
+        start = float(capture_timestamp) if capture_timestamp is not None else (now_ms() if now is None else now)
+        return start + self.default_deadline_ms
+
+    def _expected_ms(self):
+        """Time until a frame admitted now would be analyzed, with the lock held"""
+        # Frames ahead of it are served in rounds of `workers`
+        rounds = max(0, self.in_flight + self.queued - self.workers + 1)
+        return (math.ceil(rounds / float(self.workers)) + 1) * self.service_ms
+
+    def admit(self, deadline_ms, now=None):
+        """Returns (admitted, reason, retry_after_ms); an admitted frame is counted as queued"""
+        now = now_ms() if now is None else now
+        with self._lock:
+            expected = self._expected_ms()
+            if deadline_ms <= now:
+                reason = 'expired_on_arrival'
+            elif self.queued >= self.max_queue:
+                reason = 'queue_full'
+            elif now + expected > deadline_ms:
+                reason = 'deadline_unmeetable'
+            else:
+                self.queued += 1
+                self.admitted += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queued)
+                return True, None, 0
+            self.shed[reason] += 1
+            # Roughly when the backlog ahead of a new frame will have drained
+            retry = max(self.min_retry_ms, expected - (deadline_ms - now))
+            return False, reason, int(retry)
+
+    def start(self, deadline_ms, now=None):
+        """A worker picked a queued frame; returns the shed reason when it is no longer worth analyzing"""
+        now = now_ms() if now is None else now
+        with self._lock:
+            self.queued -= 1
+            if now + self.service_ms * 0.5 > deadline_ms:
+                self.shed['expired_in_queue'] += 1
+                return 'expired_in_queue'
+            self.in_flight += 1
+            return None
+
+    def drop(self, reason='client_gone'):
+        """A queued frame was abandoned before a worker picked it"""
+        with self._lock:
+            self.queued -= 1
+            self.shed[reason] += 1
+
+    def finish(self, duration_ms, deadline_ms, now=None):
+        """Records an analyzed frame; its duration updates the analysis time estimate"""
+        now = now_ms() if now is None else now
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            if now > deadline_ms:
+                self.late += 1
+            self.service_ms += 0.2 * (duration_ms - self.service_ms)
+
+    def stats(self):
+        with self._lock:
+            shed_total = sum(self.shed.values())
+            offered = self.admitted + shed_total - self.shed['expired_in_queue'] - self.shed['client_gone']
+            return {
+                'workers': self.workers,
+                'queue_depth': self.queued,
+                'max_queue': self.max_queue,
+                'max_queue_depth': self.max_queue_depth,
+                'in_flight': self.in_flight,
+                'service_ms': round(self.service_ms, 1),
+                'default_deadline_ms': self.default_deadline_ms,
+                'admitted': self.admitted,
+                'completed': self.completed,
+                'late': self.late,
+                'shed': dict(self.shed),
+                'shed_total': shed_total,
+                'shed_ratio': round(shed_total / float(offered), 3) if offered else None
+            }
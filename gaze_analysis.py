@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Per-frame gaze analysis shared by the Gaze Tracking Service engines
+Turns a GazeTracking refresh into the JSON result returned by /analyze; kept
+free of Flask so engine worker processes can import it cheaply
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _validate_frame(frame):
+    if frame is None or frame.size == 0:
+        raise ValueError("Invalid frame for analysis")
+    
+    if len(frame.shape) != 3 or frame.shape[2] != 3:
+        raise ValueError("Frame must be 3-channel BGR image")
+
+
+def _analysis_error(e):
+    logger.error(f"Error analyzing frame: {str(e)}")
+    return {
+        'success': False,
+        'error': str(e),
+        'gaze_direction': 'error',
+        'gaze_text': 'Analysis failed',
+        'confidence': 0.0
+    }
+
+
+def describe_gaze(gaze_tracker):
+    """Result JSON of a tracker that has just been refreshed"""
+    # Determine gaze direction
+    gaze_direction = "unknown"
+    gaze_text = ""
+    
+    try:
+        if gaze_tracker.is_blinking():
+            gaze_direction = "blinking"
+            gaze_text = "Blinking"
+        elif gaze_tracker.is_right():
+            gaze_direction = "right"
+            gaze_text = "Looking right"
+        elif gaze_tracker.is_left():
+            gaze_direction = "left"
+            gaze_text = "Looking left"
+        elif gaze_tracker.is_center():
+            gaze_direction = "center"
+            gaze_text = "Looking center"
+        else:
+            gaze_direction = "unknown"
+            gaze_text = "Cannot detect gaze"
+    except Exception as e:
+        logger.warning(f"Gaze direction detection failed: {str(e)}")
+        gaze_direction = "error"
+        gaze_text = "Detection error"
+    
+    # Get pupil coordinates
+    left_pupil = None
+    right_pupil = None
+    
+    try:
+        left_pupil = gaze_tracker.pupil_left_coords()
+        right_pupil = gaze_tracker.pupil_right_coords()
+        
+        if left_pupil is not None:
+            left_pupil = [float(x) for x in left_pupil] if hasattr(left_pupil, '__iter__') else None
+        if right_pupil is not None:
+            right_pupil = [float(x) for x in right_pupil] if hasattr(right_pupil, '__iter__') else None
+    except Exception as e:
+        logger.warning(f"Pupil coordinate extraction failed: {str(e)}")
+    
+    # Calculate confidence
+    confidence = 0.0
+    if left_pupil is not None and right_pupil is not None:
+        confidence = 1.0
+    elif left_pupil is not None or right_pupil is not None:
+        confidence = 0.5
+    
+    # Get ratios
+    horizontal_ratio = None
+    vertical_ratio = None
+    
+    try:
+        horizontal_ratio = gaze_tracker.horizontal_ratio()
+        vertical_ratio = gaze_tracker.vertical_ratio()
+        
+        if horizontal_ratio is not None:
+            horizontal_ratio = float(horizontal_ratio)
+        if vertical_ratio is not None:
+            vertical_ratio = float(vertical_ratio)
+    except Exception as e:
+        logger.warning(f"Ratio calculation failed: {str(e)}")
+    
+    return {
+        'success': True,
+        'gaze_direction': gaze_direction,
+        'gaze_text': gaze_text,
+        'confidence': float(confidence),
+        'pupils': {
+            'left': left_pupil,
+            'right': right_pupil
+        },
+        'ratios': {
+            'horizontal': horizontal_ratio,
+            'vertical': vertical_ratio
+        },
+        'face_detected': left_pupil is not None or right_pupil is not None
+    }
+
+
+def analyze_opencv_frame(frame, gaze_tracker):
+    """Gaze analysis of one BGR frame on a tracker owned by the caller"""
+    try:
+        # Validate frame
+        _validate_frame(frame)
+        
+        # Use the dedicated gaze tracker (thread-safe since each thread has its own)
+        try:
+            gaze_tracker.refresh(frame)
+        except Exception as e:
+            logger.error(f"Gaze refresh failed: {str(e)}")
+            raise ValueError(f"Gaze tracking failed: {str(e)}")
+        
+        return describe_gaze(gaze_tracker)
+    
+    except Exception as e:
+        return _analysis_error(e)
+
+
+def _face_detection(gaze_tracker):
+    return {
+        'mode': gaze_tracker.detection_mode,
+        'landmark_quality': (round(float(gaze_tracker.landmark_quality), 3)
+                             if gaze_tracker.landmark_quality is not None else None),
+        'detection_interval': gaze_tracker.detection_interval,
+        # 'dark' or 'flat' when the frame was rejected before face detection
+        'no_face': gaze_tracker.no_face_reason
+    }
+
+
+def _update_student_gaze(gaze_result, student_state, timestamp):
+    if gaze_result.get('success'):
+        gaze_result['smoothed'] = student_state.gaze_filter.update(
+            gaze_result, timestamp if timestamp is not None else time.time())
+    gaze_result['next_analysis_in_ms'], gaze_result['pacing'] = student_state.gaze_pacer.update(
+        gaze_result, gaze_result.get('smoothed'))
+
+
+def _finish_student_frame(gaze_result, face_detection, student_state, timestamp):
+    """Adds the student's smoothed gaze, pacing hint and calibration status"""
+    student_state.frames += 1
+    _update_student_gaze(gaze_result, student_state, timestamp)
+    gaze_result['calibrated'] = student_state.calibration.is_complete()
+    gaze_result['face_detection'] = face_detection
+    return gaze_result
+
+
+def finish_reused_frame(gaze_result, student_state, timestamp=None):
+    """Passes a reused result (an unchanged frame) through the student's gaze filter
+    and pacer, so its smoothed gaze and next_analysis_in_ms move on with time as
+    those of an analyzed frame would
+    """
+    _update_student_gaze(gaze_result, student_state, timestamp)
+    return gaze_result
+
+
+def analyze_student_frame(frame, gaze_tracker, student_state, timestamp=None):
+    """Gaze analysis of one student's frame: attaches the student's calibration and
+    tracked face to the tracker, analyzes, and keeps the updated face for next time.
+    The per-frame result gets a 'smoothed' block from the student's gaze filter
+    and a next_analysis_in_ms hint from the student's pacer.
+    """
+    gaze_tracker.calibration = student_state.calibration
+    gaze_tracker.tracking_state = student_state.face_tracking
+    
+    gaze_result = analyze_opencv_frame(frame, gaze_tracker)
+    
+    student_state.face_tracking = gaze_tracker.tracking_state
+    return _finish_student_frame(gaze_result, _face_detection(gaze_tracker), student_state, timestamp)
+
+
+def locate_student_face(frame, gaze_tracker, student_state):
+    """First half of analyze_student_frame, for the pipeline's face stage: finds the
+    student's face and landmarks from their tracked face, without touching the eyes
+    """
+    gaze_tracker.tracking_state = student_state.face_tracking
+    located = {'gray': None, 'landmarks': None, 'error': None}
+    try:
+        _validate_frame(frame)
+        located['gray'], located['landmarks'] = gaze_tracker.locate(frame)
+    except Exception as e:
+        logger.error(f"Face location failed: {str(e)}")
+        located['error'] = ValueError(f"Gaze tracking failed: {str(e)}")
+    
+    student_state.face_tracking = gaze_tracker.tracking_state
+    located['face_detection'] = _face_detection(gaze_tracker)
+    return located
+
+
+def analyze_located_frame(frame, located, gaze_tracker, student_state, timestamp=None):
+    """Second half of analyze_student_frame, for the pipeline's eyes stage: pupils,
+    ratios and direction of a frame located by locate_student_face on any tracker
+    """
+    if located['error'] is not None:
+        gaze_result = _analysis_error(located['error'])
+    else:
+        gaze_tracker.calibration = student_state.calibration
+        try:
+            gaze_tracker.refresh_landmarks(frame, located['gray'], located['landmarks'])
+            gaze_result = describe_gaze(gaze_tracker)
+        except Exception as e:
+            gaze_result = _analysis_error(e)
+    return _finish_student_frame(gaze_result, located['face_detection'], student_state, timestamp)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Asyncio front end for the Gaze Tracking Service (gaze_service.py --server async)
+The Flask server parks a request thread on every frame until a tracker is
+free, up to 30 s. Here requests are admitted by deadline instead
+(gaze_admission.py): a frame that cannot be analyzed before its deadline is
+answered 503 with Retry-After right away, and admitted frames wait in an
+asyncio queue rather than in threads. A worker takes a frame only when a
+tracker thread is free, and skips it without decoding when its deadline has
+passed or its client has disconnected.
+
+Needs aiohttp (pip install aiohttp); the Flask server does not.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import math
+import time
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+from gaze_admission import AdmissionController, DEFAULT_DEADLINE_MS, now_ms
+from gaze_pacing import BASE_INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+_dumps = functools.partial(json.dumps, default=str)
+
+
+def _json(body, status=200, headers=None):
+    return web.json_response(body, status=status, headers=headers, dumps=_dumps)
+
+
+class AsyncGazeServer(object):
+    def __init__(self, service, max_queue=None, default_deadline_ms=DEFAULT_DEADLINE_MS):
+        """
+        service: a ThreadSafeGazeService; its trackers, executor and statistics are used as they are
+        max_queue: admitted frames allowed to wait for a tracker (default 4 per tracker thread)
+        default_deadline_ms: budget of frames sent without captureTimestamp/deadline
+        """
+        if web is None:
+            raise RuntimeError("The async gaze server needs aiohttp (pip install aiohttp)")
+        self.service = service
+        self.admission = AdmissionController(workers=service.request_threads, max_queue=max_queue,
+                                             default_deadline_ms=default_deadline_ms)
+        self.queue = None
+        self.workers = []
+
+        self.app = web.Application(client_max_size=10 * 1024 * 1024)
+        self.app.router.add_get('/health', self.health_check)
+        self.app.router.add_get('/stats', self.get_stats)
+        self.app.router.add_post('/analyze', self.analyze_frame)
+        self.app.router.add_delete('/students/{student_id}', self.reset_student)
+        self.app.on_startup.append(self._start_workers)
+        self.app.on_cleanup.append(self._stop_workers)
+
+    async def _start_workers(self, app):
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.ensure_future(self._worker()) for _ in range(self.admission.workers)]
+        logger.info(f"Async gaze server started {len(self.workers)} analysis workers, "
+                    f"queue limit {self.admission.max_queue}")
+
+    async def _stop_workers(self, app):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    def _shed_response(self, reason, retry_after_ms):
+        body = {
+            'success': False,
+            'error': 'Service overloaded, frame shed',
+            'gaze_direction': 'shed',
+            'shed_reason': reason,
+            'retry_after_ms': retry_after_ms,
+            'next_analysis_in_ms': max(BASE_INTERVAL_MS, retry_after_ms)
+        }
+        headers = {'Retry-After': str(max(1, int(math.ceil(retry_after_ms / 1000.0))))}
+        return _json(body, status=503, headers=headers)
+
+    def _analyze(self, student_id, frame_data):
+        """Runs on a tracker thread: validation is only paid for frames that get analyzed"""
+        is_valid, validated_data_or_error = self.service.validate_base64_image(frame_data)
+        if not is_valid:
+            self.service.update_stats(corrupted_frames=1)
+            return 400, {
+                'error': f'Invalid frame data: {validated_data_or_error}',
+                'success': False,
+                'gaze_direction': 'error',
+                'next_analysis_in_ms': BASE_INTERVAL_MS
+            }
+        return 200, self.service.analyze_gaze_from_base64_threadsafe(student_id, validated_data_or_error)
+
+    async def _worker(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            job = await self.queue.get()
+            transport = job['request'].transport
+            if job['future'].done() or transport is None or transport.is_closing():
+                self.admission.drop('client_gone')
+                continue
+
+            reason = self.admission.start(job['deadline'])
+            if reason is not None:
+                job['future'].set_result(('shed', reason))
+                continue
+
+            started = time.perf_counter()
+            try:
+                outcome = await loop.run_in_executor(self.service.executor, self._analyze,
+                                                     job['student_id'], job['frame_data'])
+            except Exception as e:
+                outcome = e
+            finally:
+                self.admission.finish((time.perf_counter() - started) * 1000.0, job['deadline'])
+            if not job['future'].done():
+                job['future'].set_result(outcome)
+
+    async def health_check(self, request):
+        body = self.service.health()
+        body['server'] = 'async'
+        body['queue_depth'] = self.admission.queued
+        return _json(body)
+
+    async def get_stats(self, request):
+        stats = self.service.collect_stats()
+        stats['admission'] = self.admission.stats()
+        return _json(stats)
+
+    async def reset_student(self, request):
+        student_id = request.match_info['student_id']
+        return _json({'success': True, 'studentId': student_id, 'reset': self.service.reset_student(student_id)})
+
+    async def analyze_frame(self, request):
+        service = self.service
+        with service.stats_lock:
+            service.stats['concurrent_requests'] += 1
+            if service.stats['concurrent_requests'] > service.stats['max_concurrent']:
+                service.stats['max_concurrent'] = service.stats['concurrent_requests']
+
+        try:
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            if not data:
+                return _json({'error': 'No JSON data provided'}, status=400)
+
+            student_id = data.get('studentId')
+            frame_data = data.get('frameData')
+            if not student_id or not frame_data:
+                return _json({'error': 'Missing studentId or frameData'}, status=400)
+
+            deadline = self.admission.deadline(data.get('captureTimestamp'), data.get('deadline'))
+            admitted, reason, retry_after_ms = self.admission.admit(deadline)
+            if not admitted:
+                return self._shed_response(reason, retry_after_ms)
+
+            future = asyncio.get_event_loop().create_future()
+            self.queue.put_nowait({'student_id': student_id, 'frame_data': frame_data, 'deadline': deadline,
+                                   'request': request, 'future': future})
+            outcome = await future
+
+            if isinstance(outcome, Exception):
+                raise outcome
+            if outcome[0] == 'shed':
+                return self._shed_response(outcome[1], self.admission.min_retry_ms)
+            status, result = outcome
+            if status != 200:
+                return _json(result, status=status)
+
+            result['deadline_missed'] = now_ms() > deadline
+            service.record_result(student_id, result)
+            return _json(result)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in analyze_frame: {str(e)}")
+            service.update_stats(errors=1)
+            return _json({
+                'error': f'Analysis failed: {str(e)}',
+                'success': False,
+                'gaze_direction': 'error',
+                'next_analysis_in_ms': BASE_INTERVAL_MS
+            }, status=500)
+        finally:
+            with service.stats_lock:
+                service.stats['concurrent_requests'] -= 1
+
+    def run(self, host='localhost', port=5000):
+        logger.info(f"Starting async Gaze Analysis Service on {host}:{port}")
+        web.run_app(self.app, host=host, port=port, print=None)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Frame-difference skip cache for the Gaze Tracking Service
+Keeps a tiny grayscale thumbnail of each student's last analyzed frame with
+its gaze result. A new frame whose thumbnail barely differs gets the
+previous result back (marked reused) without the full decode, face
+detection, landmarks or pupil search.
+
+Eyes moving in a still head hardly change a whole-frame thumbnail, so when
+the previous result located the pupils, the patch around them is compared
+as well, at half resolution.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+THUMBNAIL_SIZE = (32, 24)
+
+
+def decode_reduced(image_bytes):
+    """Half-resolution grayscale decode of an encoded frame, None when it cannot be decoded
+
+    JPEG is decoded straight from the DCT coefficients at the reduced scale,
+    which skips most of the work of a full color decode.
+    """
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+    reduced = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if reduced is None or reduced.size == 0:
+        return None
+    return reduced
+
+
+def _mean_difference(a, b):
+    return float(cv2.norm(a, b, cv2.NORM_L1)) / a.size
+
+
+class FrameSkipCache(object):
+    def __init__(self, threshold=3.0, eye_threshold=4.0, max_reuse_seconds=1.0, max_students=1000, ttl=60):
+        """
+        threshold: mean absolute thumbnail difference (gray levels) below which a frame may be skipped
+        eye_threshold: the same for the patch around the previous pupils
+        max_reuse_seconds: a result is not reused once it is this old, so tracking, calibration
+                           and smoothing keep seeing frames of a perfectly still student
+        max_students: thumbnails kept before the least recently used one is dropped
+        ttl: seconds after which an idle student's thumbnail is dropped
+        """
+        self.threshold = threshold
+        self.eye_threshold = eye_threshold
+        self.max_reuse_seconds = max_reuse_seconds
+        self.max_students = max_students
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # studentId -> entry dict, least recently used first
+        self._entries = OrderedDict()
+        self.reused = 0
+        self.analyzed = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _eye_box(reduced, result):
+        """Region around both pupils of a result, in the coordinates of the reduced frame"""
+        pupils = result.get('pupils') or {}
+        frame_size = result.get('frame_size') or {}
+        if not pupils.get('left') or not pupils.get('right') or not frame_size.get('width'):
+            return None
+        scale = reduced.shape[1] / float(frame_size['width'])
+        (x1, y1), (x2, y2) = pupils['left'], pupils['right']
+        distance = max(abs(x2 - x1), abs(y2 - y1)) * scale
+        pad_x, pad_y = max(6, int(0.6 * distance)), max(4, int(0.3 * distance))
+        left = max(0, int(min(x1, x2) * scale) - pad_x)
+        top = max(0, int(min(y1, y2) * scale) - pad_y)
+        right = min(reduced.shape[1], int(max(x1, x2) * scale) + pad_x + 1)
+        bottom = min(reduced.shape[0], int(max(y1, y2) * scale) + pad_y + 1)
+        if right - left < 4 or bottom - top < 4:
+            return None
+        return left, top, right, bottom
+
+    def lookup(self, student_id, reduced, now=None):
+        """Returns a copy of the student's previous result marked reused, or None to analyze"""
+        now = time.time() if now is None else now
+        if reduced is None:
+            return None
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(student_id)
+            if (entry is None or now - entry['analyzed_at'] > self.max_reuse_seconds
+                    or entry['shape'] != reduced.shape):
+                return None
+
+            difference = _mean_difference(entry['thumbnail'], cv2.resize(reduced, THUMBNAIL_SIZE,
+                                                                          interpolation=cv2.INTER_AREA))
+            if difference >= self.threshold:
+                return None
+            if entry['eye_box'] is not None:
+                left, top, right, bottom = entry['eye_box']
+                if _mean_difference(entry['eye_patch'], reduced[top:bottom, left:right]) >= self.eye_threshold:
+                    return None
+
+            entry['last_used'] = now
+            self._entries.move_to_end(student_id)
+            self.reused += 1
+            result = entry['result']
+
+        reused = dict(result)
+        reused['reused'] = True
+        reused['frame_difference'] = round(difference, 2)
+        return reused
+
+    def store(self, student_id, reduced, result, now=None):
+        """Remembers an analyzed frame; failed analyses are not reused"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.analyzed += 1
+            if reduced is None or not result.get('success'):
+                self._entries.pop(student_id, None)
+                return
+
+            eye_box = self._eye_box(reduced, result)
+            self._entries[student_id] = {
+                'shape': reduced.shape,
+                'thumbnail': cv2.resize(reduced, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA),
+                'eye_box': eye_box,
+                'eye_patch': (reduced[eye_box[1]:eye_box[3], eye_box[0]:eye_box[2]].copy()
+                              if eye_box is not None else None),
+                'result': result,
+                'analyzed_at': now,
+                'last_used': now
+            }
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_students:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def reset(self, student_id=None):
+        with self._lock:
+            if student_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(student_id, None)
+
+    def _expire(self, now):
+        # Least recently used entries come first, so stop at the first fresh one
+        while self._entries:
+            student_id, entry = next(iter(self._entries.items()))
+            if now - entry['last_used'] <= self.ttl:
+                break
+            del self._entries[student_id]
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.reused + self.analyzed
+            stored_bytes = sum(entry['thumbnail'].nbytes
+                               + (entry['eye_patch'].nbytes if entry['eye_patch'] is not None else 0)
+                               for entry in self._entries.values())
+            return {
+                'students': len(self._entries),
+                'max_students': self.max_students,
+                'ttl_seconds': self.ttl,
+                'threshold': self.threshold,
+                'eye_threshold': self.eye_threshold,
+                'stored_bytes': stored_bytes,
+                'reused': self.reused,
+                'analyzed': self.analyzed,
+                'evicted': self.evicted,
+                'skip_ratio': round(self.reused / total, 3) if total else None
+            }
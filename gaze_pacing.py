@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Analysis pacing for the Gaze Tracking Service
+Each /analyze response carries next_analysis_in_ms: how long the caller can
+wait before sending this student's next frame. The hint backs off while the
+smoothed gaze (gaze_smoothing.GazeFilter) stays steadily on the screen and
+drops to the minimum as soon as the student looks away, the gaze nears a
+threshold or the face is lost.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from gaze_smoothing import LEFT_THRESHOLD, RIGHT_THRESHOLD
+
+MIN_INTERVAL_MS = 100
+BASE_INTERVAL_MS = 250
+MAX_INTERVAL_MS = 1500
+
+
+class GazePacer(object):
+    """Next-analysis hint of one student"""
+
+    def __init__(self, min_interval_ms=MIN_INTERVAL_MS, base_interval_ms=BASE_INTERVAL_MS,
+                 max_interval_ms=MAX_INTERVAL_MS, backoff=1.5, stable_margin=0.08, stable_confidence=0.8):
+        """
+        min_interval_ms: hint while the gaze is away, unsettled or not detected
+        base_interval_ms: hint while centered but close to a direction threshold
+        max_interval_ms: longest hint; bounds how late a look-away is first seen
+        backoff: factor the hint grows by with every stable result
+        stable_margin: ratio distance from both thresholds that counts as steadily centered
+        stable_confidence: smoothed confidence needed to back off
+        """
+        self.min_interval_ms = min_interval_ms
+        self.base_interval_ms = base_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.backoff = backoff
+        self.stable_margin = stable_margin
+        self.stable_confidence = stable_confidence
+        self.interval_ms = base_interval_ms
+        self.reason = 'initial'
+
+    def update(self, gaze_result, smoothed):
+        """Returns (next_analysis_in_ms, reason) after one analyzed frame"""
+        horizontal = (smoothed or {}).get('ratios', {}).get('horizontal')
+
+        if not gaze_result.get('success') or smoothed is None or horizontal is None:
+            self.interval_ms, self.reason = self.min_interval_ms, 'no_gaze'
+        elif smoothed['gaze_direction'] in ('left', 'right'):
+            self.interval_ms, self.reason = self.base_interval_ms, 'looking_away'
+        elif gaze_result.get('gaze_direction') in ('left', 'right') or smoothed.get('outlier'):
+            # The single frame disagrees with the smoothed gaze: a look-away may be starting
+            self.interval_ms, self.reason = self.min_interval_ms, 'unsettled'
+        elif gaze_result.get('gaze_direction') == 'blinking':
+            # Says nothing about stability, keep the current pace
+            self.reason = 'blinking'
+        elif (min(horizontal - RIGHT_THRESHOLD, LEFT_THRESHOLD - horizontal) >= self.stable_margin
+              and smoothed['confidence'] >= self.stable_confidence):
+            self.interval_ms = min(self.max_interval_ms, max(self.interval_ms, self.base_interval_ms) * self.backoff)
+            self.reason = 'stable'
+        else:
+            self.interval_ms, self.reason = self.base_interval_ms, 'near_threshold'
+
+        return int(round(self.interval_ms)), self.reason
+
+
+class SamplingRateMeter(object):
+    """Effective per-student analysis rate, for /stats"""
+
+    def __init__(self, window=60.0):
+        """window: seconds after which a student without requests no longer counts"""
+        self.window = window
+        self._lock = threading.Lock()
+        self._students = {}  # studentId -> last request, smoothed interval, last hint and reason
+
+    def record(self, student_id, next_analysis_in_ms=None, reason=None, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._students.get(student_id)
+            if entry is None:
+                entry = {'last': now, 'interval': None}
+                self._students[student_id] = entry
+            else:
+                interval = now - entry['last']
+                # Average over the last few requests, a single late frame should not swing the rate
+                entry['interval'] = interval if entry['interval'] is None else 0.7 * entry['interval'] + 0.3 * interval
+                entry['last'] = now
+            entry['hint'] = next_analysis_in_ms
+            entry['reason'] = reason
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for student_id in [s for s, entry in self._students.items() if now - entry['last'] > self.window]:
+                del self._students[student_id]
+            entries = list(self._students.values())
+
+        rates = [1.0 / entry['interval'] for entry in entries if entry['interval']]
+        hints = [entry['hint'] for entry in entries if entry['hint'] is not None]
+        return {
+            'window_seconds': self.window,
+            'active_students': len(entries),
+            'analyses_per_second': round(sum(rates), 2),
+            'per_student_fps': round(sum(rates) / len(rates), 2) if rates else None,
+            'mean_next_analysis_ms': round(sum(hints) / len(hints)) if hints else None,
+            'pacing': dict(Counter(entry['reason'] for entry in entries if entry['reason']))
+        }
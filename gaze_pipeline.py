@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Staged pipeline for the Gaze Tracking Service (--engine pipeline)
+A frame passes through named stages connected by bounded queues; every stage
+has its own worker threads, so decoding one student's frame overlaps face
+detection of another's and each stage can be given the threads its share of
+the work needs. A full queue blocks the stage feeding it, which pushes back
+up to submit(). Per-stage queue depth, wait and service times are reported
+so the busiest stage is easy to spot.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage(object):
+    def __init__(self, name, handler, workers=1, capacity=8, setup=None):
+        """
+        name: stage name in logs and stats
+        handler: handler(job, context) does the stage's work on a job dict; setting
+                 job['result'] ends the job after this stage
+        workers: threads running the handler
+        capacity: jobs that may wait in front of the stage
+        setup: called once per worker thread, its return value is the handler's context
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.capacity = capacity
+        self.setup = setup
+        self.queue = queue.Queue(maxsize=capacity)
+        self.next = None
+        self.threads = []
+
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def put(self, job, timeout=None):
+        job['_queued_at'] = time.perf_counter()
+        self.queue.put(job, timeout=timeout)
+        depth = self.queue.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def record(self, waited, took, error=False):
+        with self._lock:
+            self.processed += 1
+            self.errors += error
+            self.wait_seconds += waited
+            self.busy_seconds += took
+
+    def stats(self, uptime):
+        with self._lock:
+            processed = self.processed
+            return {
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'processed': processed,
+                'errors': self.errors,
+                'dropped': self.dropped,
+                'service_ms': round(self.busy_seconds * 1000.0 / processed, 2) if processed else None,
+                'wait_ms': round(self.wait_seconds * 1000.0 / processed, 2) if processed else None,
+                # Share of the stage's thread time spent working; the stage close to 1.0 is the bottleneck
+                'utilization': round(self.busy_seconds / (uptime * self.workers), 3) if uptime > 0 else None
+            }
+
+
+class Pipeline(object):
+    def __init__(self, stages):
+        """stages: PipelineStage list, in the order a job passes them"""
+        self.stages = stages
+        for stage, following in zip(stages, stages[1:]):
+            stage.next = following
+        self.started_at = time.time()
+
+        for stage in stages:
+            for index in range(stage.workers):
+                # Built here rather than on the thread, so a failing setup (e.g. a missing model) raises
+                context = stage.setup() if stage.setup is not None else None
+                thread = threading.Thread(target=self._run_stage, args=(stage, context),
+                                          name=f"Gaze-{stage.name}-{index}", daemon=True)
+                thread.start()
+                stage.threads.append(thread)
+        logger.info("Gaze pipeline started: " + ", ".join(f"{stage.name} x{stage.workers}" for stage in stages))
+
+    def submit(self, job, timeout=None, on_exit=None):
+        """Queues a job dict at the first stage and returns a Future of its result
+
+        on_exit is called once the job has left the pipeline (finished, failed or
+        cancelled through its Future), from the thread that saw it leave. Raises
+        TimeoutError when the first stage stays full for timeout seconds; on_exit
+        is not called then.
+        """
+        future = Future()
+        job['_future'] = future
+        job['_on_exit'] = on_exit
+        try:
+            self.stages[0].put(job, timeout=timeout)
+        except queue.Full:
+            raise TimeoutError("Gaze pipeline full - service overloaded")
+        return future
+
+    @staticmethod
+    def _exit(job, result=None, error=None):
+        on_exit = job.get('_on_exit')
+        if on_exit is not None:
+            on_exit()
+        future = job['_future']
+        if future.set_running_or_notify_cancel():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _run_stage(self, stage, context):
+        while True:
+            job = stage.queue.get()
+            if job is None:
+                break
+            if job['_future'].cancelled():
+                # The caller gave up on it, no work is spent on it from here on
+                with stage._lock:
+                    stage.dropped += 1
+                self._exit(job)
+                continue
+
+            started = time.perf_counter()
+            waited = started - job['_queued_at']
+            try:
+                stage.handler(job, context)
+            except Exception as e:
+                stage.record(waited, time.perf_counter() - started, error=True)
+                self._exit(job, error=e)
+                continue
+            stage.record(waited, time.perf_counter() - started)
+
+            if 'result' in job or stage.next is None:
+                self._exit(job, result=job.get('result'))
+            else:
+                # Blocks while the next stage is full
+                stage.next.put(job)
+
+    def available_slots(self):
+        """Jobs the first stage can still take without blocking"""
+        first = self.stages[0]
+        return max(0, first.capacity - first.queue.qsize())
+
+    def stats(self):
+        uptime = time.time() - self.started_at
+        stages = {stage.name: stage.stats(uptime) for stage in self.stages}
+        busiest = max(stages, key=lambda name: stages[name]['utilization'] or 0.0)
+        return {
+            'engine': 'pipeline',
+            'stages': stages,
+            'bottleneck': busiest if stages[busiest]['processed'] else None
+        }
+
+    def close(self):
+        for stage in self.stages:
+            for _ in stage.threads:
+                stage.queue.put(None)
+            for thread in stage.threads:
+                thread.join(timeout=5)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Process-based engine for the Gaze Tracking Service
+Every worker process owns a GazeTracking instance and the state of the
+students routed to it. Decoded frames are copied into per-worker shared
+memory slots, so only a small task tuple and the result dict cross the
+process boundary.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Largest frame a slot can hold (1080p BGR)
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+def _worker_main(worker_index, tasks, results, slot_names, detection_interval, prefilter, max_students,
+                 student_ttl):
+    """Worker process: analyzes frames from its shared memory slots until told to stop"""
+    import cv2
+    from gaze_tracking import GazeTracking
+    from gaze_student_state import StudentStateCache
+    from gaze_analysis import analyze_student_frame, finish_reused_frame
+
+    # One process per core already, keep OpenCV from oversubscribing
+    cv2.setNumThreads(1)
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    gaze_tracker = GazeTracking(detection_interval=detection_interval, prefilter=prefilter)
+    student_states = StudentStateCache(max_students=max_students, ttl=student_ttl)
+    results.put(('ready', worker_index, os.getpid()))
+
+    try:
+        while True:
+            message = tasks.get()
+            if message is None:
+                break
+
+            kind, request_id = message[0], message[1]
+            if kind == 'analyze':
+                _, _, slot, shape, student_id = message
+                start = time.time()
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+                try:
+                    result = analyze_student_frame(frame, gaze_tracker, student_states.get(student_id))
+                except Exception as e:
+                    result = {
+                        'success': False,
+                        'error': str(e),
+                        'gaze_direction': 'error',
+                        'gaze_text': 'Analysis failed',
+                        'confidence': 0.0
+                    }
+                # The tracker must not keep a view of a slot the parent will overwrite
+                gaze_tracker.frame = None
+                del frame
+                results.put(('result', request_id, result, time.time() - start))
+            elif kind == 'reuse':
+                _, _, student_id, result = message
+                results.put(('reused', request_id, finish_reused_frame(result, student_states.get(student_id))))
+            elif kind == 'reset':
+                results.put(('reset', request_id, student_states.reset(message[2])))
+            elif kind == 'stats':
+                results.put(('stats', request_id, student_states.stats()))
+    finally:
+        for slot in slots:
+            slot.close()
+
+
+class GazeProcessEngine:
+    def __init__(self, workers=None, detection_interval=10, max_students=1000, student_ttl=2 * 3600,
+                 slots_per_worker=2, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES, start_timeout=120,
+                 prefilter=True):
+        """
+        workers: worker processes (default: one per CPU core)
+        slots_per_worker: frames that may be queued at one worker, including the one being analyzed
+        max_frame_bytes: size of every shared memory slot
+        start_timeout: seconds to wait for the workers to load their models
+        prefilter: whether the workers' trackers skip detection on dark or featureless frames
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.detection_interval = detection_interval
+        self.prefilter = prefilter
+        self.max_students = max_students
+        self.student_ttl = student_ttl
+        self.slots_per_worker = slots_per_worker
+        self.max_frame_bytes = max_frame_bytes
+
+        # Spawned workers do not inherit the parent's Flask threads or dlib state
+        self._ctx = multiprocessing.get_context('spawn')
+        self._results = self._ctx.Queue()
+        self._request_ids = itertools.count(1)
+        self._pending = {}  # request id -> waiter dict
+        self._pending_lock = threading.Lock()
+        self._closed = False
+
+        self._workers = []
+        for index in range(self.workers):
+            slots = [shared_memory.SharedMemory(create=True, size=max_frame_bytes)
+                     for _ in range(slots_per_worker)]
+            worker = {
+                'index': index,
+                'slots': slots,
+                # Filled once; afterwards a slot is only put back by whoever took it from its request
+                'free_slots': queue.Queue(),
+                'tasks': self._ctx.Queue(),
+                'process': None,
+                'pid': None,
+                'ready': threading.Event(),
+                # Serializes restarts, so a dead worker is replaced once however many requests notice it
+                'restart_lock': threading.Lock(),
+                'processed': 0,
+                'restarts': 0,
+                'busy_seconds': 0.0
+            }
+            for slot in range(slots_per_worker):
+                worker['free_slots'].put(slot)
+            self._workers.append(worker)
+            self._start_worker(worker)
+
+        self._listener = threading.Thread(target=self._listen, name="GazeEngineResults", daemon=True)
+        self._listener.start()
+        # Shared memory outlives the process unless unlinked
+        atexit.register(self.close)
+
+        deadline = time.time() + start_timeout
+        for worker in self._workers:
+            if not worker['ready'].wait(max(0.0, deadline - time.time())):
+                self.close()
+                raise RuntimeError(f"Gaze worker {worker['index']} did not start within {start_timeout}s")
+        logger.info(f"Gaze process engine started with {self.workers} workers, "
+                    f"{slots_per_worker} frame slots each")
+
+    def _start_worker(self, worker):
+        worker['ready'].clear()
+        worker['process'] = self._ctx.Process(
+            target=_worker_main,
+            args=(worker['index'], worker['tasks'], self._results, [s.name for s in worker['slots']],
+                  self.detection_interval, self.prefilter, self.max_students, self.student_ttl),
+            name=f"GazeWorker-{worker['index']}",
+            daemon=True)
+        worker['process'].start()
+
+    def _ensure_alive(self, worker):
+        """Restart a crashed worker; its in-flight requests fail and its students recalibrate"""
+        if worker['process'].is_alive() or self._closed:
+            return
+        with worker['restart_lock']:
+            # Another request may have restarted it while this one waited for the lock
+            if worker['process'].is_alive() or self._closed:
+                return
+            logger.error(f"Gaze worker {worker['index']} (pid {worker['pid']}) died with exit code "
+                         f"{worker['process'].exitcode}, restarting")
+            with self._pending_lock:
+                lost = [rid for rid, waiter in self._pending.items() if waiter['worker'] is worker]
+                for request_id in lost:
+                    waiter = self._pending.pop(request_id)
+                    # The dead worker will never answer for this slot. Slots taken by requests
+                    # that are not queued yet stay with them, so nothing else is put back here
+                    if waiter.get('slot') is not None:
+                        worker['free_slots'].put(waiter['slot'])
+                    waiter['result'] = {'success': False, 'error': 'Gaze worker crashed',
+                                        'gaze_direction': 'error', 'gaze_text': 'Analysis failed',
+                                        'confidence': 0.0}
+                    waiter['event'].set()
+                # Swapped under the same lock _request queues under: every request is either
+                # failed above or goes to the new process
+                worker['tasks'] = self._ctx.Queue()
+            worker['restarts'] += 1
+            self._start_worker(worker)
+
+    def _listen(self):
+        """Completes waiting requests with the results sent back by the workers"""
+        while True:
+            try:
+                message = self._results.get()
+            except Exception as e:
+                # Expected while the engine closes at interpreter exit
+                if not self._closed:
+                    logger.error(f"Gaze engine result queue failed: {str(e)}")
+                return
+            if message is None:
+                return
+
+            kind = message[0]
+            if kind == 'ready':
+                _, index, pid = message
+                self._workers[index]['pid'] = pid
+                self._workers[index]['ready'].set()
+                continue
+
+            request_id = message[1]
+            with self._pending_lock:
+                waiter = self._pending.pop(request_id, None)
+            if waiter is None:
+                continue
+
+            worker = waiter['worker']
+            if kind == 'result':
+                worker['processed'] += 1
+                worker['busy_seconds'] += message[3]
+            if waiter.get('slot') is not None:
+                # Released here rather than by the caller, so a timed-out request
+                # keeps its slot until the worker is really done with it
+                worker['free_slots'].put(waiter['slot'])
+            waiter['result'] = message[2]
+            waiter['event'].set()
+
+    def worker_for(self, student_id):
+        """Worker a student is pinned to; its calibration and face box live there"""
+        return self._workers[zlib.crc32(str(student_id).encode('utf-8')) % self.workers]
+
+    def _request(self, worker, message_builder, slot=None, timeout=10):
+        request_id = next(self._request_ids)
+        waiter = {'event': threading.Event(), 'result': None, 'worker': worker, 'slot': slot}
+        with self._pending_lock:
+            self._pending[request_id] = waiter
+            worker['tasks'].put(message_builder(request_id))
+
+        if not waiter['event'].wait(timeout):
+            self._ensure_alive(worker)
+            if not waiter['event'].is_set():
+                raise TimeoutError(f"Gaze worker {worker['index']} did not answer within {timeout}s")
+        return waiter['result']
+
+    def analyze(self, student_id, frame, timeout=10):
+        """Analyzes a BGR frame on the student's worker and returns the gaze result"""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds the {self.max_frame_bytes} byte slot size")
+
+        worker = self.worker_for(student_id)
+        self._ensure_alive(worker)
+        try:
+            slot = worker['free_slots'].get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No gaze worker slot available - service overloaded")
+
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=worker['slots'][slot].buf)[...] = frame
+        shape = frame.shape
+        return self._request(worker, lambda rid: ('analyze', rid, slot, shape, student_id),
+                             slot=slot, timeout=timeout)
+
+    def finish_reused(self, student_id, result, timeout=10):
+        """Passes a reused result through the student's gaze filter and pacer on their worker"""
+        return self._request(self.worker_for(student_id), lambda rid: ('reuse', rid, student_id, result),
+                             timeout=timeout)
+
+    def reset(self, student_id, timeout=5):
+        """Drops a student's calibration and face box, returns how many states were removed"""
+        return self._request(self.worker_for(student_id), lambda rid: ('reset', rid, student_id),
+                             timeout=timeout)
+
+    def available_slots(self):
+        return sum(worker['free_slots'].qsize() for worker in self._workers)
+
+    def student_stats(self, timeout=2):
+        """Student state counters summed over all workers"""
+        totals = {}
+        for worker in self._workers:
+            try:
+                stats = self._request(worker, lambda rid: ('stats', rid), timeout=timeout)
+            except TimeoutError:
+                continue
+            for key, value in stats.items():
+                if key in ('max_students', 'ttl_seconds'):
+                    totals[key] = value
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def stats(self):
+        workers = []
+        for worker in self._workers:
+            processed = worker['processed']
+            workers.append({
+                'index': worker['index'],
+                'pid': worker['pid'],
+                'alive': worker['process'].is_alive(),
+                'processed': processed,
+                'in_flight': self.slots_per_worker - worker['free_slots'].qsize(),
+                'avg_ms': round(1000.0 * worker['busy_seconds'] / processed, 2) if processed else None,
+                'restarts': worker['restarts']
+            })
+        return {
+            'engine': 'process',
+            'workers': self.workers,
+            'slots_per_worker': self.slots_per_worker,
+            'max_frame_bytes': self.max_frame_bytes,
+            'processed': sum(w['processed'] for w in workers),
+            'worker_stats': workers
+        }
+
+    def close(self):
+        """Stops the workers and releases the shared memory"""
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._workers:
+            try:
+                worker['tasks'].put(None)
+            except Exception:
+                pass
+        for worker in self._workers:
+            worker['process'].join(timeout=5)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+            for slot in worker['slots']:
+                slot.close()
+                slot.unlink()
+        self._results.put(None)
@@ -19,31 +19,80 @@ import sys
 import traceback
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-import queue
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import multiprocessing
+import argparse
+import zlib
+from gaze_student_state import StudentStateCache
+from gaze_pacing import BASE_INTERVAL_MS, MAX_INTERVAL_MS, SamplingRateMeter
+from gaze_frame_cache import FrameSkipCache, decode_reduced
+from gaze_pipeline import Pipeline, PipelineStage
+from gaze_analysis import (analyze_located_frame, analyze_opencv_frame, analyze_student_frame, finish_reused_frame,
+                           locate_student_face)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ThreadSafeGazeService:
-    def __init__(self, max_workers=2):
+    def __init__(self, max_workers=2, max_students=1000, student_ttl=2 * 3600, detection_interval=10,
+                 engine='thread', slots_per_worker=2, skip_threshold=3.0,
+                 stage_workers=None, stage_capacity=4, prefilter=True):
         """
         Initialize with limited concurrent workers to prevent resource conflicts
         max_workers: Maximum number of concurrent gaze analysis operations
+        max_students: Students whose calibration and face box are kept in memory
+        student_ttl: Seconds after which an idle student's state is dropped
+        detection_interval: Frames a student's face is tracked between detector runs
+                            (0 runs the full-frame detector on every frame)
+        engine: 'thread' runs the trackers in this process, 'process' runs one
+                tracker per worker process (see gaze_process_engine.py), 'pipeline'
+                splits each frame over decode, face and eyes stages (see gaze_pipeline.py)
+        slots_per_worker: Frames that may be queued per worker process
+        skip_threshold: thumbnail difference (mean gray levels) under which a student's
+                        previous result is reused instead of analyzing the frame (0 disables)
+        stage_workers: pipeline engine threads per stage, e.g. {'decode': 1, 'face': 4, 'eyes': 1}
+                       (default: one decode and eyes thread, max_workers face threads)
+        stage_capacity: pipeline engine frames that may wait in front of each stage
+        prefilter: answer dark or featureless frames with no face before running the face detector
         """
         self.max_workers = max_workers
+        self.detection_interval = detection_interval
+        self.prefilter = prefilter
+        self.engine_name = engine
         
-        # Thread-safe queue for managing gaze tracker instances
-        self.gaze_pool = queue.Queue(maxsize=max_workers)
-        self.pool_lock = threading.Lock()
+        # Pool of gaze trackers, each guarded by its own lock; students are routed
+        # to a preferred tracker so their requests keep hitting the same instance
+        self.gaze_trackers = []
+        self.tracker_locks = []
+        self.engine = None
+        self.pipeline = None
         
-        # Initialize pool of gaze trackers
-        self._initialize_gaze_pool()
+        if engine == 'process':
+            from gaze_process_engine import GazeProcessEngine
+            self.engine = GazeProcessEngine(
+                workers=max_workers, detection_interval=detection_interval,
+                max_students=max_students, student_ttl=student_ttl,
+                slots_per_worker=slots_per_worker, prefilter=prefilter)
+            self.student_states = None
+            request_threads = max_workers * slots_per_worker
+        elif engine == 'pipeline':
+            self.student_states = StudentStateCache(max_students=max_students, ttl=student_ttl)
+            self.pipeline = self._build_pipeline(dict({'decode': 1, 'face': max_workers, 'eyes': 1},
+                                                      **(stage_workers or {})), stage_capacity)
+            # Enough request threads to keep every stage worker and queue slot filled
+            request_threads = sum(stage.workers + stage.capacity for stage in self.pipeline.stages)
+        elif engine == 'thread':
+            self._initialize_gaze_pool()
+            # Calibration and last face box per student, attached to whichever tracker serves them
+            self.student_states = StudentStateCache(max_students=max_students, ttl=student_ttl)
+            request_threads = max_workers
+        else:
+            raise ValueError(f"Unknown gaze engine '{engine}' (choose thread, process or pipeline)")
         
         # Thread pool executor for handling requests
-        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="GazeWorker")
+        self.request_threads = request_threads
+        self.executor = ThreadPoolExecutor(max_workers=request_threads, thread_name_prefix="GazeWorker")
         
         # Statistics tracking (thread-safe)
         self.stats_lock = threading.Lock()
@@ -54,8 +103,15 @@ class ThreadSafeGazeService:
             'concurrent_requests': 0,
             'max_concurrent': 0,
             'start_time': datetime.now(),
-            'last_analysis': None
+            'last_analysis': None,
+            'affinity_hits': 0,
+            'affinity_misses': 0,
+            'detection_modes': {'tracked': 0, 'roi': 0, 'downscaled': 0, 'full': 0, 'prefiltered': 0}
         }
+        # Request rate per student, to see how much the next_analysis_in_ms hints save
+        self.sampling = SamplingRateMeter()
+        # Last analyzed thumbnail and result per student, for frames that did not change
+        self.frame_cache = FrameSkipCache(threshold=skip_threshold) if skip_threshold else None
         
         # Flask app setup
         self.app = Flask(__name__)
@@ -75,33 +131,98 @@ class ThreadSafeGazeService:
         """Initialize a pool of GazeTracking instances"""
         for i in range(self.max_workers):
             try:
-                gaze_tracker = GazeTracking()
-                self.gaze_pool.put(gaze_tracker)
+                gaze_tracker = GazeTracking(detection_interval=self.detection_interval, prefilter=self.prefilter)
+                self.gaze_trackers.append(gaze_tracker)
+                self.tracker_locks.append(threading.Lock())
                 logger.info(f"Initialized gaze tracker {i+1}/{self.max_workers}")
             except Exception as e:
                 logger.error(f"Failed to initialize gaze tracker {i+1}: {str(e)}")
                 raise e
     
-    def get_gaze_tracker(self, timeout=30):
-        """Get a gaze tracker from the pool (thread-safe)"""
-        try:
-            return self.gaze_pool.get(timeout=timeout)
-        except queue.Empty:
-            raise TimeoutError("No gaze tracker available - service overloaded")
+    def preferred_tracker(self, student_id):
+        """Index of the tracker a student is routed to (stable across restarts)"""
+        return zlib.crc32(str(student_id).encode('utf-8')) % len(self.gaze_trackers)
     
-    def return_gaze_tracker(self, gaze_tracker):
+    def get_gaze_tracker(self, student_id, timeout=30):
+        """Get a gaze tracker for a student (thread-safe), returns its index
+        
+        The student's preferred tracker is used when free; otherwise any free
+        tracker serves the request, and only when all are busy does it wait
+        for the preferred one.
+        """
+        preferred = self.preferred_tracker(student_id)
+        order = [preferred] + [i for i in range(len(self.gaze_trackers)) if i != preferred]
+        
+        for index in order:
+            if self.tracker_locks[index].acquire(blocking=False):
+                self.update_stats(**{'affinity_hits' if index == preferred else 'affinity_misses': 1})
+                return index
+        
+        if self.tracker_locks[preferred].acquire(timeout=timeout):
+            self.update_stats(affinity_hits=1)
+            return preferred
+        raise TimeoutError("No gaze tracker available - service overloaded")
+    
+    def return_gaze_tracker(self, index):
         """Return a gaze tracker to the pool (thread-safe)"""
-        try:
-            self.gaze_pool.put_nowait(gaze_tracker)
-        except queue.Full:
-            logger.warning("Gaze tracker pool full - tracker discarded")
+        self.tracker_locks[index].release()
+    
+    def _build_pipeline(self, stage_workers, stage_capacity):
+        """Decode, face and eyes stages; face and eyes workers each own a tracker"""
+        def tracker():
+            return GazeTracking(detection_interval=self.detection_interval, prefilter=self.prefilter)
+        
+        stages = [
+            PipelineStage('decode', self._decode_stage, stage_workers['decode'], stage_capacity),
+            PipelineStage('face', self._face_stage, stage_workers['face'], stage_capacity, setup=tracker),
+            PipelineStage('eyes', self._eyes_stage, stage_workers['eyes'], stage_capacity, setup=tracker)
+        ]
+        return Pipeline(stages)
+    
+    def _decode_stage(self, job, context):
+        opencv_frame, reduced_frame, reused_result = self.decode_frame(job['student_id'], job['frame_data'])
+        if reused_result is not None:
+            # The student's lock is held for the whole pipeline pass
+            job['result'] = finish_reused_frame(reused_result, job['student_state'])
+            return
+        job['frame'] = opencv_frame
+        job['reduced_frame'] = reduced_frame
+    
+    def _face_stage(self, job, gaze_tracker):
+        job['located'] = locate_student_face(job['frame'], gaze_tracker, job['student_state'])
+    
+    def _eyes_stage(self, job, gaze_tracker):
+        gaze_result = analyze_located_frame(job['frame'], job['located'], gaze_tracker, job['student_state'])
+        job['result'] = self._finish_result(gaze_result, job['student_id'], job['frame'], job['reduced_frame'])
+    
+    def available_workers(self):
+        if self.pipeline is not None:
+            return self.pipeline.available_slots()
+        if self.engine is not None:
+            return self.engine.available_slots()
+        return sum(1 for lock in self.tracker_locks if not lock.locked())
+    
+    def _count_detection_mode(self, gaze_result):
+        mode = gaze_result.get('face_detection', {}).get('mode')
+        if mode in ('tracked', 'roi', 'downscaled', 'full', 'prefiltered'):
+            with self.stats_lock:
+                self.stats['detection_modes'][mode] += 1
+    
+    @staticmethod
+    def _detection_rate(modes):
+        """Share of frames on which the face detector ran (any of ROI, downscaled, full)"""
+        total = sum(modes.values())
+        if total == 0:
+            return None
+        return round(1.0 - (modes['tracked'] + modes['prefiltered']) / total, 3)
     
     def update_stats(self, **kwargs):
         """Thread-safe stats update"""
         with self.stats_lock:
             for key, value in kwargs.items():
                 if key in self.stats:
-                    if key in ['frames_processed', 'errors', 'corrupted_frames']:
+                    if key in ['frames_processed', 'errors', 'corrupted_frames',
+                               'affinity_hits', 'affinity_misses']:
                         self.stats[key] += value
                     else:
                         self.stats[key] = value
@@ -128,33 +249,77 @@ class ThreadSafeGazeService:
         except Exception as e:
             return False, f"Base64 validation failed: {str(e)}"
     
+    def health(self):
+        """Body of /health"""
+        return {
+            'status': 'healthy',
+            'service': 'thread-safe-gaze-tracking',
+            'available_workers': self.available_workers(),
+            'max_workers': self.max_workers,
+            'engine': self.engine_name,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def collect_stats(self):
+        """Body of /stats"""
+        with self.stats_lock:
+            uptime = datetime.now() - self.stats['start_time']
+            stats_copy = self.stats.copy()
+        
+        stats_copy['uptime_seconds'] = int(uptime.total_seconds())
+        stats_copy['detection_modes'] = dict(stats_copy['detection_modes'])
+        stats_copy['detection_rate'] = self._detection_rate(stats_copy['detection_modes'])
+        stats_copy['detection_interval'] = self.detection_interval
+        stats_copy['prefilter'] = self.prefilter
+        stats_copy['sampling'] = self.sampling.stats()
+        if self.frame_cache is not None:
+            stats_copy['frame_skip'] = self.frame_cache.stats()
+        stats_copy['available_workers'] = self.available_workers()
+        if self.engine is not None:
+            stats_copy['student_states'] = self.engine.student_stats()
+            stats_copy['engine'] = self.engine.stats()
+        elif self.pipeline is not None:
+            stats_copy['student_states'] = self.student_states.stats()
+            stats_copy['engine'] = self.pipeline.stats()
+        else:
+            stats_copy['student_states'] = self.student_states.stats()
+            stats_copy['engine'] = {'engine': 'thread', 'workers': self.max_workers}
+        stats_copy['status'] = 'running'
+        
+        return stats_copy
+    
+    def record_result(self, student_id, result):
+        """Count an answered frame and its pacing hint"""
+        # Failed frames come back without a hint from the student's pacer
+        result.setdefault('next_analysis_in_ms', BASE_INTERVAL_MS)
+        self.sampling.record(student_id, result['next_analysis_in_ms'], result.get('pacing'))
+        self.update_stats(frames_processed=1)
+        with self.stats_lock:
+            self.stats['last_analysis'] = datetime.now().isoformat()
+    
+    def reset_student(self, student_id):
+        """Drop a student's calibration, face box and skip thumbnail; True when state was held"""
+        reset = self.engine.reset if self.engine is not None else self.student_states.reset
+        removed = reset(student_id)
+        # Node sends numeric ids in JSON bodies
+        if not removed and student_id.isdigit():
+            removed = reset(int(student_id))
+        if self.frame_cache is not None:
+            self.frame_cache.reset(student_id)
+            if student_id.isdigit():
+                self.frame_cache.reset(int(student_id))
+        return bool(removed)
+    
     def setup_routes(self):
         @self.app.route('/health', methods=['GET'])
         def health_check():
             """Health check endpoint"""
-            with self.stats_lock:
-                available_workers = self.gaze_pool.qsize()
-            
-            return jsonify({
-                'status': 'healthy',
-                'service': 'thread-safe-gaze-tracking',
-                'available_workers': available_workers,
-                'max_workers': self.max_workers,
-                'timestamp': datetime.now().isoformat()
-            })
+            return jsonify(self.health())
         
         @self.app.route('/stats', methods=['GET'])
         def get_stats():
             """Get service statistics"""
-            with self.stats_lock:
-                uptime = datetime.now() - self.stats['start_time']
-                stats_copy = self.stats.copy()
-            
-            stats_copy['uptime_seconds'] = int(uptime.total_seconds())
-            stats_copy['available_workers'] = self.gaze_pool.qsize()
-            stats_copy['status'] = 'running'
-            
-            return jsonify(stats_copy)
+            return jsonify(self.collect_stats())
         
         @self.app.route('/analyze', methods=['POST'])
         def analyze_frame():
@@ -187,7 +352,8 @@ class ThreadSafeGazeService:
                     return jsonify({
                         'error': f'Invalid frame data: {validated_data_or_error}',
                         'success': False,
-                        'gaze_direction': 'error'
+                        'gaze_direction': 'error',
+                        'next_analysis_in_ms': BASE_INTERVAL_MS
                     }), 400
                 
                 # Submit to thread pool for processing
@@ -204,13 +370,11 @@ class ThreadSafeGazeService:
                     return jsonify({
                         'error': 'Analysis timeout - service overloaded',
                         'success': False,
-                        'gaze_direction': 'timeout'
+                        'gaze_direction': 'timeout',
+                        'next_analysis_in_ms': MAX_INTERVAL_MS
                     }), 503
                 
-                self.update_stats(frames_processed=1)
-                with self.stats_lock:
-                    self.stats['last_analysis'] = datetime.now().isoformat()
-                
+                self.record_result(student_id, result)
                 return jsonify(result)
                 
             except Exception as e:
@@ -220,65 +384,108 @@ class ThreadSafeGazeService:
                 return jsonify({
                     'error': f'Analysis failed: {str(e)}',
                     'success': False,
-                    'gaze_direction': 'error'
+                    'gaze_direction': 'error',
+                    'next_analysis_in_ms': BASE_INTERVAL_MS
                 }), 500
             finally:
                 # Decrease concurrent request count
                 with self.stats_lock:
                     self.stats['concurrent_requests'] -= 1
+        
+        @self.app.route('/students/<student_id>', methods=['DELETE'])
+        def reset_student(student_id):
+            """Drop a student's calibration and face box, e.g. after a camera change"""
+            return jsonify({'success': True, 'studentId': student_id, 'reset': self.reset_student(student_id)})
+    
+    def decode_frame(self, student_id, frame_data):
+        """Base64 frame to BGR, returns (opencv_frame, reduced_frame, reused_result)
+        
+        reused_result is the student's previous result when the frame barely
+        differs from their last analyzed one; the frame is not decoded further then.
+        """
+        # Decode base64 to bytes
+        image_bytes = base64.b64decode(frame_data)
+        
+        if len(image_bytes) < 1000:
+            raise ValueError("Decoded image too small")
+        
+        # A frame that barely differs from the student's last analyzed one gets its result
+        reduced_frame = None
+        if self.frame_cache is not None:
+            reduced_frame = decode_reduced(image_bytes)
+            reused_result = self.frame_cache.lookup(student_id, reduced_frame)
+            if reused_result is not None:
+                reused_result['timestamp'] = datetime.now().isoformat()
+                return None, reduced_frame, reused_result
+        
+        # Convert to PIL Image with error handling
+        try:
+            pil_image = Image.open(io.BytesIO(image_bytes))
+            pil_image.verify()
+            pil_image = Image.open(io.BytesIO(image_bytes))
+        except Exception as e:
+            raise ValueError(f"Invalid image format: {str(e)}")
+        
+        # Convert to RGB if needed
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+        
+        # Check image dimensions
+        width, height = pil_image.size
+        if width < 50 or height < 50:
+            raise ValueError("Image too small for analysis")
+        
+        # Convert PIL to OpenCV format
+        opencv_frame = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        
+        if opencv_frame is None or opencv_frame.size == 0:
+            raise ValueError("Failed to convert to OpenCV format")
+        return opencv_frame, reduced_frame, None
     
     def analyze_gaze_from_base64_threadsafe(self, student_id, frame_data):
         """Thread-safe version of gaze analysis"""
-        gaze_tracker = None
-        image_bytes = None
-        pil_image = None
+        tracker_index = None
+        student_state = None
         opencv_frame = None
         
         try:
-            # Get a gaze tracker from the pool
-            gaze_tracker = self.get_gaze_tracker(timeout=10)
-            
-            # Decode base64 to bytes
-            image_bytes = base64.b64decode(frame_data)
-            
-            if len(image_bytes) < 1000:
-                raise ValueError("Decoded image too small")
-            
-            # Convert to PIL Image with error handling
-            try:
-                pil_image = Image.open(io.BytesIO(image_bytes))
-                pil_image.verify()
-                pil_image = Image.open(io.BytesIO(image_bytes))
-            except Exception as e:
-                raise ValueError(f"Invalid image format: {str(e)}")
-            
-            # Convert to RGB if needed
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
-            # Check image dimensions
-            width, height = pil_image.size
-            if width < 50 or height < 50:
-                raise ValueError("Image too small for analysis")
-            
-            # Convert PIL to OpenCV format
-            opencv_frame = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            
-            if opencv_frame is None or opencv_frame.size == 0:
-                raise ValueError("Failed to convert to OpenCV format")
+            if self.pipeline is not None:
+                # Decoded, located and analyzed by the pipeline stages; the student's
+                # lock is held until the frame leaves the pipeline
+                student_state = self.student_states.get(student_id)
+                if not student_state.lock.acquire(timeout=10):
+                    student_state = None
+                    raise TimeoutError("Previous frame of this student still being analyzed")
+                future = self.pipeline.submit({'student_id': student_id, 'frame_data': frame_data,
+                                               'student_state': student_state},
+                                              timeout=10, on_exit=student_state.lock.release)
+                student_state = None
+                try:
+                    return future.result(timeout=10)
+                except FutureTimeoutError:
+                    future.cancel()
+                    raise TimeoutError("Gaze pipeline did not finish the frame in time")
+            
+            opencv_frame, reduced_frame, reused_result = self.decode_frame(student_id, frame_data)
+            if reused_result is not None:
+                return self._finish_reused(student_id, reused_result)
+            
+            if self.engine is not None:
+                # Analyzed on the worker process the student is pinned to
+                gaze_result = self.engine.analyze(student_id, opencv_frame, timeout=10)
+                return self._finish_result(gaze_result, student_id, opencv_frame, reduced_frame)
+            
+            # Get the student's state, then a gaze tracker to run it on
+            student_state = self.student_states.get(student_id)
+            if not student_state.lock.acquire(timeout=10):
+                student_state = None
+                raise TimeoutError("Previous frame of this student still being analyzed")
+            tracker_index = self.get_gaze_tracker(student_id, timeout=10)
+            gaze_tracker = self.gaze_trackers[tracker_index]
             
             # Analyze gaze using the dedicated tracker
-            gaze_result = self.analyze_opencv_frame_threadsafe(opencv_frame, gaze_tracker)
-            
-            # Add metadata
-            gaze_result['studentId'] = student_id
-            gaze_result['timestamp'] = datetime.now().isoformat()
-            gaze_result['frame_size'] = {
-                'width': int(opencv_frame.shape[1]),
-                'height': int(opencv_frame.shape[0])
-            }
-            
-            return gaze_result
+            gaze_result = analyze_student_frame(opencv_frame, gaze_tracker, student_state)
+            return self._finish_result(gaze_result, student_id, opencv_frame, reduced_frame)
             
         except Exception as e:
             logger.error(f"Error processing frame for student {student_id}: {str(e)}")
@@ -293,126 +500,53 @@ class ThreadSafeGazeService:
             }
         finally:
             # Always return the gaze tracker to the pool
-            if gaze_tracker is not None:
-                self.return_gaze_tracker(gaze_tracker)
+            if tracker_index is not None:
+                self.return_gaze_tracker(tracker_index)
+            if student_state is not None:
+                student_state.lock.release()
             
             # Memory cleanup
             import gc
             try:
-                if image_bytes is not None:
-                    del image_bytes
-                if pil_image is not None:
-                    del pil_image
                 if opencv_frame is not None:
                     del opencv_frame
                 gc.collect()
             except:
                 pass
     
+    def _finish_reused(self, student_id, reused_result):
+        """Runs a reused result through the student's gaze filter and pacer, wherever the student lives"""
+        if self.engine is not None:
+            return self.engine.finish_reused(student_id, reused_result, timeout=10)
+        
+        student_state = self.student_states.get(student_id)
+        if not student_state.lock.acquire(timeout=10):
+            raise TimeoutError("Previous frame of this student still being analyzed")
+        try:
+            return finish_reused_frame(reused_result, student_state)
+        finally:
+            student_state.lock.release()
+    
+    def _finish_result(self, gaze_result, student_id, opencv_frame, reduced_frame=None):
+        """Count the detection mode, add request metadata and remember the frame for skipping"""
+        self._count_detection_mode(gaze_result)
+        
+        # Add metadata
+        gaze_result['reused'] = False
+        gaze_result['studentId'] = student_id
+        gaze_result['timestamp'] = datetime.now().isoformat()
+        gaze_result['frame_size'] = {
+            'width': int(opencv_frame.shape[1]),
+            'height': int(opencv_frame.shape[0])
+        }
+        
+        if self.frame_cache is not None:
+            self.frame_cache.store(student_id, reduced_frame, gaze_result)
+        return gaze_result
+    
     def analyze_opencv_frame_threadsafe(self, frame, gaze_tracker):
         """Thread-safe gaze analysis using dedicated tracker"""
-        try:
-            # Validate frame
-            if frame is None or frame.size == 0:
-                raise ValueError("Invalid frame for analysis")
-            
-            if len(frame.shape) != 3 or frame.shape[2] != 3:
-                raise ValueError("Frame must be 3-channel BGR image")
-            
-            # Use the dedicated gaze tracker (thread-safe since each thread has its own)
-            try:
-                gaze_tracker.refresh(frame)
-            except Exception as e:
-                logger.error(f"Gaze refresh failed: {str(e)}")
-                raise ValueError(f"Gaze tracking failed: {str(e)}")
-            
-            # Determine gaze direction
-            gaze_direction = "unknown"
-            gaze_text = ""
-            
-            try:
-                if gaze_tracker.is_blinking():
-                    gaze_direction = "blinking"
-                    gaze_text = "Blinking"
-                elif gaze_tracker.is_right():
-                    gaze_direction = "right"
-                    gaze_text = "Looking right"
-                elif gaze_tracker.is_left():
-                    gaze_direction = "left"
-                    gaze_text = "Looking left"
-                elif gaze_tracker.is_center():
-                    gaze_direction = "center"
-                    gaze_text = "Looking center"
-                else:
-                    gaze_direction = "unknown"
-                    gaze_text = "Cannot detect gaze"
-            except Exception as e:
-                logger.warning(f"Gaze direction detection failed: {str(e)}")
-                gaze_direction = "error"
-                gaze_text = "Detection error"
-            
-            # Get pupil coordinates
-            left_pupil = None
-            right_pupil = None
-            
-            try:
-                left_pupil = gaze_tracker.pupil_left_coords()
-                right_pupil = gaze_tracker.pupil_right_coords()
-                
-                if left_pupil is not None:
-                    left_pupil = [float(x) for x in left_pupil] if hasattr(left_pupil, '__iter__') else None
-                if right_pupil is not None:
-                    right_pupil = [float(x) for x in right_pupil] if hasattr(right_pupil, '__iter__') else None
-            except Exception as e:
-                logger.warning(f"Pupil coordinate extraction failed: {str(e)}")
-            
-            # Calculate confidence
-            confidence = 0.0
-            if left_pupil is not None and right_pupil is not None:
-                confidence = 1.0
-            elif left_pupil is not None or right_pupil is not None:
-                confidence = 0.5
-            
-            # Get ratios
-            horizontal_ratio = None
-            vertical_ratio = None
-            
-            try:
-                horizontal_ratio = gaze_tracker.horizontal_ratio()
-                vertical_ratio = gaze_tracker.vertical_ratio()
-                
-                if horizontal_ratio is not None:
-                    horizontal_ratio = float(horizontal_ratio)
-                if vertical_ratio is not None:
-                    vertical_ratio = float(vertical_ratio)
-            except Exception as e:
-                logger.warning(f"Ratio calculation failed: {str(e)}")
-            
-            return {
-                'success': True,
-                'gaze_direction': gaze_direction,
-                'gaze_text': gaze_text,
-                'confidence': float(confidence),
-                'pupils': {
-                    'left': left_pupil,
-                    'right': right_pupil
-                },
-                'ratios': {
-                    'horizontal': horizontal_ratio,
-                    'vertical': vertical_ratio
-                },
-                'face_detected': left_pupil is not None or right_pupil is not None
-            }
-            
-        except Exception as e:
-            logger.error(f"Error analyzing frame: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'gaze_direction': 'error',
-                'gaze_text': 'Analysis failed',
-                'confidence': 0.0
-            }
+        return analyze_opencv_frame(frame, gaze_tracker)
     
     def run(self, host='localhost', port=5000, debug=False):
         """Start the Flask server"""
@@ -424,14 +558,75 @@ class ThreadSafeGazeService:
         """Clean shutdown of the service"""
         logger.info("Shutting down Thread-Safe Gaze Service...")
         self.executor.shutdown(wait=True)
+        if self.engine is not None:
+            self.engine.close()
+        if self.pipeline is not None:
+            self.pipeline.close()
+
+def parse_stage_workers(value):
+    """'decode=1,face=4' -> {'decode': 1, 'face': 4}"""
+    stage_workers = {}
+    for item in filter(None, value.split(',')):
+        name, _, count = item.partition('=')
+        if name not in ('decode', 'face', 'eyes') or not count.isdigit() or int(count) < 1:
+            raise SystemExit(f"Invalid --stage-workers entry '{item}' (expected decode|face|eyes=N)")
+        stage_workers[name] = int(count)
+    return stage_workers
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Thread-Safe Gaze Tracking Service')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--engine', choices=['thread', 'process', 'pipeline'], default='thread',
+                        help='thread: trackers share this process; process: one worker process '
+                             'per tracker with shared-memory frame hand-off; pipeline: decode, face '
+                             'and eyes stages with their own threads and bounded queues')
+    parser.add_argument('--stage-workers', default='',
+                        help='pipeline engine threads per stage, e.g. decode=1,face=4,eyes=1 '
+                             '(face defaults to --workers); see the stage utilization in /stats')
+    parser.add_argument('--stage-capacity', type=int, default=4,
+                        help='pipeline engine frames that may wait in front of each stage')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Gaze trackers (default: thread engine half the CPU cores, at most 4; '
+                             'process engine one per core)')
+    parser.add_argument('--detection-interval', type=int, default=10,
+                        help='Frames a face is tracked through its landmarks between detector runs '
+                             '(0 runs the full-frame detector on every frame)')
+    parser.add_argument('--no-prefilter', dest='prefilter', action='store_false',
+                        help='Run the face detector on dark or featureless frames too '
+                             '(see benchmarks/bench_no_face_prefilter.py)')
+    parser.add_argument('--skip-threshold', type=float, default=3.0,
+                        help='Mean gray-level difference of 32x24 thumbnails under which a student\'s '
+                             'previous result is reused (0 analyzes every frame)')
+    parser.add_argument('--server', choices=['flask', 'async'], default='flask',
+                        help='flask: threaded Flask server; async: asyncio server with deadline admission '
+                             'and load shedding (needs aiohttp, see gaze_async_server.py)')
+    parser.add_argument('--deadline-ms', type=int, default=1000,
+                        help='async server: budget of frames sent without a deadline')
+    parser.add_argument('--max-queue', type=int, default=None,
+                        help='async server: admitted frames allowed to wait (default 4 per tracker thread)')
+    return parser.parse_args()
 
 if __name__ == '__main__':
+    args = parse_args()
+    
     # Determine optimal number of workers based on CPU cores
-    max_workers = min(4, max(1, multiprocessing.cpu_count() // 2))
+    if args.engine == 'process':
+        max_workers = args.workers or multiprocessing.cpu_count()
+    else:
+        max_workers = args.workers or min(4, max(1, multiprocessing.cpu_count() // 2))
     
     try:
-        service = ThreadSafeGazeService(max_workers=max_workers)
-        service.run(host='0.0.0.0', port=5000, debug=False)
+        service = ThreadSafeGazeService(max_workers=max_workers, detection_interval=args.detection_interval,
+                                        engine=args.engine, skip_threshold=args.skip_threshold,
+                                        stage_workers=parse_stage_workers(args.stage_workers),
+                                        stage_capacity=args.stage_capacity, prefilter=args.prefilter)
+        if args.server == 'async':
+            from gaze_async_server import AsyncGazeServer
+            AsyncGazeServer(service, max_queue=args.max_queue,
+                            default_deadline_ms=args.deadline_ms).run(host=args.host, port=args.port)
+        else:
+            service.run(host=args.host, port=args.port, debug=False)
     except KeyboardInterrupt:
         logger.info("Service interrupted by user")
         service.shutdown()
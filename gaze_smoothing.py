@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Temporal smoothing of gaze results for the Gaze Tracking Service
+A small Kalman filter per quantity (gaze ratios and pupil positions) keeps
+single noisy frames from flipping a student's direction. The filter works
+on wall-clock time rather than frame counts, so a student sampled at 3 fps
+gets the same direction and durations as one sampled at 15 fps, only with
+fewer, more heavily weighted updates.
+"""
+
+import math
+
+# Same thresholds as GazeTracking.is_right() / is_left()
+RIGHT_THRESHOLD = 0.35
+LEFT_THRESHOLD = 0.65
+
+DIRECTION_TEXT = {
+    'right': 'Looking right',
+    'left': 'Looking left',
+    'center': 'Looking center',
+    'unknown': 'Cannot detect gaze'
+}
+
+
+class ScalarKalman(object):
+    """Random-walk Kalman filter of one value, with an innovation gate against outliers"""
+
+    def __init__(self, process_noise, measurement_noise, gate=3.0, max_outliers=2):
+        """
+        process_noise: variance the true value gains per second
+        measurement_noise: variance of a single measurement
+        gate: innovations beyond this many standard deviations are treated as outliers
+        max_outliers: consecutive outliers after which the value is taken to have really moved
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.gate = gate
+        self.max_outliers = max_outliers
+        self.value = None
+        self.variance = None
+        self.outliers = 0
+
+    def predict(self, dt):
+        if self.value is not None:
+            self.variance += self.process_noise * max(dt, 0.0)
+
+    def update(self, measurement):
+        """Folds in a measurement, returns False when it was rejected as an outlier"""
+        if self.value is None:
+            self.value = measurement
+            self.variance = self.measurement_noise
+            return True
+
+        innovation = measurement - self.value
+        innovation_variance = self.variance + self.measurement_noise
+        if innovation * innovation > self.gate * self.gate * innovation_variance:
+            self.outliers += 1
+            if self.outliers <= self.max_outliers:
+                return False
+            # Several frames agree on the jump: restart from the new value
+            self.value = measurement
+            self.variance = self.measurement_noise
+            self.outliers = 0
+            return True
+
+        gain = self.variance / innovation_variance
+        self.value += gain * innovation
+        self.variance *= (1.0 - gain)
+        self.outliers = 0
+        return True
+
+
+class GazeFilter(object):
+    """Smoothed gaze of one student, fed with the per-frame results of analyze_opencv_frame"""
+
+    def __init__(self, ratio_process_noise=0.05, ratio_measurement_noise=0.004,
+                 pupil_process_noise=400.0, pupil_measurement_noise=9.0,
+                 hysteresis=0.03, max_gap=2.0, confidence_time_constant=1.0):
+        """
+        ratio_process_noise / ratio_measurement_noise: variances of the gaze ratios (per second / per frame)
+        pupil_process_noise / pupil_measurement_noise: the same for pupil positions, in pixels
+        hysteresis: extra ratio margin needed to leave a direction once in it
+        max_gap: seconds without a usable frame after which the filter starts over
+        confidence_time_constant: seconds over which the detection confidence is averaged
+        """
+        self.hysteresis = hysteresis
+        self.max_gap = max_gap
+        self.confidence_time_constant = confidence_time_constant
+        self.ratios = {name: ScalarKalman(ratio_process_noise, ratio_measurement_noise)
+                       for name in ('horizontal', 'vertical')}
+        self.pupils = {name: ScalarKalman(pupil_process_noise, pupil_measurement_noise)
+                       for name in ('left_x', 'left_y', 'right_x', 'right_y')}
+
+        self.direction = 'unknown'
+        self.direction_since = None
+        self.confidence = 0.0
+        self.last_update = None
+        self.last_measurement = None
+        self.outliers_rejected = 0
+
+    def _reset(self):
+        for kalman in list(self.ratios.values()) + list(self.pupils.values()):
+            kalman.value = None
+            kalman.variance = None
+            kalman.outliers = 0
+
+    def _classify(self, horizontal):
+        """Direction of the smoothed horizontal ratio, sticking to the current one near a threshold"""
+        if horizontal is None:
+            return 'unknown'
+        margin = self.hysteresis
+        if self.direction == 'right' and horizontal <= RIGHT_THRESHOLD + margin:
+            return 'right'
+        if self.direction == 'left' and horizontal >= LEFT_THRESHOLD - margin:
+            return 'left'
+        if self.direction == 'center' and RIGHT_THRESHOLD - margin < horizontal < LEFT_THRESHOLD + margin:
+            return 'center'
+        if horizontal <= RIGHT_THRESHOLD:
+            return 'right'
+        if horizontal >= LEFT_THRESHOLD:
+            return 'left'
+        return 'center'
+
+    def update(self, gaze_result, timestamp):
+        """Folds one frame's result in and returns the smoothed gaze
+
+        Blinking frames and frames without both ratios only advance time;
+        their pupils are not where the student is looking.
+        """
+        dt = 0.0 if self.last_update is None else max(0.0, timestamp - self.last_update)
+        self.last_update = timestamp
+
+        ratios = gaze_result.get('ratios') or {}
+        pupils = gaze_result.get('pupils') or {}
+        usable = (gaze_result.get('success') and gaze_result.get('gaze_direction') != 'blinking'
+                  and ratios.get('horizontal') is not None and ratios.get('vertical') is not None)
+
+        if self.last_measurement is not None and timestamp - self.last_measurement > self.max_gap:
+            self._reset()
+            self.last_measurement = None
+
+        for kalman in list(self.ratios.values()) + list(self.pupils.values()):
+            kalman.predict(dt)
+
+        if usable:
+            self.last_measurement = timestamp
+            for name, kalman in self.ratios.items():
+                if not kalman.update(float(ratios[name])):
+                    self.outliers_rejected += 1
+            for side in ('left', 'right'):
+                if pupils.get(side) is not None:
+                    self.pupils[side + '_x'].update(float(pupils[side][0]))
+                    self.pupils[side + '_y'].update(float(pupils[side][1]))
+
+        # Time-weighted average of the per-frame confidence, so sparse sampling counts each frame
+        # more; a blink says nothing about how well the eyes are tracked
+        if gaze_result.get('gaze_direction') != 'blinking':
+            alpha = 1.0 - math.exp(-dt / self.confidence_time_constant)
+            if self.direction_since is None:
+                alpha = 1.0
+            frame_confidence = float(gaze_result.get('confidence', 0.0)) if usable else 0.0
+            self.confidence += alpha * (frame_confidence - self.confidence)
+
+        direction = self._classify(self.ratios['horizontal'].value)
+        if direction != self.direction or self.direction_since is None:
+            # The change happened some time since the previous frame; with sparse sampling
+            # the middle of that gap is a much better guess than now
+            self.direction = direction
+            self.direction_since = timestamp - dt / 2.0
+
+        def rounded(kalman, digits):
+            return round(kalman.value, digits) if kalman.value is not None else None
+
+        def pupil(side):
+            x, y = self.pupils[side + '_x'], self.pupils[side + '_y']
+            return [rounded(x, 1), rounded(y, 1)] if x.value is not None else None
+
+        return {
+            'gaze_direction': self.direction,
+            'gaze_text': DIRECTION_TEXT[self.direction],
+            'confidence': round(self.confidence, 3),
+            'direction_seconds': round(timestamp - self.direction_since, 3),
+            'ratios': {
+                'horizontal': rounded(self.ratios['horizontal'], 4),
+                'vertical': rounded(self.ratios['vertical'], 4)
+            },
+            'pupils': {
+                'left': pupil('left'),
+                'right': pupil('right')
+            },
+            'outlier': bool(usable) and self.ratios['horizontal'].outliers > 0
+        }
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Per-student state for the Gaze Tracking Service
+Keeps each student's pupil calibration, last face box, gaze filter and pacing across requests,
+independent of which pooled GazeTracking instance serves them
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from gaze_pacing import GazePacer
+from gaze_smoothing import GazeFilter
+from gaze_tracking.calibration import Calibration
+
+
+class StudentState(object):
+    """Warm state of one student, attached to a tracker for the duration of a request"""
+
+    def __init__(self, student_id):
+        self.student_id = student_id
+        self.calibration = Calibration()
+        self.face_tracking = None  # GazeTracking.tracking_state of the student's previous frame
+        self.gaze_filter = GazeFilter()
+        self.gaze_pacer = GazePacer()
+        self.frames = 0
+        self.updated_at = time.time()
+        # Serializes requests of the same student so calibration and face box stay consistent
+        self.lock = threading.Lock()
+
+
+class StudentStateCache(object):
+    def __init__(self, max_students=1000, ttl=2 * 3600):
+        """
+        max_students: states kept before the least recently used one is dropped
+        ttl: seconds after which an idle student's state is dropped
+        """
+        self.max_students = max_students
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._states = OrderedDict()  # studentId -> StudentState, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, student_id):
+        """Returns the student's state, creating a fresh one when unknown or expired"""
+        now = time.time()
+        with self._lock:
+            state = self._states.get(student_id)
+            if state is not None and now - state.updated_at > self.ttl:
+                del self._states[student_id]
+                self.evicted += 1
+                state = None
+
+            if state is None:
+                self.misses += 1
+                state = StudentState(student_id)
+                self._states[student_id] = state
+                while len(self._states) > self.max_students:
+                    self._states.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.hits += 1
+                self._states.move_to_end(student_id)
+
+            state.updated_at = now
+            self._expire(now)
+            return state
+
+    def reset(self, student_id=None):
+        """Drops one student's state (e.g. new camera or seat) or everyone's"""
+        with self._lock:
+            if student_id is None:
+                count = len(self._states)
+                self._states.clear()
+                return count
+            return 1 if self._states.pop(student_id, None) is not None else 0
+
+    def _expire(self, now):
+        # Least recently used states come first, so stop at the first fresh one
+        while self._states:
+            student_id, state = next(iter(self._states.items()))
+            if now - state.updated_at <= self.ttl:
+                break
+            del self._states[student_id]
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            calibrated = sum(1 for state in self._states.values() if state.calibration.is_complete())
+            return {
+                'students': len(self._states),
+                'calibrated': calibrated,
+                'max_students': self.max_students,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evicted': self.evicted
+            }
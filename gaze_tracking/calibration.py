@@ -1,5 +1,6 @@
 from __future__ import division
 import cv2
+import numpy as np
 from .pupil import Pupil
 
 
@@ -54,9 +55,15 @@ class Calibration(object):
         average_iris_size = 0.48
         trials = {}
 
+        # Filter once; a pixel ends up black after binarization when it is <= threshold,
+        # so the cumulative histogram gives the iris size for every candidate threshold
+        smoothed = Pupil.smooth(eye_frame)[5:-5, 5:-5]
+        height, width = smoothed.shape[:2]
+        nb_pixels = height * width
+        nb_blacks = np.cumsum(np.bincount(smoothed.ravel(), minlength=256))
+
         for threshold in range(5, 100, 5):
-            iris_frame = Pupil.image_processing(eye_frame, threshold)
-            trials[threshold] = Calibration.iris_size(iris_frame)
+            trials[threshold] = int(nb_blacks[threshold]) / nb_pixels
 
         best_threshold, iris_size = min(trials.items(), key=(lambda p: abs(p[1] - average_iris_size)))
         return best_threshold
@@ -8,19 +8,50 @@ class Eye(object):
     """
     This class creates a new frame to isolate the eye and
     initiates the pupil detection.
+
+    Only the blinking ratio is computed up front. The isolated frame
+    (frame, origin, center, landmark_points) is built on first access, and
+    the pupil (with its calibration step) on first access of pupil.
     """
 
     LEFT_EYE_POINTS = [36, 37, 38, 39, 40, 41]
     RIGHT_EYE_POINTS = [42, 43, 44, 45, 46, 47]
 
+    _ISOLATED_ATTRIBUTES = ('frame', 'origin', 'center', 'landmark_points')
+
     def __init__(self, original_frame, landmarks, side, calibration):
-        self.frame = None
-        self.origin = None
-        self.center = None
-        self.pupil = None
-        self.landmark_points = None
+        self._original_frame = original_frame
+        self._landmarks = landmarks
+        self._side = side
+        self._calibration = calibration
+        self.blinking = None
+
+        if side == 0:
+            self._points = self.LEFT_EYE_POINTS
+        elif side == 1:
+            self._points = self.RIGHT_EYE_POINTS
+        else:
+            self.frame = None
+            self.origin = None
+            self.center = None
+            self.pupil = None
+            self.landmark_points = None
+            return
+
+        self.blinking = self._blinking_ratio(landmarks, self._points)
 
-        self._analyze(original_frame, landmarks, side, calibration)
+    def __getattr__(self, name):
+        """Computes the lazy attributes on first access; afterwards they are
+        plain instance attributes and this is no longer called for them
+        """
+        if name in Eye._ISOLATED_ATTRIBUTES:
+            self._isolate(self._original_frame, self._landmarks, self._points)
+            self._original_frame = None
+            return self.__dict__[name]
+        if name == 'pupil':
+            self.pupil = self._detect_pupil()
+            return self.pupil
+        raise AttributeError(name)
 
     @staticmethod
     def _middle_point(p1, p2):
@@ -46,13 +77,6 @@ class Eye(object):
         region = region.astype(np.int32)
         self.landmark_points = region
 
-        # Applying a mask to get only the eye
-        height, width = frame.shape[:2]
-        black_frame = np.zeros((height, width), np.uint8)
-        mask = np.full((height, width), 255, np.uint8)
-        cv2.fillPoly(mask, [region], (0, 0, 0))
-        eye = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
-
         # Cropping on the eye
         margin = 5
         min_x = np.min(region[:, 0]) - margin
@@ -60,12 +84,32 @@ class Eye(object):
         min_y = np.min(region[:, 1]) - margin
         max_y = np.max(region[:, 1]) + margin
 
-        self.frame = eye[min_y:max_y, min_x:max_x]
+        if min_x < 0 or min_y < 0:
+            # Negative slice starts wrap around, only the full-frame mask reproduces that crop
+            self.frame = self._isolate_full_frame(frame, region)[min_y:max_y, min_x:max_x]
+        else:
+            # Applying a mask to get only the eye, within the crop only
+            roi = frame[min_y:max_y, min_x:max_x]
+            eye = roi.copy()
+            if eye.size:
+                mask = np.zeros(roi.shape[:2], np.uint8)
+                cv2.fillPoly(mask, [region], 255, offset=(-int(min_x), -int(min_y)))
+                eye[mask == 0] = 255
+            self.frame = eye
         self.origin = (min_x, min_y)
 
         height, width = self.frame.shape[:2]
         self.center = (width / 2, height / 2)
 
+    @staticmethod
+    def _isolate_full_frame(frame, region):
+        """Returns the whole frame with everything outside the eye region set to white"""
+        height, width = frame.shape[:2]
+        black_frame = np.zeros((height, width), np.uint8)
+        mask = np.full((height, width), 255, np.uint8)
+        cv2.fillPoly(mask, [region], (0, 0, 0))
+        return cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
+
     def _blinking_ratio(self, landmarks, points):
         """Calculates a ratio that can indicate whether an eye is closed or not.
         It's the division of the width of the eye, by its height.
@@ -92,28 +136,10 @@ class Eye(object):
 
         return ratio
 
-    def _analyze(self, original_frame, landmarks, side, calibration):
-        """Detects and isolates the eye in a new frame, sends data to the calibration
-        and initializes Pupil object.
-
-        Arguments:
-            original_frame (numpy.ndarray): Frame passed by the user
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
-            side: Indicates whether it's the left eye (0) or the right eye (1)
-            calibration (calibration.Calibration): Manages the binarization threshold value
-        """
-        if side == 0:
-            points = self.LEFT_EYE_POINTS
-        elif side == 1:
-            points = self.RIGHT_EYE_POINTS
-        else:
-            return
-
-        self.blinking = self._blinking_ratio(landmarks, points)
-        self._isolate(original_frame, landmarks, points)
-
-        if not calibration.is_complete():
-            calibration.evaluate(self.frame, side)
+    def _detect_pupil(self):
+        """Sends the isolated eye to the calibration and initializes the Pupil object"""
+        if not self._calibration.is_complete():
+            self._calibration.evaluate(self.frame, self._side)
 
-        threshold = calibration.threshold(side)
-        self.pupil = Pupil(self.frame, threshold)
+        threshold = self._calibration.threshold(self._side)
+        return Pupil(self.frame, threshold)
@@ -1,9 +1,11 @@
 from __future__ import division
-import os
 import cv2
 import dlib
-from .eye import Eye
+import numpy as np
 from .calibration import Calibration
+from .prefilter import FacelessFilter
+from .result import GazeResult
+from . import models
 
 
 class GazeTracking(object):
@@ -13,45 +15,233 @@ class GazeTracking(object):
     and pupils and allows to know if the eyes are open or closed
     """
 
-    def __init__(self):
+    def __init__(self, detection_interval=10, detection_scale=0.5, roi_padding=0.5, min_landmark_quality=0.5,
+                 prefilter=True):
+        """
+        Arguments:
+            detection_interval (int): Frames the face is followed through its landmarks
+                before the detector runs again; 0 detects on the full frame every time
+            detection_scale (float): Scale of the frame used when there is no usable ROI
+            roi_padding (float): Margin around the last face, in face widths, searched on re-detection
+            min_landmark_quality (float): Landmark quality below which tracking gives up
+                and the full frame is searched
+            prefilter (bool): Skip the detector on dark or featureless frames (see FacelessFilter)
+        """
         self.frame = None
-        self.eye_left = None
-        self.eye_right = None
         self.calibration = Calibration()
+        # Quantities of the last refreshed frame, computed lazily
+        self.result = GazeResult(None, None, self.calibration)
+
+        self.detection_interval = detection_interval
+        self.detection_scale = detection_scale
+        self.roi_padding = roi_padding
+        self.min_landmark_quality = min_landmark_quality
+        # Face followed between frames; swap it (like calibration) to track several people
+        self.tracking_state = None
+        self.detection_mode = None
+        self.landmark_quality = None
+        self.prefilter = FacelessFilter() if prefilter else None
+        # 'dark' or 'flat' when the prefilter rejected the last frame
+        self.no_face_reason = None
+
+        # _predictor is used to get facial landmarks of a given face,
+        # loaded once per process and shared by every tracker
+        self._predictor = models.shape_predictor()
+
+    @property
+    def _face_detector(self):
+        """Face detector of the calling thread (trackers may move between threads)"""
+        return models.face_detector()
 
-        # _face_detector is used to detect faces
-        self._face_detector = dlib.get_frontal_face_detector()
+    @property
+    def eye_left(self):
+        return self.result.eye_left
 
-        # _predictor is used to get facial landmarks of a given face
-        cwd = os.path.abspath(os.path.dirname(__file__))
-        model_path = os.path.abspath(os.path.join(cwd, "trained_models/shape_predictor_68_face_landmarks.dat"))
-        self._predictor = dlib.shape_predictor(model_path)
+    @property
+    def eye_right(self):
+        return self.result.eye_right
 
     @property
     def pupils_located(self):
         """Check that the pupils have been located"""
-        try:
-            int(self.eye_left.pupil.x)
-            int(self.eye_left.pupil.y)
-            int(self.eye_right.pupil.x)
-            int(self.eye_right.pupil.y)
-            return True
-        except Exception:
-            return False
+        return self.result.pupils_located
 
-    def _analyze(self):
-        """Detects the face and initialize Eye objects"""
-        frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
-        faces = self._face_detector(frame)
+    @property
+    def face(self):
+        """Rectangle of the face analyzed last, None when no face was found"""
+        if self.tracking_state is not None:
+            return self.tracking_state['face']
+
+    @staticmethod
+    def _landmark_geometry(landmarks):
+        """Center (x, y) and width of the 68 landmarks"""
+        points = np.array([(landmarks.part(i).x, landmarks.part(i).y) for i in range(landmarks.num_parts)])
+        min_x, min_y = points.min(axis=0)
+        max_x, max_y = points.max(axis=0)
+        return ((min_x + max_x) / 2.0, (min_y + max_y) / 2.0), float(max_x - min_x)
+
+    @staticmethod
+    def _landmark_quality(face, center, span, expected_offset, expected_ratio):
+        """Between 0.0 and 1.0, how well the landmarks still sit on the face box.
+        A shape predictor run on a box that lost the face returns a shrunken
+        or off-center shape, which this catches.
+        """
+        width = float(max(1, face.width()))
+        ratio = span / width
+        offset_x = (face.left() + face.width() / 2.0 - center[0]) / width - expected_offset[0]
+        offset_y = (face.top() + face.height() / 2.0 - center[1]) / width - expected_offset[1]
+        size_score = 1.0 - min(1.0, abs(ratio - expected_ratio) / (0.5 * expected_ratio))
+        center_score = 1.0 - min(1.0, np.hypot(offset_x, offset_y) / 0.3)
+        return size_score * center_score
+
+    def _detect(self, frame, scale=1.0, roi=None):
+        """Runs the face detector on the whole frame, a downscaled copy or an ROI.
+        Returns the face closest to the tracked one (the first one otherwise) in
+        frame coordinates, or None.
+        """
+        offset_x, offset_y = 0, 0
+        image = frame
+        if roi is not None:
+            offset_x, offset_y, right, bottom = roi
+            image = np.ascontiguousarray(frame[offset_y:bottom, offset_x:right])
+        if scale != 1.0:
+            image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+
+        faces = self._face_detector(image)
+        if len(faces) == 0:
+            return None
+
+        faces = [dlib.rectangle(int(f.left() / scale) + offset_x, int(f.top() / scale) + offset_y,
+                                int(f.right() / scale) + offset_x, int(f.bottom() / scale) + offset_y)
+                 for f in faces]
+        if self.face is None or len(faces) == 1:
+            return faces[0]
+        last_center = self.face.center()
+        return min(faces, key=lambda f: (f.center().x - last_center.x) ** 2 + (f.center().y - last_center.y) ** 2)
+
+    def _padded_roi(self, frame, face):
+        height, width = frame.shape[:2]
+        margin = int(self.roi_padding * face.width())
+        left = max(0, face.left() - margin)
+        top = max(0, face.top() - margin)
+        right = min(width, face.right() + margin)
+        bottom = min(height, face.bottom() + margin)
+        if right - left < 40 or bottom - top < 40:
+            return None
+        return (left, top, right, bottom)
+
+    def _locate_face(self, frame):
+        """Finds the face for this frame, reusing the tracked box when possible.
+        Returns (face, landmarks) or (None, None) and sets detection_mode.
+        """
+        state = self.tracking_state
+
+        self.no_face_reason = self.prefilter.check(frame) if self.prefilter is not None else None
+        if self.no_face_reason is not None:
+            # Nothing to detect or track, and the face may be elsewhere when the picture comes back
+            self.detection_mode = 'prefiltered'
+            self.tracking_state = None
+            self.landmark_quality = None
+            return None, None
+
+        if self.detection_interval <= 0:
+            self.detection_mode = 'full'
+            return self._fit(frame, self._detect(frame))
+
+        if state is not None and state['frames_since_detection'] < self.detection_interval:
+            # Follow the face through its landmarks, no detector at all
+            face = state['face']
+            landmarks = self._predictor(frame, face)
+            center, span = self._landmark_geometry(landmarks)
+            quality = self._landmark_quality(face, center, span, state['offset'], state['ratio'])
+            if quality >= self.min_landmark_quality:
+                self.detection_mode = 'tracked'
+                self.landmark_quality = quality
+                # Move the box with the landmarks for the next frame
+                shift_x = center[0] - state['center'][0]
+                shift_y = center[1] - state['center'][1]
+                scale = span / state['span'] if state['span'] else 1.0
+                half_w = face.width() * scale / 2.0
+                half_h = face.height() * scale / 2.0
+                box_x = face.left() + face.width() / 2.0 + shift_x
+                box_y = face.top() + face.height() / 2.0 + shift_y
+                state['face'] = dlib.rectangle(int(box_x - half_w), int(box_y - half_h),
+                                               int(box_x + half_w), int(box_y + half_h))
+                state['center'] = center
+                state['span'] = span
+                state['frames_since_detection'] += 1
+                return face, landmarks
 
-        try:
-            landmarks = self._predictor(frame, faces[0])
-            self.eye_left = Eye(frame, landmarks, 0, self.calibration)
-            self.eye_right = Eye(frame, landmarks, 1, self.calibration)
+            # Landmarks drifted off the face: search everywhere
+            self.detection_mode = 'full'
+            return self._fit(frame, self._detect(frame))
 
-        except IndexError:
-            self.eye_left = None
-            self.eye_right = None
+        face = None
+        roi = self._padded_roi(frame, state['face']) if state is not None else None
+        if roi is not None:
+            self.detection_mode = 'roi'
+            face = self._detect(frame, roi=roi)
+        if face is None and self.detection_scale != 1.0:
+            self.detection_mode = 'downscaled'
+            face = self._detect(frame, scale=self.detection_scale)
+        if face is None:
+            self.detection_mode = 'full'
+            face = self._detect(frame)
+        return self._fit(frame, face)
+
+    def _fit(self, frame, face):
+        """Runs the predictor on a freshly detected face and restarts tracking from it"""
+        if face is None:
+            self.tracking_state = None
+            self.landmark_quality = None
+            return None, None
+
+        landmarks = self._predictor(frame, face)
+        center, span = self._landmark_geometry(landmarks)
+        width = float(max(1, face.width()))
+        self.tracking_state = {
+            'face': face,
+            'center': center,
+            'span': span,
+            # Where the landmarks sit in a detector box, the reference for the quality check
+            'offset': ((face.left() + face.width() / 2.0 - center[0]) / width,
+                       (face.top() + face.height() / 2.0 - center[1]) / width),
+            'ratio': span / width,
+            'frames_since_detection': 0
+        }
+        self.landmark_quality = 1.0
+        return face, landmarks
+
+    def locate(self, frame):
+        """First half of refresh(): finds the face and its landmarks, leaves the eyes alone.
+
+        Arguments:
+            frame (numpy.ndarray): The BGR frame to analyze
+
+        Returns:
+            (grayscale frame, landmarks), landmarks being None when no face was found
+        """
+        self.frame = frame
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        face, landmarks = self._locate_face(gray)
+        return gray, landmarks
+
+    def refresh_landmarks(self, frame, gray, landmarks):
+        """Second half of refresh(): prepares the result of a frame located with
+        locate(), possibly by another tracker.
+
+        Arguments:
+            frame (numpy.ndarray): The BGR frame
+            gray (numpy.ndarray): Its grayscale version returned by locate()
+            landmarks (dlib.full_object_detection): Landmarks returned by locate()
+        """
+        self.frame = frame
+        self.result = GazeResult(gray, landmarks, self.calibration)
+
+    def _analyze(self):
+        """Detects the face and prepares the result of the frame"""
+        gray, landmarks = self.locate(self.frame)
+        self.refresh_landmarks(self.frame, gray, landmarks)
 
     def refresh(self, frame):
         """Refreshes the frame and analyzes it.
@@ -64,58 +254,46 @@ class GazeTracking(object):
 
     def pupil_left_coords(self):
         """Returns the coordinates of the left pupil"""
-        if self.pupils_located:
-            x = self.eye_left.origin[0] + self.eye_left.pupil.x
-            y = self.eye_left.origin[1] + self.eye_left.pupil.y
-            return (x, y)
+        return self.result.pupil_left_coords
 
     def pupil_right_coords(self):
         """Returns the coordinates of the right pupil"""
-        if self.pupils_located:
-            x = self.eye_right.origin[0] + self.eye_right.pupil.x
-            y = self.eye_right.origin[1] + self.eye_right.pupil.y
-            return (x, y)
+        return self.result.pupil_right_coords
 
     def horizontal_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
         horizontal direction of the gaze. The extreme right is 0.0,
         the center is 0.5 and the extreme left is 1.0
         """
-        if self.pupils_located:
-            pupil_left = self.eye_left.pupil.x / (self.eye_left.center[0] * 2 - 10)
-            pupil_right = self.eye_right.pupil.x / (self.eye_right.center[0] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+        return self.result.horizontal_ratio
 
     def vertical_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
         vertical direction of the gaze. The extreme top is 0.0,
         the center is 0.5 and the extreme bottom is 1.0
         """
-        if self.pupils_located:
-            pupil_left = self.eye_left.pupil.y / (self.eye_left.center[1] * 2 - 10)
-            pupil_right = self.eye_right.pupil.y / (self.eye_right.center[1] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+        return self.result.vertical_ratio
+
+    def blinking_ratio(self):
+        """Returns the average width/height ratio of the eyes, without locating the pupils
+        (None when an eye has no height)"""
+        return self.result.blinking_ratio
 
     def is_right(self):
         """Returns true if the user is looking to the right"""
-        if self.pupils_located:
-            return self.horizontal_ratio() <= 0.35
+        return self.result.is_right
 
     def is_left(self):
         """Returns true if the user is looking to the left"""
-        if self.pupils_located:
-            return self.horizontal_ratio() >= 0.65
+        return self.result.is_left
 
     def is_center(self):
         """Returns true if the user is looking to the center"""
-        if self.pupils_located:
-            return self.is_right() is not True and self.is_left() is not True
+        return self.result.is_center
 
     def is_blinking(self):
         """Returns true if the user closes his eyes"""
-        if self.pupils_located:
-            blinking_ratio = (self.eye_left.blinking + self.eye_right.blinking) / 2
-            return blinking_ratio > 3.8
+        return self.result.is_blinking
 
     def annotated_frame(self):
         """Returns the main frame with pupils highlighted"""
@@ -0,0 +1,50 @@
+import os
+import threading
+import dlib
+
+DEFAULT_PREDICTOR_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "trained_models/shape_predictor_68_face_landmarks.dat"))
+
+_lock = threading.Lock()
+_predictors = {}
+_detectors = threading.local()
+
+
+def shape_predictor(model_path=DEFAULT_PREDICTOR_PATH):
+    """Returns the process-wide landmark predictor, loading it on first use.
+
+    The 68-point model is ~100 MB and only read during prediction, so one
+    instance is shared by every GazeTracking of the process and may be
+    called from several threads at once.
+
+    Arguments:
+        model_path (str): Path of the .dat model
+    """
+    predictor = _predictors.get(model_path)
+    if predictor is None:
+        with _lock:
+            predictor = _predictors.get(model_path)
+            if predictor is None:
+                predictor = dlib.shape_predictor(model_path)
+                _predictors[model_path] = predictor
+    return predictor
+
+
+def face_detector():
+    """Returns the HOG face detector of the calling thread.
+
+    dlib's object detector keeps scratch buffers inside the instance, so it
+    is not shared between threads. It is small and quick to build, so each
+    thread gets its own on first use.
+    """
+    detector = getattr(_detectors, "detector", None)
+    if detector is None:
+        detector = dlib.get_frontal_face_detector()
+        _detectors.detector = detector
+    return detector
+
+
+def loaded_predictors():
+    """Paths of the predictors loaded in this process"""
+    with _lock:
+        return list(_predictors)
@@ -0,0 +1,43 @@
+import cv2
+
+
+class FacelessFilter(object):
+    """
+    Rejects frames no face detector could find a face in, before the
+    detector runs: frames where nothing is lit (lights off, lens covered
+    completely) and frames with next to no contrast anywhere (lens taped
+    over or pressed against something). Both are judged on a 32x24
+    thumbnail, about 0.1 ms for a 720p frame.
+
+    The limits are far below what a face needs; a dim face lit by a
+    screen still passes. See benchmarks/bench_no_face_prefilter.py for
+    the false-reject rate on recorded footage.
+    """
+
+    THUMBNAIL_SIZE = (32, 24)
+
+    def __init__(self, dark_level=12, flat_contrast=3.0):
+        """
+        Arguments:
+            dark_level (int): Frames whose brightest thumbnail pixel is below this are 'dark'
+            flat_contrast (float): Frames whose thumbnail standard deviation is below this are 'flat'
+        """
+        self.dark_level = dark_level
+        self.flat_contrast = flat_contrast
+
+    def check(self, gray):
+        """Returns 'dark' or 'flat' when the frame cannot hold a face, None otherwise
+
+        Arguments:
+            gray (numpy.ndarray): Grayscale frame
+        """
+        # Averaging every pixel of an HD frame costs ~10x more than a strided view of it
+        step = max(1, gray.shape[1] // (self.THUMBNAIL_SIZE[0] * 8))
+        thumbnail = cv2.resize(gray[::step, ::step], self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        _, brightest, _, _ = cv2.minMaxLoc(thumbnail)
+        if brightest < self.dark_level:
+            return 'dark'
+        _, stddev = cv2.meanStdDev(thumbnail)
+        if stddev[0][0] < self.flat_contrast:
+            return 'flat'
+        return None
@@ -27,11 +27,22 @@ class Pupil(object):
         Returns:
             A frame with a single element representing the iris
         """
+        new_frame = Pupil.smooth(eye_frame)
+        new_frame = cv2.threshold(new_frame, threshold, 255, cv2.THRESH_BINARY)[1]
+
+        return new_frame
+
+    @staticmethod
+    def smooth(eye_frame):
+        """Denoises and erodes the eye frame, the threshold-independent part
+        of image_processing()
+
+        Arguments:
+            eye_frame (numpy.ndarray): Frame containing an eye and nothing else
+        """
         kernel = np.ones((3, 3), np.uint8)
         new_frame = cv2.bilateralFilter(eye_frame, 10, 15, 15)
         new_frame = cv2.erode(new_frame, kernel, iterations=3)
-        new_frame = cv2.threshold(new_frame, threshold, 255, cv2.THRESH_BINARY)[1]
-
         return new_frame
 
     def detect_iris(self, eye_frame):
@@ -0,0 +1,119 @@
+from __future__ import division
+from .eye import Eye
+
+
+class lazy_property(object):
+    """Computes a property once per instance, on first access"""
+
+    def __init__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.function(instance)
+        instance.__dict__[self.function.__name__] = value
+        return value
+
+
+class GazeResult(object):
+    """
+    Everything derived from one refreshed frame. Each quantity is computed
+    at most once and only when asked for: a caller that only needs the
+    blinking ratio never isolates the eyes or binarizes the pupils.
+    """
+
+    def __init__(self, frame, landmarks, calibration):
+        """
+        Arguments:
+            frame (numpy.ndarray): Grayscale frame that was analyzed
+            landmarks (dlib.full_object_detection): Facial landmarks, None when no face was found
+            calibration (calibration.Calibration): Manages the binarization threshold value
+        """
+        self.landmarks = landmarks
+        if landmarks is None:
+            self.eye_left = None
+            self.eye_right = None
+        else:
+            self.eye_left = Eye(frame, landmarks, 0, calibration)
+            self.eye_right = Eye(frame, landmarks, 1, calibration)
+
+    @lazy_property
+    def pupils_located(self):
+        """Check that the pupils have been located"""
+        try:
+            # Both eyes are evaluated, so calibration sees every frame for both sides
+            pupil_left = self.eye_left.pupil
+            pupil_right = self.eye_right.pupil
+            int(pupil_left.x)
+            int(pupil_left.y)
+            int(pupil_right.x)
+            int(pupil_right.y)
+            return True
+        except Exception:
+            return False
+
+    @lazy_property
+    def pupil_left_coords(self):
+        """Coordinates of the left pupil in the frame"""
+        if self.pupils_located:
+            x = self.eye_left.origin[0] + self.eye_left.pupil.x
+            y = self.eye_left.origin[1] + self.eye_left.pupil.y
+            return (x, y)
+
+    @lazy_property
+    def pupil_right_coords(self):
+        """Coordinates of the right pupil in the frame"""
+        if self.pupils_located:
+            x = self.eye_right.origin[0] + self.eye_right.pupil.x
+            y = self.eye_right.origin[1] + self.eye_right.pupil.y
+            return (x, y)
+
+    @lazy_property
+    def horizontal_ratio(self):
+        """Between 0.0 (extreme right) and 1.0 (extreme left), 0.5 is the center"""
+        if self.pupils_located:
+            pupil_left = self.eye_left.pupil.x / (self.eye_left.center[0] * 2 - 10)
+            pupil_right = self.eye_right.pupil.x / (self.eye_right.center[0] * 2 - 10)
+            return (pupil_left + pupil_right) / 2
+
+    @lazy_property
+    def vertical_ratio(self):
+        """Between 0.0 (extreme top) and 1.0 (extreme bottom), 0.5 is the center"""
+        if self.pupils_located:
+            pupil_left = self.eye_left.pupil.y / (self.eye_left.center[1] * 2 - 10)
+            pupil_right = self.eye_right.pupil.y / (self.eye_right.center[1] * 2 - 10)
+            return (pupil_left + pupil_right) / 2
+
+    @lazy_property
+    def blinking_ratio(self):
+        """Average width/height ratio of both eyes, needs the landmarks only
+
+        None when an eye's landmarks have no height, where the ratio is undefined
+        """
+        if self.landmarks is not None:
+            if self.eye_left.blinking is None or self.eye_right.blinking is None:
+                return None
+            return (self.eye_left.blinking + self.eye_right.blinking) / 2
+
+    @lazy_property
+    def is_right(self):
+        if self.pupils_located:
+            return self.horizontal_ratio <= 0.35
+
+    @lazy_property
+    def is_left(self):
+        if self.pupils_located:
+            return self.horizontal_ratio >= 0.65
+
+    @lazy_property
+    def is_center(self):
+        if self.pupils_located:
+            return self.is_right is not True and self.is_left is not True
+
+    @lazy_property
+    def is_blinking(self):
+        # None (unknown) rather than a guess when the blinking ratio is undefined
+        if self.pupils_located and self.blinking_ratio is not None:
+            return self.blinking_ratio > 3.8
@@ -17,12 +17,20 @@ import cv2
 import face_recognition
 import os
 import glob
+import hashlib
+import multiprocessing
 import numpy as np
 from multiprocessing.dummy import Pool
 import time
 import json
+import threading
+import argparse
+from collections import deque
 from datetime import datetime
 
+from face_profiles import get_profile, locate_faces, encode_faces
+from detection_log import DetectionLogWriter
+
 # Try to import Windows voice interface
 try:
     import win32com.client as wincl
@@ -44,13 +52,503 @@ MIN_CONFIDENCE_FOR_ANNOUNCEMENT = 0.55  # Minimum confidence to announce someone
 
 DETECTION_COOLDOWN = 3  # seconds
 
+# Encoding profiles (see face_profiles.py): spend CPU on the reference photos,
+# keep the per-frame work cheap. Frames are detected at quarter scale.
+ENROLLMENT_PROFILE = get_profile('accurate')
+RECOGNITION_PROFILE = get_profile('fast', detection_scale=0.25)
+
+# Reference encodings are cached between runs so only new or changed photos are re-encoded
+ENCODING_CACHE_FILE = "face_encoding_cache.npz"
+LOAD_PROCESSES = os.cpu_count() or 1
+
+# Pipelined camera loop: minimum time between two recognitions of the worker
+PIPELINE_RECOGNITION_INTERVAL = 0.2  # seconds
+
+# Headless mode: frames each source may have waiting for the recognition pool
+HEADLESS_QUEUE_SIZE = 4
+
+
+def _encode_reference_image(image_path):
+    """Encode one reference photo (runs in a worker process of load_database)"""
+    try:
+        image = face_recognition.load_image_file(image_path)
+        _, face_encodings = encode_faces(image, ENROLLMENT_PROFILE)
+        encoding = face_encodings[0] if face_encodings else None
+        return image_path, encoding, len(face_encodings), None
+    except Exception as e:
+        return image_path, None, 0, str(e)
+
+
+def _file_sha1(path):
+    """Content hash of a file, used to recognize photos that were only touched"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def match_faces(face_encodings, face_locations, known_encodings, known_names, verbose=True):
+    """Match face encodings against the known faces, returns the face_info list"""
+    face_info = []
+    
+    for face_encoding, face_location in zip(face_encodings, face_locations):
+        top, right, bottom, left = face_location
+        
+        name = "Unknown"
+        confidence = 0
+        distance = float('inf')
+        
+        if len(known_encodings) > 0:
+            # Calculate distances to all known faces
+            face_distances = face_recognition.face_distance(known_encodings, face_encoding)
+            best_match_index = np.argmin(face_distances)
+            best_distance = face_distances[best_match_index]
+            confidence = 1 - best_distance
+            distance = best_distance
+            
+            # Multi-level confidence thresholds for better accuracy
+            if best_distance <= 0.4:  # Very confident match
+                name = known_names[best_match_index]
+                message = f"🎯 Strong match: {name} (confidence: {confidence:.3f}, distance: {distance:.3f})"
+            elif best_distance <= 0.5:  # Moderate confidence
+                name = known_names[best_match_index]
+                message = f"🎯 Good match: {name} (confidence: {confidence:.3f}, distance: {distance:.3f})"
+            elif best_distance <= RECOGNITION_THRESHOLD:  # Weak but acceptable
+                name = known_names[best_match_index]
+                message = f"⚠️ Weak match: {name} (confidence: {confidence:.3f}, distance: {distance:.3f})"
+            else:  # Too uncertain - mark as unknown
+                closest_name = known_names[best_match_index]
+                message = f"❌ Unknown person (closest to {closest_name}, confidence: {confidence:.3f}, distance: {distance:.3f})"
+                name = "Unknown"
+                confidence = 0
+            if verbose:
+                print(message)
+        
+        face_info.append({
+            'name': name,
+            'confidence': confidence,
+            'distance': distance,
+            'location': (left, top, right, bottom)
+        })
+    
+    return face_info
+
+
+# Known faces of a headless recognition worker process
+_worker_known_faces = {}
+
+
+def _init_recognition_worker(known_encodings, known_names):
+    _worker_known_faces['encodings'] = known_encodings
+    _worker_known_faces['names'] = known_names
+
+
+def _recognize_frame_task(task):
+    """Recognize one headless frame (runs in a worker process of HeadlessVideoProcessor)"""
+    source_index, sequence, frame_index, timestamp_ms, frame = task
+    try:
+        rgb_frame = np.ascontiguousarray(frame[:, :, ::-1])  # BGR to RGB
+        face_locations, face_encodings = encode_faces(rgb_frame, RECOGNITION_PROFILE)
+        face_info = match_faces(face_encodings, face_locations,
+                                _worker_known_faces['encodings'], _worker_known_faces['names'],
+                                verbose=False)
+    except Exception as e:
+        print(f"⚠️ Recognition failed on frame {frame_index}: {e}")
+        face_info = None
+    return source_index, sequence, frame_index, timestamp_ms, face_info
+
+
+class LatestFrameSlot:
+    """Single-frame hand-off between threads: writers overwrite, readers always get the newest frame"""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._frame_id = 0
+        self._closed = False
+    
+    def put(self, frame):
+        with self._condition:
+            self._frame = frame
+            self._frame_id += 1
+            self._condition.notify_all()
+            return self._frame_id
+    
+    def get(self, after_id=0, timeout=1.0):
+        """Wait for a frame newer than after_id; returns (frame_id, frame) or (after_id, None)"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame_id > after_id or self._closed, timeout=timeout)
+            if self._frame_id > after_id:
+                return self._frame_id, self._frame
+            return after_id, None
+    
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class FaceBoxTracker:
+    """Moves face boxes between recognition results using sparse optical flow"""
+    
+    def __init__(self, scale=0.5, max_points=40, min_points=6):
+        self.scale = scale
+        self.max_points = max_points
+        self.min_points = min_points
+        self.prev_gray = None
+        self.tracks = []  # [(face_info entry, feature points)]
+    
+    def _gray(self, frame):
+        small = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    
+    def reset(self, frame, face_info):
+        """Start tracking the faces of a recognition result on the frame it was computed from"""
+        gray = self._gray(frame)
+        self.tracks = []
+        for face in face_info:
+            left, top, right, bottom = [int(v * self.scale) for v in face['location']]
+            mask = np.zeros_like(gray)
+            mask[max(0, top):max(0, bottom), max(0, left):max(0, right)] = 255
+            points = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 3, mask=mask)
+            self.tracks.append((dict(face), points))
+        self.prev_gray = gray
+    
+    def update(self, frame):
+        """Shift every tracked box by the median motion of its points, returns the current face_info"""
+        if self.prev_gray is None:
+            return []
+        gray = self._gray(frame)
+        
+        tracks = []
+        for face, points in self.tracks:
+            if points is not None and len(points) >= self.min_points:
+                next_points, status, _ = cv2.calcOpticalFlowPyrLK(
+                    self.prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+                good = status.reshape(-1) == 1
+                if good.sum() >= self.min_points:
+                    dx, dy = np.median(next_points[good] - points[good], axis=0).reshape(-1) / self.scale
+                    left, top, right, bottom = face['location']
+                    face['location'] = (int(round(left + dx)), int(round(top + dy)),
+                                        int(round(right + dx)), int(round(bottom + dy)))
+                    points = next_points[good].reshape(-1, 1, 2)
+                else:
+                    points = None
+            # Boxes that lost their points stay where they were until the next recognition
+            tracks.append((face, points))
+        
+        self.tracks = tracks
+        self.prev_gray = gray
+        return [face for face, _ in tracks]
+
+
+class FrameSkipPolicy:
+    """Decides which decoded frames of a source are sent to recognition"""
+    
+    def __init__(self, every=5, max_fps=None):
+        """
+        every: recognize every Nth decoded frame
+        max_fps: additionally cap recognized frames per second of video time
+        """
+        self.every = max(1, int(every))
+        self.min_interval_ms = 1000.0 / max_fps if max_fps else 0.0
+    
+    def new_state(self):
+        return {'last_ms': None}
+    
+    def should_process(self, state, frame_index, timestamp_ms):
+        if frame_index % self.every != 0:
+            return False
+        if self.min_interval_ms and state['last_ms'] is not None \
+                and timestamp_ms - state['last_ms'] < self.min_interval_ms:
+            return False
+        state['last_ms'] = timestamp_ms
+        return True
+
+
+class VideoSource:
+    """One headless input: decode thread, pending frames and the JSONL writer"""
+    
+    def __init__(self, index, source, output_dir, queue_size):
+        self.index = index
+        self.source = source
+        # Files are read as fast as recognition keeps up; live feeds drop their oldest frame instead
+        self.live = not os.path.isfile(source)
+        self.name = self._output_name(source, index)
+        self.output_path = os.path.join(output_dir, f"{self.name}.jsonl")
+        self.queue_size = queue_size
+        
+        self.frames = deque()
+        self.decoding = True
+        self.next_sequence = 0
+        self.next_to_write = 0
+        self.reorder = {}  # sequence -> result, until the results before it are written
+        self.writer = None
+        
+        self.decoded = 0
+        self.submitted = 0
+        self.recognized = 0
+        self.failed = 0
+        self.dropped = 0
+        self.faces = 0
+        self.identities = {}
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+    
+    @staticmethod
+    def _output_name(source, index):
+        base = os.path.splitext(os.path.basename(source.rstrip('/')))[0] or "source"
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in base)
+        return f"{index:02d}_{safe}"
+    
+    def open_capture(self):
+        return cv2.VideoCapture(int(self.source) if self.source.isdigit() else self.source)
+    
+    def summary(self, wall_seconds):
+        elapsed = (self.finished_at or time.time()) - (self.started_at or time.time())
+        return {
+            'source': self.source,
+            'output': self.output_path,
+            'live': self.live,
+            'frames_decoded': self.decoded,
+            'frames_recognized': self.recognized,
+            'frames_failed': self.failed,
+            'frames_dropped': self.dropped,
+            'faces': self.faces,
+            'identities': self.identities,
+            'decode_fps': round(self.decoded / elapsed, 2) if elapsed > 0 else 0,
+            'recognized_fps': round(self.recognized / wall_seconds, 2) if wall_seconds > 0 else 0,
+            'error': self.error
+        }
+
+
+class HeadlessVideoProcessor:
+    """Recognizes faces in several video files or streams without a display.
+    
+    Every source is decoded on its own thread. A scheduler hands frames to a
+    shared pool of recognition processes in round-robin order over the
+    sources, so a fast-decoding file cannot starve a live feed, and results
+    are written per source as JSON Lines in frame order.
+    """
+    
+    def __init__(self, known_encodings, known_names, sources, output_dir="headless_output",
+                 workers=None, skip_policy=None, queue_size=HEADLESS_QUEUE_SIZE):
+        self.known_encodings = known_encodings
+        self.known_names = known_names
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.skip_policy = skip_policy or FrameSkipPolicy()
+        self.sources = [VideoSource(i, source, output_dir, queue_size) for i, source in enumerate(sources)]
+        
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._stop = threading.Event()
+    
+    def _decode(self, video_source):
+        """Decode thread: reads frames, applies the skip policy and queues the kept ones"""
+        capture = video_source.open_capture()
+        video_source.started_at = time.time()
+        if not capture.isOpened():
+            video_source.error = "could not open source"
+            print(f"❌ Could not open {video_source.source}")
+        
+        policy_state = self.skip_policy.new_state()
+        frame_index = 0
+        try:
+            while capture.isOpened() and not self._stop.is_set():
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                timestamp_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+                if video_source.live or not timestamp_ms:
+                    timestamp_ms = (time.time() - video_source.started_at) * 1000.0
+                
+                with self._condition:
+                    video_source.decoded += 1
+                    if self.skip_policy.should_process(policy_state, frame_index, timestamp_ms):
+                        if not video_source.live:
+                            self._condition.wait_for(
+                                lambda: len(video_source.frames) < video_source.queue_size or self._stop.is_set())
+                        elif len(video_source.frames) >= video_source.queue_size:
+                            video_source.frames.popleft()
+                            video_source.dropped += 1
+                        video_source.frames.append((frame_index, timestamp_ms, frame))
+                        self._condition.notify_all()
+                frame_index += 1
+        finally:
+            capture.release()
+            with self._condition:
+                video_source.decoding = False
+                video_source.finished_at = time.time()
+                self._condition.notify_all()
+    
+    def _next_task(self, start):
+        """Round-robin pick of the next queued frame starting at source index start"""
+        for offset in range(len(self.sources)):
+            video_source = self.sources[(start + offset) % len(self.sources)]
+            if video_source.frames:
+                frame_index, timestamp_ms, frame = video_source.frames.popleft()
+                sequence = video_source.next_sequence
+                video_source.next_sequence += 1
+                video_source.submitted += 1
+                return video_source.index, (video_source.index, sequence, frame_index, timestamp_ms, frame)
+        return None, None
+    
+    def _finished(self):
+        return all(not s.decoding and not s.frames for s in self.sources) and self._in_flight == 0
+    
+    def _on_result(self, result):
+        source_index, sequence, frame_index, timestamp_ms, face_info = result
+        video_source = self.sources[source_index]
+        with self._condition:
+            video_source.reorder[sequence] = (frame_index, timestamp_ms, face_info)
+            self._write_ready(video_source)
+            self._in_flight -= 1
+            self._condition.notify_all()
+    
+    def _on_error(self, error):
+        # Only reached when a task could not be run at all; _skip_failed closes its gap at the end
+        print(f"⚠️ Recognition task failed: {error}")
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+    
+    def _write_ready(self, video_source):
+        """Write the results that are next in frame order (called with the condition held)"""
+        while video_source.next_to_write in video_source.reorder:
+            frame_index, timestamp_ms, face_info = video_source.reorder.pop(video_source.next_to_write)
+            video_source.next_to_write += 1
+            if face_info is None:
+                video_source.failed += 1
+                continue
+            video_source.recognized += 1
+            if not face_info:
+                continue
+            
+            faces = []
+            for face in face_info:
+                faces.append({
+                    'name': face['name'],
+                    'confidence': round(float(face['confidence']), 4),
+                    'distance': round(float(face['distance']), 4) if np.isfinite(face['distance']) else None,
+                    'location': [int(v) for v in face['location']]
+                })
+                video_source.faces += 1
+                if face['name'] != "Unknown":
+                    video_source.identities[face['name']] = video_source.identities.get(face['name'], 0) + 1
+            
+            video_source.writer.write(json.dumps({
+                'source': video_source.source,
+                'frame': frame_index,
+                'timestamp_ms': round(timestamp_ms, 1),
+                'faces': faces
+            }) + "\n")
+    
+    def _skip_failed(self, video_source):
+        # A failed task leaves a gap in the sequence; move past it once everything after it arrived
+        if video_source.reorder and video_source.next_to_write not in video_source.reorder:
+            video_source.next_to_write = min(video_source.reorder)
+            self._write_ready(video_source)
+    
+    def run(self):
+        """Process all sources to the end (or until Ctrl+C) and return the throughput summary"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        for video_source in self.sources:
+            video_source.writer = open(video_source.output_path, "w", encoding="utf-8")
+        
+        started = time.time()
+        decoders = [threading.Thread(target=self._decode, args=(s,), name=f"Decode-{s.index}", daemon=True)
+                    for s in self.sources]
+        for thread in decoders:
+            thread.start()
+        
+        print(f"🎞️ Processing {len(self.sources)} sources with {self.workers} recognition workers")
+        pool = multiprocessing.Pool(processes=self.workers, initializer=_init_recognition_worker,
+                                    initargs=(self.known_encodings, self.known_names))
+        next_source = 0
+        interrupted = False
+        try:
+            with self._condition:
+                while not self._finished():
+                    # Keep every worker busy plus one queued task each
+                    self._condition.wait_for(
+                        lambda: self._finished() or (self._in_flight < self.workers * 2
+                                                     and any(s.frames for s in self.sources)))
+                    if self._finished():
+                        break
+                    source_index, task = self._next_task(next_source)
+                    if task is None:
+                        continue
+                    next_source = source_index + 1
+                    self._in_flight += 1
+                    self._condition.notify_all()
+                    pool.apply_async(_recognize_frame_task, (task,),
+                                     callback=self._on_result, error_callback=self._on_error)
+        except KeyboardInterrupt:
+            print("\n👋 Headless processing interrupted by user")
+            interrupted = True
+            self._stop.set()
+            with self._condition:
+                self._condition.notify_all()
+        finally:
+            if interrupted:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+            for thread in decoders:
+                thread.join(timeout=5)
+            with self._condition:
+                for video_source in self.sources:
+                    self._skip_failed(video_source)
+                    video_source.writer.close()
+        
+        return self._summarize(time.time() - started)
+    
+    def _summarize(self, wall_seconds):
+        sources = [s.summary(wall_seconds) for s in self.sources]
+        recognized = sum(s['frames_recognized'] for s in sources)
+        summary = {
+            'wall_seconds': round(wall_seconds, 2),
+            'workers': self.workers,
+            'frame_skip': {'every': self.skip_policy.every,
+                           'max_fps': round(1000.0 / self.skip_policy.min_interval_ms, 2)
+                           if self.skip_policy.min_interval_ms else None},
+            'frames_decoded': sum(s['frames_decoded'] for s in sources),
+            'frames_recognized': recognized,
+            'frames_failed': sum(s['frames_failed'] for s in sources),
+            'frames_dropped': sum(s['frames_dropped'] for s in sources),
+            'recognized_fps': round(recognized / wall_seconds, 2) if wall_seconds > 0 else 0,
+            'sources': sources
+        }
+        
+        with open(os.path.join(self.output_dir, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        
+        print("\n📊 Headless summary")
+        print("=" * 60)
+        for s in sources:
+            status = f" ({s['error']})" if s['error'] else ""
+            print(f"{s['source']}{status}")
+            print(f"   decoded {s['frames_decoded']} ({s['decode_fps']} fps), "
+                  f"recognized {s['frames_recognized']} ({s['recognized_fps']} fps), "
+                  f"dropped {s['frames_dropped']}, faces {s['faces']}, "
+                  f"identities {len(s['identities'])} -> {s['output']}")
+        print(f"Total: {summary['frames_recognized']} frames recognized in {summary['wall_seconds']}s "
+              f"({summary['recognized_fps']} fps)")
+        return summary
+
+
 class FaceRecognitionSystem:
     def __init__(self):
         self.database = {}
-        self.known_encodings = []
+        self.known_encodings = np.empty((0, 128))
         self.known_names = []
         self.last_detection_time = 0
-        self.detection_log = []
+        self.detection_count = 0
+        self.detection_log = DetectionLogWriter()
         
     def load_database(self):
         """Load and encode all images from the images folder"""
@@ -71,6 +569,9 @@ class FaceRecognitionSystem:
             image_files.extend(glob.glob(f"images/{extension}"))
             image_files.extend(glob.glob(f"images/{extension.upper()}"))
         
+        # Case-insensitive file systems match both patterns for the same file
+        image_files = list({os.path.normcase(os.path.abspath(path)): path for path in image_files}.values())
+        
         if not image_files:
             print("⚠️ No images found in 'images' folder!")
             self._show_setup_instructions()
@@ -78,12 +579,24 @@ class FaceRecognitionSystem:
         
         print(f"📁 Found {len(image_files)} image files")
         
-        # Process each image
+        # Reuse cached encodings, encode the rest in parallel
+        entries = self._encode_images(image_files)
+        self._save_encoding_cache(entries)
+        
+        # Build the database in file order
+        encodings = []
         successful_loads = 0
         for image_path in image_files:
-            success = self._process_image(image_path)
-            if success:
-                successful_loads += 1
+            entry = entries[image_path]
+            if entry['encoding'] is None:
+                continue
+            name = os.path.splitext(os.path.basename(image_path))[0]
+            name = name.replace('_', ' ').replace('-', ' ').title()
+            self.database[name] = entry['encoding']
+            self.known_names.append(name)
+            encodings.append(entry['encoding'])
+            successful_loads += 1
+        self.known_encodings = np.array(encodings, dtype=np.float64).reshape(-1, 128)
         
         if successful_loads == 0:
             print("❌ No faces could be processed from the images!")
@@ -97,43 +610,90 @@ class FaceRecognitionSystem:
         self._save_database_info()
         return True
     
-    def _process_image(self, image_path):
-        """Process a single image and add to database"""
-        try:
-            # Get person's name from filename
-            name = os.path.splitext(os.path.basename(image_path))[0]
-            name = name.replace('_', ' ').replace('-', ' ').title()
-            
-            print(f"🔄 Processing {name}...")
-            
-            # Load image
-            image = face_recognition.load_image_file(image_path)
-            
-            # Find face encodings
-            face_locations = face_recognition.face_locations(image, model="hog")
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-            
-            if not face_encodings:
-                print(f"❌ No face found in {image_path}")
-                return False
-            
-            if len(face_encodings) > 1:
-                print(f"⚠️ Multiple faces found in {image_path}, using the first one")
-            
-            # Use the first (or only) face encoding
-            encoding = face_encodings[0]
+    def _encode_images(self, image_files):
+        """Return {path: cache entry} for every image, encoding only new or changed ones"""
+        cache = self._load_encoding_cache()
+        entries = {}
+        pending = {}
+        
+        for image_path in image_files:
+            stat = os.stat(image_path)
+            cached = cache.get(image_path)
+            if cached and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+                entries[image_path] = cached
+                continue
             
-            # Add to database
-            self.database[name] = encoding
-            self.known_encodings.append(encoding)
-            self.known_names.append(name)
+            # Touched but unchanged files keep their encoding
+            digest = _file_sha1(image_path)
+            if cached and cached['sha1'] == digest:
+                entries[image_path] = dict(cached, mtime=stat.st_mtime, size=stat.st_size)
+                continue
+            pending[image_path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': digest}
+        
+        print(f"♻️ {len(entries)} cached, {len(pending)} new or changed")
+        
+        if pending:
+            processes = max(1, min(LOAD_PROCESSES, len(pending)))
+            print(f"🔄 Encoding {len(pending)} images with {processes} processes...")
+            with multiprocessing.Pool(processes=processes) as pool:
+                results = pool.imap_unordered(_encode_reference_image, list(pending))
+                for image_path, encoding, face_count, error in results:
+                    entries[image_path] = dict(pending[image_path], encoding=encoding,
+                                               face_count=face_count, error=error)
+                    if error:
+                        print(f"❌ Error processing {image_path}: {error}")
+                    elif encoding is None:
+                        print(f"❌ No face found in {image_path}")
+                    else:
+                        if face_count > 1:
+                            print(f"⚠️ Multiple faces found in {image_path}, using the first one")
+                        print(f"✅ {os.path.basename(image_path)} encoded")
+        
+        failed = [path for path, entry in entries.items() if entry['encoding'] is None and path not in pending]
+        if failed:
+            print(f"⚠️ {len(failed)} unchanged images still have no usable face: {', '.join(failed)}")
+        return entries
+    
+    def _load_encoding_cache(self):
+        """Load cached encodings, or an empty cache if missing, unreadable or from another profile"""
+        if not os.path.exists(ENCODING_CACHE_FILE):
+            return {}
+        try:
+            with np.load(ENCODING_CACHE_FILE, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                encodings = data['encodings']
+            if meta.get('profile') != ENROLLMENT_PROFILE:
+                print("♻️ Enrollment profile changed, re-encoding all images")
+                return {}
             
-            print(f"✅ {name} added to database")
-            return True
+            cache = {}
+            for path, entry in meta['files'].items():
+                row = entry.pop('row')
+                entry['encoding'] = encodings[row] if row is not None else None
+                cache[path] = entry
+            return cache
+        except Exception as e:
+            print(f"⚠️ Could not read encoding cache, re-encoding all images: {e}")
+            return {}
+    
+    def _save_encoding_cache(self, entries):
+        """Store all encodings in one array plus per-file metadata"""
+        try:
+            files = {}
+            encodings = []
+            for path, entry in entries.items():
+                row = None
+                if entry['encoding'] is not None:
+                    row = len(encodings)
+                    encodings.append(entry['encoding'])
+                files[path] = {key: value for key, value in entry.items() if key != 'encoding'}
+                files[path]['row'] = row
             
+            meta = {'profile': ENROLLMENT_PROFILE, 'files': files}
+            np.savez(ENCODING_CACHE_FILE, meta=np.array(json.dumps(meta)),
+                     encodings=np.array(encodings, dtype=np.float64).reshape(-1, 128))
         except Exception as e:
-            print(f"❌ Error processing {image_path}: {e}")
-            return False
+            print(f"⚠️ Could not save encoding cache: {e}")
     
     def _show_setup_instructions(self):
         """Show setup instructions to user"""
@@ -176,7 +736,9 @@ class FaceRecognitionSystem:
                     "strong_match_threshold": STRONG_MATCH_THRESHOLD,
                     "weak_match_threshold": WEAK_MATCH_THRESHOLD,
                     "min_confidence_for_announcement": MIN_CONFIDENCE_FOR_ANNOUNCEMENT,
-                    "detection_cooldown": DETECTION_COOLDOWN
+                    "detection_cooldown": DETECTION_COOLDOWN,
+                    "enrollment_profile": ENROLLMENT_PROFILE,
+                    "recognition_profile": RECOGNITION_PROFILE
                 }
             }
             
@@ -188,60 +750,12 @@ class FaceRecognitionSystem:
     
     def recognize_faces_in_frame(self, frame):
         """Recognize faces in a video frame with improved unknown detection"""
-        # Resize frame for faster processing
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = small_frame[:, :, ::-1]  # BGR to RGB
-        
-        # Find face locations and encodings
-        face_locations = face_recognition.face_locations(rgb_small_frame, model="hog")
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-        
-        face_info = []
-        
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            # Scale back up face locations
-            top, right, bottom, left = face_location
-            top *= 4
-            right *= 4
-            bottom *= 4
-            left *= 4
-            
-            name = "Unknown"
-            confidence = 0
-            distance = float('inf')
-            
-            if len(self.known_encodings) > 0:
-                # Calculate distances to all known faces
-                face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances)
-                best_distance = face_distances[best_match_index]
-                confidence = 1 - best_distance
-                distance = best_distance
-                
-                # Multi-level confidence thresholds for better accuracy
-                if best_distance <= 0.4:  # Very confident match
-                    name = self.known_names[best_match_index]
-                    print(f"🎯 Strong match: {name} (confidence: {confidence:.3f}, distance: {distance:.3f})")
-                elif best_distance <= 0.5:  # Moderate confidence
-                    name = self.known_names[best_match_index]
-                    print(f"🎯 Good match: {name} (confidence: {confidence:.3f}, distance: {distance:.3f})")
-                elif best_distance <= RECOGNITION_THRESHOLD:  # Weak but acceptable
-                    name = self.known_names[best_match_index]
-                    print(f"⚠️ Weak match: {name} (confidence: {confidence:.3f}, distance: {distance:.3f})")
-                else:  # Too uncertain - mark as unknown
-                    closest_name = self.known_names[best_match_index]
-                    print(f"❌ Unknown person (closest to {closest_name}, confidence: {confidence:.3f}, distance: {distance:.3f})")
-                    name = "Unknown"
-                    confidence = 0
-            
-            face_info.append({
-                'name': name,
-                'confidence': confidence,
-                'distance': distance,
-                'location': (left, top, right, bottom)
-            })
+        rgb_frame = np.ascontiguousarray(frame[:, :, ::-1])  # BGR to RGB
         
-        return face_info
+        # Find face locations (detected at reduced scale) and encodings
+        face_locations, face_encodings = encode_faces(rgb_frame, RECOGNITION_PROFILE)
+        
+        return match_faces(face_encodings, face_locations, self.known_encodings, self.known_names)
     
     def draw_face_info(self, frame, face_info):
         """Draw face rectangles and names on frame with confidence indicators"""
@@ -332,57 +846,24 @@ class FaceRecognitionSystem:
             ready_to_detect_identity = True
     
     def _log_detection(self, names):
-        """Log detection to file"""
-        try:
-            detection_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "names": names,
-                "count": len(names)
-            }
-            
-            self.detection_log.append(detection_entry)
-            
-            # Save to file
-            log_filename = f"detections_{datetime.now().strftime('%Y%m%d')}.json"
-            
-            # Load existing log if it exists
-            existing_log = []
-            if os.path.exists(log_filename):
-                try:
-                    with open(log_filename, 'r') as f:
-                        existing_log = json.load(f)
-                except:
-                    existing_log = []
-            
-            # Append new detection
-            existing_log.append(detection_entry)
-            
-            # Save updated log
-            with open(log_filename, 'w') as f:
-                json.dump(existing_log, f, indent=2)
-                
-        except Exception as e:
-            print(f"⚠️ Could not log detection: {e}")
+        """Queue the detection for the background log writer"""
+        self.detection_count += 1
+        self.detection_log.log({
+            "timestamp": datetime.now().isoformat(),
+            "names": names,
+            "count": len(names)
+        })
     
     def run_camera_loop(self):
         """Main camera loop"""
-        global ready_to_detect_identity
-        
         print("🎥 Starting camera...")
         print("📹 Controls: ESC = Exit, R = Reset detection, S = Show stats")
         
         # Initialize camera
-        video_capture = cv2.VideoCapture(1)
-        
-        if not video_capture.isOpened():
-            print("❌ Error: Could not open camera")
+        video_capture = self._open_camera()
+        if video_capture is None:
             return
         
-        # Set camera properties for better performance
-        video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        video_capture.set(cv2.CAP_PROP_FPS, 30)
-        
         frame_count = 0
         fps_counter = time.time()
         fps_display = 0
@@ -407,20 +888,11 @@ class FaceRecognitionSystem:
                     face_info = self.recognize_faces_in_frame(frame)
                     
                     # Check for recognized faces with sufficient confidence
-                    recognized_names = [
-                        f['name'] for f in face_info 
-                        if f['name'] != "Unknown" and f['confidence'] >= MIN_CONFIDENCE_FOR_ANNOUNCEMENT
-                    ]
-                    
-                    if recognized_names:
-                        ready_to_detect_identity = False
-                        pool = Pool(processes=1)
-                        pool.apply_async(self.welcome_users, [recognized_names])
+                    self._announce(face_info)
                 else:
                     # Still detect faces for display, but don't process recognition
-                    small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                    rgb_small_frame = small_frame[:, :, ::-1]
-                    face_locations = face_recognition.face_locations(rgb_small_frame, model="hog")
+                    rgb_frame = np.ascontiguousarray(frame[:, :, ::-1])
+                    face_locations = locate_faces(rgb_frame, RECOGNITION_PROFILE)
                     
                     face_info = []
                     for face_location in face_locations:
@@ -428,37 +900,21 @@ class FaceRecognitionSystem:
                         face_info.append({
                             'name': "Processing..." if not ready_to_detect_identity else "Detecting...",
                             'confidence': 0,
-                            'location': (left*4, top*4, right*4, bottom*4)
+                            'location': (left, top, right, bottom)
                         })
                 
                 # Draw face information
                 frame = self.draw_face_info(frame, face_info)
                 
                 # Draw status information
-                status_color = (0, 255, 0) if ready_to_detect_identity else (0, 165, 255)
-                status_text = "READY" if ready_to_detect_identity else "PROCESSING"
-                
-                cv2.putText(frame, f"Status: {status_text}", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
-                cv2.putText(frame, f"Database: {len(self.database)} people", (10, 60), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-                cv2.putText(frame, f"FPS: {fps_display:.1f}", (10, 90), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-                cv2.putText(frame, f"Faces: {len(face_info)}", (10, 120), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+                self._draw_status(frame, fps_display, len(face_info))
                 
                 # Show the frame
                 cv2.imshow('Modern Face Recognition System', frame)
                 
                 # Handle key presses
-                key = cv2.waitKey(1) & 0xFF
-                if key == 27:  # ESC
+                if not self._handle_key(cv2.waitKey(1) & 0xFF):
                     break
-                elif key == ord('r') or key == ord('R'):  # Reset
-                    ready_to_detect_identity = True
-                    print("🔄 Detection reset")
-                elif key == ord('s') or key == ord('S'):  # Stats
-                    self._show_stats()
         
         except KeyboardInterrupt:
             print("\n👋 Program interrupted by user")
@@ -468,6 +924,176 @@ class FaceRecognitionSystem:
             cv2.destroyAllWindows()
             print("📷 Camera closed")
     
+    def _open_camera(self):
+        """Open the camera with the settings used by both camera loops"""
+        video_capture = cv2.VideoCapture(1)
+        
+        if not video_capture.isOpened():
+            print("❌ Error: Could not open camera")
+            return None
+        
+        # Set camera properties for better performance
+        video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        video_capture.set(cv2.CAP_PROP_FPS, 30)
+        return video_capture
+    
+    def _draw_status(self, frame, fps_display, face_count, recognition_fps=None):
+        """Draw the status overlay in the top-left corner"""
+        status_color = (0, 255, 0) if ready_to_detect_identity else (0, 165, 255)
+        status_text = "READY" if ready_to_detect_identity else "PROCESSING"
+        
+        cv2.putText(frame, f"Status: {status_text}", (10, 30), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
+        cv2.putText(frame, f"Database: {len(self.database)} people", (10, 60), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        cv2.putText(frame, f"FPS: {fps_display:.1f}", (10, 90), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        cv2.putText(frame, f"Faces: {face_count}", (10, 120), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        if recognition_fps is not None:
+            cv2.putText(frame, f"Recognition: {recognition_fps:.1f}/s", (10, 150), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    
+    def _handle_key(self, key):
+        """Handle a key press, returns False when the loop should stop"""
+        global ready_to_detect_identity
+        
+        if key == 27:  # ESC
+            return False
+        elif key == ord('r') or key == ord('R'):  # Reset
+            ready_to_detect_identity = True
+            print("🔄 Detection reset")
+        elif key == ord('s') or key == ord('S'):  # Stats
+            self._show_stats()
+        return True
+    
+    def _announce(self, face_info):
+        """Start a welcome announcement for confidently recognized faces"""
+        global ready_to_detect_identity
+        
+        recognized_names = [
+            f['name'] for f in face_info 
+            if f['name'] != "Unknown" and f['confidence'] >= MIN_CONFIDENCE_FOR_ANNOUNCEMENT
+        ]
+        
+        if recognized_names:
+            ready_to_detect_identity = False
+            pool = Pool(processes=1)
+            pool.apply_async(self.welcome_users, [recognized_names])
+    
+    def run_pipelined_camera_loop(self):
+        """Camera loop with capture, recognition and display on separate threads.
+        
+        The capture thread publishes the newest frame, the recognition worker
+        always picks up the newest frame it has not seen, and the display
+        moves the last recognized boxes along with optical flow, so the
+        displayed frame rate follows the camera instead of the detector.
+        """
+        print("🎥 Starting camera (pipelined mode)...")
+        print("📹 Controls: ESC = Exit, R = Reset detection, S = Show stats")
+        
+        video_capture = self._open_camera()
+        if video_capture is None:
+            return
+        
+        stop_event = threading.Event()
+        capture_slot = LatestFrameSlot()
+        recognition_slot = LatestFrameSlot()
+        results_lock = threading.Lock()
+        latest_result = {'id': 0, 'frame': None, 'face_info': [], 'count': 0}
+        
+        def capture_worker():
+            while not stop_event.is_set():
+                ret, frame = video_capture.read()
+                if not ret:
+                    print("❌ Failed to capture frame")
+                    stop_event.set()
+                    break
+                capture_slot.put(frame)
+            capture_slot.close()
+        
+        def recognition_worker():
+            last_id = 0
+            while not stop_event.is_set():
+                last_id, frame = recognition_slot.get(after_id=last_id, timeout=0.5)
+                if frame is None:
+                    continue
+                started = time.time()
+                face_info = self.recognize_faces_in_frame(frame)
+                with results_lock:
+                    latest_result['id'] += 1
+                    latest_result['frame'] = frame
+                    latest_result['face_info'] = face_info
+                    latest_result['count'] += 1
+                if ready_to_detect_identity:
+                    self._announce(face_info)
+                # Leave CPU for capture and display between recognitions
+                remaining = PIPELINE_RECOGNITION_INTERVAL - (time.time() - started)
+                if remaining > 0:
+                    stop_event.wait(remaining)
+        
+        threads = [
+            threading.Thread(target=capture_worker, name="CaptureThread", daemon=True),
+            threading.Thread(target=recognition_worker, name="RecognitionThread", daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+        
+        tracker = FaceBoxTracker()
+        applied_result = 0
+        frame_id = 0
+        frame_count = 0
+        fps_counter = time.time()
+        fps_display = 0
+        recognition_count = 0
+        recognition_fps = 0
+        
+        try:
+            while not stop_event.is_set():
+                frame_id, frame = capture_slot.get(after_id=frame_id, timeout=1.0)
+                if frame is None:
+                    continue
+                
+                frame_count += 1
+                recognition_slot.put(frame)
+                
+                # Re-seed the tracker whenever a new recognition result is in
+                with results_lock:
+                    if latest_result['id'] != applied_result:
+                        applied_result = latest_result['id']
+                        tracker.reset(latest_result['frame'], latest_result['face_info'])
+                    total_recognitions = latest_result['count']
+                face_info = tracker.update(frame)
+                
+                # Calculate FPS
+                if frame_count % 30 == 0:
+                    current_time = time.time()
+                    elapsed = current_time - fps_counter
+                    fps_display = 30 / elapsed
+                    recognition_fps = (total_recognitions - recognition_count) / elapsed
+                    recognition_count = total_recognitions
+                    fps_counter = current_time
+                
+                display_frame = self.draw_face_info(frame.copy(), face_info)
+                self._draw_status(display_frame, fps_display, len(face_info), recognition_fps)
+                cv2.imshow('Modern Face Recognition System', display_frame)
+                
+                if not self._handle_key(cv2.waitKey(1) & 0xFF):
+                    break
+        
+        except KeyboardInterrupt:
+            print("\n👋 Program interrupted by user")
+        
+        finally:
+            stop_event.set()
+            recognition_slot.close()
+            for thread in threads:
+                thread.join(timeout=2)
+            video_capture.release()
+            cv2.destroyAllWindows()
+            print("📷 Camera closed")
+    
     def _show_stats(self):
         """Show system statistics"""
         print("\n" + "="*50)
@@ -475,7 +1101,7 @@ class FaceRecognitionSystem:
         print("="*50)
         print(f"People in database: {len(self.database)}")
         print(f"Names: {', '.join(self.known_names)}")
-        print(f"Total detections today: {len(self.detection_log)}")
+        print(f"Detections this session: {self.detection_count}")
         print(f"Recognition thresholds:")
         print(f"  • Strong match: ≤ {STRONG_MATCH_THRESHOLD} distance")
         print(f"  • Weak match: ≤ {WEAK_MATCH_THRESHOLD} distance") 
@@ -484,8 +1110,32 @@ class FaceRecognitionSystem:
         print(f"Voice announcements: {'Enabled' if VOICE_AVAILABLE else 'Disabled'}")
         print("="*50)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Modern Face Recognition System")
+    parser.add_argument('--pipelined', action='store_true',
+                        help='Run capture, recognition and display on separate threads '
+                             'and track boxes between recognitions')
+    
+    headless = parser.add_argument_group('headless mode')
+    headless.add_argument('--sources', nargs='+', default=None, metavar='SOURCE',
+                          help='Process video files, stream URLs or camera indices without a display')
+    headless.add_argument('--output-dir', default='headless_output',
+                          help='Folder for the per-source JSONL results and summary.json')
+    headless.add_argument('--workers', type=int, default=None,
+                          help='Recognition processes shared by all sources (default: one per CPU core)')
+    headless.add_argument('--every', type=int, default=5,
+                          help='Recognize every Nth decoded frame of each source')
+    headless.add_argument('--max-fps', type=float, default=None,
+                          help='Recognize at most this many frames per second of video per source')
+    headless.add_argument('--queue-size', type=int, default=HEADLESS_QUEUE_SIZE,
+                          help='Frames a source may have waiting for recognition; live feeds drop '
+                               'their oldest frame when full, files wait')
+    return parser.parse_args()
+
 def main():
     """Main function"""
+    args = parse_args()
+    
     print("🚀 Modern Face Recognition System")
     print("=" * 60)
     print("🎯 Features:")
@@ -503,7 +1153,17 @@ def main():
     if not face_system.load_database():
         print("\n❌ Cannot proceed without a valid face database")
         print("Please add images and try again")
-        input("Press Enter to exit...")
+        if not args.sources:
+            input("Press Enter to exit...")
+        return
+    
+    if args.sources:
+        processor = HeadlessVideoProcessor(
+            face_system.known_encodings, face_system.known_names, args.sources,
+            output_dir=args.output_dir, workers=args.workers,
+            skip_policy=FrameSkipPolicy(every=args.every, max_fps=args.max_fps),
+            queue_size=args.queue_size)
+        processor.run()
         return
     
     print(f"\n✅ System initialized successfully!")
@@ -511,10 +1171,14 @@ def main():
     
     # Start the camera loop
     try:
-        face_system.run_camera_loop()
+        if args.pipelined:
+            face_system.run_pipelined_camera_loop()
+        else:
+            face_system.run_camera_loop()
     except Exception as e:
         print(f"❌ System error: {e}")
     finally:
+        face_system.detection_log.close()
         print("👋 Thank you for using Modern Face Recognition System!")
 
 if __name__ == "__main__":
@@ -24,6 +24,13 @@ class ExamMonitoringServer {
         this.gazeServiceUrl = process.env.GAZE_SERVICE_URL || 'http://localhost:5000';
         this.gazeEnabled = process.env.ENABLE_GAZE_TRACKING !== 'false';
         this.gazeAnalysisQueue = new Map(); // Track pending analyses
+        // The gaze service smooths each student's gaze over time, so a few frames per second suffice;
+        // its next_analysis_in_ms hints replace this default once a student has been analyzed
+        this.gazeAnalysisInterval = parseInt(process.env.GAZE_ANALYSIS_INTERVAL_MS || '250', 10);
+        this.gazeAwayAlertSeconds = parseFloat(process.env.GAZE_AWAY_ALERT_SECONDS || '2');
+        // A gaze result arriving later than this after the frame is no use; the async gaze
+        // service sheds such frames instead of analyzing them
+        this.gazeFrameDeadline = parseInt(process.env.GAZE_FRAME_DEADLINE_MS || '1000', 10);
         
         // AI detection configuration
         this.aiDetectionServiceUrl = process.env.AI_DETECTION_SERVICE_URL || 'http://localhost:5001';
@@ -34,6 +41,7 @@ class ExamMonitoringServer {
         this.faceRecognitionServiceUrl = process.env.FACE_RECOGNITION_SERVICE_URL || 'http://localhost:5002';
         this.faceRecognitionEnabled = process.env.ENABLE_FACE_RECOGNITION !== 'false';
         this.faceRecognitionAnalysisQueue = new Map(); // Track pending face recognition analyses
+        this.faceRegistrationJobTimeout = parseInt(process.env.FACE_REGISTRATION_JOB_TIMEOUT_MS || '60000', 10);
         
         this.setupMiddleware();
         this.setupRoutes();
@@ -213,22 +221,60 @@ class ExamMonitoringServer {
             }
             
             try {
-                const response = await axios.post(
-                    `${this.faceRecognitionServiceUrl}/register`,
-                    req.body,
-                    {
-                        timeout: 10000,
-                        headers: { 'Content-Type': 'application/json' }
+                const result = await this.registerFaceReference(req.body);
+                if (result.success) {
+                    // New reference, connected sessions of this student start collecting evidence again
+                    for (const studentInfo of this.connectedStudents.values()) {
+                        if (String(studentInfo.studentId) === String(req.body.studentId)) {
+                            studentInfo.faceSequentialState = null;
+                        }
                     }
-                );
-                res.json(response.data);
+                }
+                res.json(result);
             } catch (error) {
                 console.error('Face registration error:', error.message);
+                if (error.response && error.response.status === 503) {
+                    return res.status(503).json(error.response.data);
+                }
                 res.status(500).json({ error: 'Face registration failed' });
             }
         });
     }
     
+    // Submit a registration job and wait for its result.
+    // The service answers 202 with a job id right away; we poll the job until it finishes.
+    async registerFaceReference(registrationData) {
+        const response = await axios.post(
+            `${this.faceRecognitionServiceUrl}/register`,
+            registrationData,
+            {
+                timeout: 10000,
+                headers: { 'Content-Type': 'application/json' }
+            }
+        );
+        
+        if (response.status !== 202 || !response.data.jobId) {
+            return response.data; // Synchronous result
+        }
+        
+        const statusUrl = `${this.faceRecognitionServiceUrl}/register/jobs/${response.data.jobId}`;
+        const deadline = Date.now() + this.faceRegistrationJobTimeout;
+        let pollInterval = 500;
+        
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, pollInterval));
+            const statusResponse = await axios.get(statusUrl, { timeout: 5000 });
+            const job = statusResponse.data;
+            
+            if (job.status === 'done' || job.status === 'failed') {
+                return job.result || { success: false, error: 'Registration failed' };
+            }
+            pollInterval = Math.min(pollInterval * 1.5, 3000);
+        }
+        
+        return { success: false, error: 'Registration is still queued, please retry later' };
+    }
+    
     async checkServiceHealth(serviceUrl) {
         try {
             const response = await axios.get(`${serviceUrl}/health`, { timeout: 3000 });
@@ -292,7 +338,11 @@ class ExamMonitoringServer {
                 aiDetectionHistory: [], // Track AI detection history
                 faceRecognitionHistory: [], // Track face recognition history
                 lastAIDetectionTime: 0,
+                lastGazeAnalysisTime: 0,
+                gazeAnalysisInterval: this.gazeAnalysisInterval, // Updated from the service's next_analysis_in_ms
                 lastFaceRecognitionTime: 0, // Face recognition timing control
+                faceRecognitionInterval: 10000, // Updated from the service's next_analysis_in_ms
+                faceSequentialState: null, // Sequential verification evidence from the service
                 faceRegistered: false // Track if student has uploaded reference photo
             };
             
@@ -325,17 +375,12 @@ class ExamMonitoringServer {
                         referenceImage: data.referenceImage
                     };
                     
-                    const response = await axios.post(
-                        `${this.faceRecognitionServiceUrl}/register`,
-                        registrationData,
-                        {
-                            timeout: 10000,
-                            headers: { 'Content-Type': 'application/json' }
-                        }
-                    );
+                    const result = await this.registerFaceReference(registrationData);
                     
-                    if (response.data.success) {
+                    if (result.success) {
                         studentInfo.faceRegistered = true;
+                        studentInfo.faceSequentialState = null; // New reference, start collecting evidence again
+                        studentInfo.faceRecognitionInterval = 10000;
                         socket.emit('faceRegistrationResult', {
                             success: true,
                             message: 'Face registration successful'
@@ -354,15 +399,18 @@ class ExamMonitoringServer {
                     } else {
                         socket.emit('faceRegistrationResult', {
                             success: false,
-                            error: response.data.error || 'Registration failed'
+                            error: result.error || 'Registration failed'
                         });
                     }
                     
                 } catch (error) {
                     console.error(`Face registration error for ${studentInfo.name}:`, error.message);
+                    const queueFull = error.response && error.response.status === 503;
                     socket.emit('faceRegistrationResult', {
                         success: false,
-                        error: 'Registration service unavailable'
+                        error: queueFull
+                            ? 'Registration service busy, please retry shortly'
+                            : 'Registration service unavailable'
                     });
                 }
             });
@@ -377,12 +425,15 @@ class ExamMonitoringServer {
     }
     
     async handleVideoFrame(studentInfo, frameData) {
+        // Our own clock, the browser's timestamp may be skewed
+        const receivedAt = Date.now();
+        
         // Broadcast frame to teachers immediately
         this.broadcastFrameToTeachers(studentInfo, frameData);
         
         // Perform gaze analysis if enabled
         if (this.gazeEnabled) {
-            await this.analyzeGazeAsync(studentInfo, frameData);
+            await this.analyzeGazeAsync(studentInfo, frameData, receivedAt);
         }
         
         // Perform AI detection analysis if enabled
@@ -396,7 +447,7 @@ class ExamMonitoringServer {
         }
     }
     
-    async analyzeGazeAsync(studentInfo, frameData) {
+    async analyzeGazeAsync(studentInfo, frameData, receivedAt = Date.now()) {
         try {
             // Avoid overwhelming the gaze service
             const pendingAnalysis = this.gazeAnalysisQueue.get(studentInfo.id);
@@ -404,13 +455,21 @@ class ExamMonitoringServer {
                 return; // Skip if analysis already in progress
             }
             
+            const now = Date.now();
+            if (now - studentInfo.lastGazeAnalysisTime < studentInfo.gazeAnalysisInterval) {
+                return;
+            }
+            studentInfo.lastGazeAnalysisTime = now;
+            
             // Mark analysis as pending
-            this.gazeAnalysisQueue.set(studentInfo.id, Date.now());
+            this.gazeAnalysisQueue.set(studentInfo.id, now);
             
             // Prepare data for gaze service
             const analysisData = {
                 studentId: studentInfo.studentId,
-                frameData: frameData.dataUrl
+                frameData: frameData.dataUrl,
+                captureTimestamp: receivedAt,
+                deadline: receivedAt + this.gazeFrameDeadline
             };
             
             // Send to gaze service
@@ -424,12 +483,18 @@ class ExamMonitoringServer {
             );
             
             const gazeResult = response.data;
+            if (gazeResult.next_analysis_in_ms) {
+                studentInfo.gazeAnalysisInterval = gazeResult.next_analysis_in_ms;
+            }
+            // Prefer the service's temporally smoothed gaze over the single-frame one
+            const gaze = gazeResult.smoothed || gazeResult;
             
             // Add gaze result to student's history
             studentInfo.gazeHistory.push({
                 timestamp: new Date().toISOString(),
-                direction: gazeResult.gaze_direction,
-                confidence: gazeResult.confidence
+                direction: gaze.gaze_direction,
+                confidence: gaze.confidence,
+                directionSeconds: gaze.direction_seconds
             });
             
             // Keep only last 10 results
@@ -445,6 +510,14 @@ class ExamMonitoringServer {
             
         } catch (error) {
             console.error(`Gaze analysis failed for ${studentInfo.name}:`, error.message);
+            // Error responses (e.g. an overloaded service) carry a hint as well
+            const hint = error.response && error.response.data && error.response.data.next_analysis_in_ms;
+            const retryAfter = error.response && parseFloat(error.response.headers['retry-after']);
+            if (hint) {
+                studentInfo.gazeAnalysisInterval = hint;
+            } else if (retryAfter) {
+                studentInfo.gazeAnalysisInterval = retryAfter * 1000;
+            }
         } finally {
             // Remove from pending queue
             this.gazeAnalysisQueue.delete(studentInfo.id);
@@ -531,13 +604,15 @@ class ExamMonitoringServer {
                 return; // Skip if analysis already in progress
             }
 
-            // 10-second interval control (same as AI detection)
+            // Interval control: 10 seconds by default, or the service's recommendation
+            // (long back-off once the identity is verified, shorter on a mismatch)
             const now = Date.now();
             const lastAnalysisTime = studentInfo.lastFaceRecognitionTime || 0;
             const timeSinceLastAnalysis = now - lastAnalysisTime;
+            const analysisInterval = studentInfo.faceRecognitionInterval || 10000;
             
-            if (timeSinceLastAnalysis < 10000) { // 10 seconds = 10000ms
-                return; // Skip if less than 10 seconds since last analysis
+            if (timeSinceLastAnalysis < analysisInterval) {
+                return; // Skip until the interval has passed
             }
             
             // Update last analysis time
@@ -546,10 +621,12 @@ class ExamMonitoringServer {
             // Mark analysis as pending
             this.faceRecognitionAnalysisQueue.set(studentInfo.id, Date.now());
             
-            // Prepare data for face recognition service
+            // Prepare data for face recognition service; the evidence state is echoed back
+            // so the sequential test accumulates even across service worker processes
             const analysisData = {
                 studentId: studentInfo.studentId,
-                frameData: frameData.dataUrl
+                frameData: frameData.dataUrl,
+                sequentialState: studentInfo.faceSequentialState || null
             };
             
             // Send to face recognition service
@@ -564,6 +641,13 @@ class ExamMonitoringServer {
             
             const faceRecognitionResult = response.data;
             
+            if (faceRecognitionResult.sequential) {
+                studentInfo.faceSequentialState = faceRecognitionResult.sequential;
+            }
+            if (faceRecognitionResult.next_analysis_in_ms) {
+                studentInfo.faceRecognitionInterval = faceRecognitionResult.next_analysis_in_ms;
+            }
+            
             // Add face recognition result to student's history
             studentInfo.faceRecognitionHistory.push({
                 timestamp: new Date().toISOString(),
@@ -598,7 +682,13 @@ class ExamMonitoringServer {
             h.direction === 'left' || h.direction === 'right'
         );
         
-        if (lookingAway.length >= 5) {
+        // Smoothed results carry how long the direction has held, which does not depend on the sampling rate
+        const latest = recentHistory[recentHistory.length - 1];
+        const awayTooLong = latest && latest.directionSeconds !== undefined
+            ? lookingAway.includes(latest) && latest.directionSeconds >= this.gazeAwayAlertSeconds
+            : lookingAway.length >= 5;
+        
+        if (awayTooLong) {
             this.sendGazeAlert(studentInfo, {
                 type: 'looking_away',
                 message: `${studentInfo.name} has been looking away from screen`,